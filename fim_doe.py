@@ -56,8 +56,19 @@ from pyomo.dae import *
 import pandas as pd
 import time
 import pickle
+import copy
+import os
+import weakref
+import numbers
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from itertools import permutations, product
-from pyomo.contrib.sensitivity_toolbox.sens import sipopt, sensitivity_calculation, get_dsdp
+from collections import OrderedDict
+from scipy.stats import qmc
+from scipy.interpolate import RBFInterpolator
+from scipy.sparse import coo_matrix
+from scipy.sparse.linalg import splu
+from pyomo.core.expr.calculus.diff_with_pyomo import reverse_ad
+from pyomo.contrib.sensitivity_toolbox.sens import sipopt, get_dsdp, SensitivityInterface
 
 class Measurements:
     def __init__(self, measurement_index_time, variance=None, ind_string='_index_'):
@@ -210,6 +221,27 @@ class Measurements:
                     measurement_names.append(measurement_name)
         self.model_measure_name = measurement_names
 
+    def measure_index(self, j, t, scenario=0):
+        '''Return the model component name and index of a measurement, e.g. ('C', (0, 'CA', 1.0)) or ('k', (0, 1.0))
+        Arguments
+        ---------
+        j: flatten measurement name
+        t: time
+        scenario: scenario index, 0 for the sequential modes
+
+        Return
+        ------
+        measure_name: the name of the measurement component in the model
+        index: the index of the measurement, a tuple. The extra index has the type given in measurement_index_time
+        '''
+        if self.ind_string in j:
+            measure_name, measure_index = j.split(self.ind_string)
+            if type(self.name_and_index[measure_name][0]) is int:
+                measure_index = int(measure_index)
+            return measure_name, (scenario, measure_index, t)
+        else:
+            return j, (scenario, t)
+
     def SP_measure_name(self, j, t,scenario_all=None, p=None, mode=None, legal_t=True):
         '''Return pyomo string name for different modes
         Arguments
@@ -285,7 +317,7 @@ class Measurements:
 
 class DesignOfExperiments:
     def __init__(self, param_init, design_variable_timepoints, measurement_object, create_model, solver=None,
-                 prior_FIM=None, discretize_model=None, verbose=True, args=None):
+                 prior_FIM=None, discretize_model=None, verbose=True, args=None, cache=None, persistent_solver=None):
         '''
         This package enables model-based design of experiments analysis with Pyomo. Both direct optimization and enumeration modes are supported.
         NLP sensitivity tools, e.g.,  sipopt and k_aug, are supported to accelerate analysis via enumeration.
@@ -308,6 +340,10 @@ class DesignOfExperiments:
         discretize_model: A user-specified function that deiscretizes the model. Only use with Pyomo.DAE, default=None
         verbose: if print statements are made
         args: Other arguments of the create_model function, in a list
+        cache: a Solution_cache object. If given, every solve is warm started from the nearest cached solution, 
+                and converged solutions are added to the cache, default=None
+        persistent_solver: a function returning a new persistent solver, called once for every model kept with reuse_model=True.
+                If None, APPSI Ipopt is used if available, otherwise the solver above, default=None
         '''  
         
         # parameters
@@ -347,6 +383,22 @@ class DesignOfExperiments:
         # if print statements
         self.verbose = verbose
 
+        # warm start solution cache
+        self.cache = cache
+
+        # models kept by compute_FIM(reuse_model=True), keys are the scenario number, values are (model, solver)
+        self.persistent_solver = persistent_solver
+        self.model_pool = {}
+
+        # references to the measurement, parameter and design components of each model
+        self.components = Component_cache()
+
+        # last converged variable values of each scenario, used by compute_FIM(chain_warm_start=True)
+        self.chain_seed = {}
+
+        # if all square solves of the last compute_FIM() call converged, None if nothing was solved
+        self.scenario_converged = None
+
 
         
     def __check_inputs(self, check_mode=False):
@@ -373,8 +425,8 @@ class DesignOfExperiments:
             print('Sensitivity information is scaled by constant ', self.scale_constant_value, ' times itself.')
 
         if check_mode:
-            if self.mode not in ['simultaneous_finite', 'sequential_finite', 'sequential_sipopt', 'sequential_kaug', 'direct_kaug']:
-                raise ValueError('Wrong mode. Choose from "simultaneous_finite", "sequential_finite", "0sequential_sipopt", "sequential_kaug"')
+            if self.mode not in ['simultaneous_finite', 'sequential_finite', 'sequential_sipopt', 'sequential_kaug', 'direct_kaug', 'direct_sensitivity']:
+                raise ValueError('Wrong mode. Choose from "simultaneous_finite", "sequential_finite", "sequential_sipopt", "sequential_kaug", "direct_sensitivity"')
 
 
 
@@ -382,7 +434,8 @@ class DesignOfExperiments:
                      jac_involved_measurement=None,
                      scale_nominal_param_value=False, scale_constant_value=1, optimize_opt=None, if_Cholesky=False, L_LB = 1E-10, L_initial=None,
                      jac_initial=None, fim_initial=None,
-                     formula='central', step=0.001, check=True):
+                     formula='central', step=0.001, check=True, lean_model=False,
+                     decomposition=None, workers=None, threads_per_worker=1, mp_context=None, max_iter=100):
         '''
         Optimize DOE problem with design variables being the decisions.
         The DOE model is formed invasively and all scenarios are computed simultaneously.
@@ -407,6 +460,22 @@ class DesignOfExperiments:
         formula: Finite difference formula, choose from 'central', 'forward', 'backward', None
         step: Finite difference sensitivity perturbation step size, a fraction between [0,1]. default is 0.001
         check: if True check input toggles consistency to be checked multiple times.
+        lean_model: if True, the Jacobian, the FIM and the trace are Pyomo Expressions of the scenario responses instead of
+            variables with one equality constraint each. Only the Cholesky factor L stays a variable, for the log-det objective.
+            jac_initial and fim_initial (except for initializing L) are not used. The model size is reported in model_size
+
+        decomposition: None to solve all scenarios in one NLP. 
+            'schur' to keep each scenario as its own model (block), linked to the others only by the design variables.
+            The blocks are solved at every design, and the sensitivity of their measurements to the design variables is computed 
+            from the factorization of each block, so the optimization only works on the reduced (Schur complement) problem 
+            in the design variables and the FIM. Needs square scenario models of equality constraints, see direct_sensitivity mode.
+            Cholesky, jac_initial, fim_initial and jac_involved_measurement are not used, the FIM has all measurements.
+        workers: with decomposition='schur', the number of worker processes. Each keeps and factorizes the blocks of its share of 
+            the scenarios, so the memory of one process grows with the number of scenarios over the number of workers. 
+            If None, the blocks are solved in this process
+        threads_per_worker: the number of linear solver (BLAS/OpenMP) threads of each worker
+        mp_context: the multiprocessing context of the workers, see run_grid_search()
+        max_iter: with decomposition='schur', the maximal number of iterations of the design optimization
 
         Returns:
         --------
@@ -437,6 +506,7 @@ class DesignOfExperiments:
         self.formula = formula
         self.step = step
         self.tee_opt = True
+        self.lean_model = lean_model
 
         # calculate how much the FIM element is scaled by a constant number
         # FIM = Jacobian.T@Jacobian, the FIM is scaled by squared value the Jacobian is scaled
@@ -456,16 +526,31 @@ class DesignOfExperiments:
         if check:
             self.__check_inputs(check_mode=False)
 
+        if decomposition == 'schur':
+            return self.__optimize_schur(optimize_opt, workers, threads_per_worker, mp_context, max_iter, time0)
+        elif decomposition is not None:
+            raise ValueError('decomposition must be None or "schur".')
+
         # build the large DOE pyomo model
         m = self.__create_doe_model()
 
+        # number of free variables and of constraints of the NLP
+        self.model_size = {'variables': sum(1 for v in m.component_data_objects(Var) if not v.fixed),
+                           'constraints': len(list(m.component_data_objects(Constraint, active=True)))}
+        if self.verbose:
+            print('DOE model size:', self.model_size['variables'], 'variables,', self.model_size['constraints'], 'constraints')
+
+        # warm start from the nearest cached solution
+        cache_key, warm_dual = self.__warm_start(m, self.scenario_all)
+
         # solve model, achieve results for square problem, and results for optimization problem
 
         # Solve square problem first
         # result_square: solver result
         time0_solve = time.time()
-        result_square = self.__solve_doe(m, fix=True, opt_option=optimize_opt)
+        result_square = self.__solve_doe(m, fix=True, opt_option=optimize_opt, warm_dual=warm_dual)
         time1_solve = time.time()
+        self.__cache_solution(m, cache_key, result_square)
 
         time_solve1 = time1_solve-time0_solve
 
@@ -474,11 +559,12 @@ class DesignOfExperiments:
 
         # create result object
         analysis_square = FIM_result(self.param_name, self.measure, jacobian_info=None, all_jacobian_info=jac_square,
-                                     prior_FIM=self.prior_FIM, scale_constant_value=self.scale_constant_value)
+                                     prior_FIM=self.prior_FIM, scale_constant_value=self.scale_constant_value, verbose=self.verbose)
         # for simultaneous mode, FIM and Jacobian are extracted with extract_FIM()
         analysis_square.calculate_FIM(self.design_timeset, result=result_square)
 
         analysis_square.model = m
+        analysis_square.model_size = self.model_size
 
         self.analysis_square = analysis_square
         analysis_square.solve_time = time_solve1
@@ -495,10 +581,11 @@ class DesignOfExperiments:
 
             # create result object
             analysis_optimize = FIM_result(self.param_name, self.measure, jacobian_info=None, all_jacobian_info=jac_optimize,
-                                           prior_FIM=self.prior_FIM)
+                                           prior_FIM=self.prior_FIM, verbose=self.verbose)
             # for simultaneous mode, FIM and Jacobian are extracted with extract_FIM()
             analysis_optimize.calculate_FIM(self.design_timeset, result=result_doe)
             analysis_optimize.model = m
+            analysis_optimize.model_size = self.model_size
 
             time1 = time.time()
             # record optimization time
@@ -522,12 +609,192 @@ class DesignOfExperiments:
 
             return analysis_square
 
+    def __optimize_schur(self, optimize_opt, workers, threads_per_worker, mp_context, max_iter, time0):
+        '''
+        Optimize the design with the scenario blocks solved separately, see optimize_doe(decomposition='schur').
+        At every design, each block is solved and returns its measurements and their sensitivity to the design variables.
+        The finite difference Jacobian, the FIM and the gradient of the objective to the design variables follow from them,
+        and the design is updated by a bounded quasi-Newton method.
+
+        Parameters:
+        -----------
+        optimize_opt: a dictionary, keys are design variable names, values are True or False deciding if it is optimized
+        workers: the number of worker processes, None to solve the blocks in this process
+        threads_per_worker: the number of linear solver threads of each worker
+        mp_context: the multiprocessing context of the workers
+        max_iter: the maximal number of iterations
+        time0: start time of optimize_doe
+
+        Returns:
+        --------
+        analysis_square: result summary at the initial design
+        analysis_optimize: result summary at the optimal design, only if self.optimize
+        '''
+        from scipy.optimize import minimize
+
+        if self.objective_option not in ['det', 'trace']:
+            raise ValueError('Undefined objective function type. Available options are "trace" and "det".')
+
+        # the scenario blocks are the models of sequential_finite mode
+        scena_gen = Scenario_generator(self.param_init, formula=self.formula, step=self.step)
+        scena_gen.generate_sequential_para()
+        scenarios = {no_s: scena_gen.next_sequential_scenario(no_s) for no_s in scena_gen.scena_keys}
+
+        # the linking design variables
+        design_keys = []
+        for d, dname in enumerate(self.design_name):
+            if optimize_opt is not None and not optimize_opt[dname]:
+                continue
+            if self.design_time[d] is not None:
+                for tim in self.design_time[d]:
+                    design_keys.append((dname, tim))
+            else:
+                design_keys.append((dname, None))
+
+        def design_dict(x):
+            design_iter = copy.deepcopy(self.design_values)
+            for (dname, tim), x_k in zip(design_keys, x):
+                design_iter[dname][0 if tim is None else tim] = float(x_k)
+            return design_iter
+
+        x0 = np.array([self.design_values[dname][0 if tim is None else tim] for dname, tim in design_keys], dtype=float)
+        # the design variables are scaled by their initial values
+        x_scale = np.where(x0 != 0, np.abs(x0), 1.0)
+
+        # each worker keeps the blocks of the scenarios assigned to it
+        executors = []
+        if workers is not None and workers > 1:
+            worker_doe = self.__worker_copy()
+            for i in range(min(workers, len(scenarios))):
+                executors.append(ProcessPoolExecutor(max_workers=1, mp_context=mp_context, initializer=_grid_worker_init, 
+                                                     initargs=(worker_doe, threads_per_worker)))
+
+        evaluations = {}
+        block_bounds = []
+
+        def penalty():
+            '''objective of a design where a block fails or the FIM is not positive definite. 
+            It is worse than all designs evaluated, but finite, since the L-BFGS-B line search stops at an infinite objective'''
+            finite = [ev[0] for ev in evaluations.values() if np.isfinite(ev[0])]
+            return max(finite) + 1E3 if finite else np.inf
+
+        def evaluate(x):
+            '''objective, its gradient to the scaled design variables and the Jacobian at the design x.
+            If a scenario block does not converge, the objective is penalty() and the Jacobian is None, so that the line search backs off'''
+            key = tuple(x)
+            if key in evaluations:
+                return evaluations[key]
+
+            design_iter = design_dict(x*x_scale)
+            output_record, sens_record = {}, {}
+            if executors:
+                futures = {no_s: executors[i % len(executors)].submit(_schur_worker_run, no_s, scenarios[no_s], design_iter, design_keys) 
+                           for i, no_s in enumerate(scenarios)}
+                block_results = {no_s: futures[no_s].result() for no_s in scenarios}
+            else:
+                self.design_values = design_iter
+                block_results = {no_s: self.solve_scenario_sensitivity(no_s, scenarios[no_s], design_keys) for no_s in scenarios}
+
+            for no_s, (output_iter, dydd, bounds, converged) in block_results.items():
+                if not converged:
+                    if self.verbose:
+                        print('Scenario', no_s, 'did not converge at the design', design_iter)
+                    evaluations[key] = (penalty(), np.zeros(len(design_keys)), None, design_iter)
+                    return evaluations[key]
+                output_record[no_s] = output_iter
+                sens_record[no_s] = dydd
+            block_bounds[:] = bounds
+
+            # the Jacobian and its derivative to each design variable, with the same finite difference formula
+            jac = self.__finite_calculation(output_record, scena_gen)
+            jac_array, variance = FIM_result(self.param_name, self.measure, all_jacobian_info=jac, verbose=False).jacobian_array()
+
+            fim = assemble_FIM(jac_array, variance, prior_FIM=self.prior_FIM)
+            grad_fim = []
+            for k in range(len(design_keys)):
+                djac = self.__finite_calculation({no_s: sens_record[no_s][:, k] for no_s in scenarios}, scena_gen)
+                djac_array = FIM_result(self.param_name, self.measure, all_jacobian_info=djac, verbose=False).jacobian_array()[0]
+                dfim = np.einsum('rpt,rqt,r->pq', djac_array, jac_array, 1/variance, optimize=True)
+                grad_fim.append(dfim + dfim.T)
+
+            # maximize log(det(FIM)) or log(trace(FIM))
+            if self.objective_option == 'det':
+                sign, logdet = np.linalg.slogdet(fim)
+                if sign <= 0:
+                    obj, grad = penalty(), np.zeros(len(design_keys))
+                else:
+                    fim_inv = np.linalg.inv(fim)
+                    obj = -logdet
+                    grad = -np.array([np.sum(fim_inv*dfim.T) for dfim in grad_fim])
+            else:
+                obj = -np.log(np.trace(fim))
+                grad = -np.array([np.trace(dfim) for dfim in grad_fim])/np.trace(fim)
+
+            if self.verbose:
+                print('Design:', design_iter, 'objective:', -obj)
+
+            evaluations[key] = (obj, grad*x_scale, jac, design_iter)
+            return evaluations[key]
+
+        try:
+            time0_solve = time.time()
+            obj_square, grad_square, jac_square, design_square = evaluate(x0/x_scale)
+            time_solve1 = time.time() - time0_solve
+            if jac_square is None:
+                raise RuntimeError('The scenario blocks did not converge at the initial design ' + str(design_square))
+
+            analysis_square = FIM_result(self.param_name, self.measure, jacobian_info=None, all_jacobian_info=jac_square,
+                                         prior_FIM=self.prior_FIM, scale_constant_value=self.scale_constant_value, verbose=self.verbose)
+            analysis_square.calculate_FIM(design_square)
+            analysis_square.solve_time = time_solve1
+            self.analysis_square = analysis_square
+
+            if not self.optimize:
+                analysis_square.total_time = time.time() - time0
+                return analysis_square
+
+            # bounds of the design variables in the blocks, scaled
+            bounds = [(None if lb is None else lb/sc, None if ub is None else ub/sc) for (lb, ub), sc in zip(block_bounds, x_scale)]
+
+            time0_solve2 = time.time()
+            optimizer_result = minimize(lambda x: evaluate(x)[:2], x0/x_scale, jac=True, method='L-BFGS-B', bounds=bounds, 
+                                        options={'maxiter': max_iter})
+            obj_opt, grad_opt, jac_opt, design_opt = evaluate(optimizer_result.x)
+            if jac_opt is None:
+                # the best converged design so far
+                best_key = min([k for k in evaluations if evaluations[k][2] is not None], key=lambda k: evaluations[k][0])
+                obj_opt, grad_opt, jac_opt, design_opt = evaluations[best_key]
+                if self.verbose:
+                    print('The optimizer stopped at a design that did not converge, the best converged design is reported.')
+            time_solve2 = time.time() - time0_solve2
+        finally:
+            for executor in executors:
+                executor.shutdown()
+
+        self.design_values = design_opt
+
+        analysis_optimize = FIM_result(self.param_name, self.measure, jacobian_info=None, all_jacobian_info=jac_opt,
+                                       prior_FIM=self.prior_FIM, scale_constant_value=self.scale_constant_value, verbose=self.verbose)
+        analysis_optimize.calculate_FIM(design_opt)
+        analysis_optimize.optimizer_result = optimizer_result
+
+        time1 = time.time()
+        analysis_optimize.solve_time = time_solve2
+        analysis_optimize.total_time = time1-time0
+        if self.verbose:
+            print('Optimizer:', optimizer_result.message, ', block evaluations:', len(evaluations))
+            print('Total solve time with schur decomposition (Wall clock) [s]:', time_solve1 + time_solve2)
+            print('Total wall clock time [s]:', time1-time0)
+
+        return analysis_square, analysis_optimize
+
     def compute_FIM(self, design_values, mode='sequential_finite', FIM_store_name=None, specified_prior=None,
                     tee_opt=True, scale_nominal_param_value=False, scale_constant_value=1,
                     store_output = None, read_output=None, extract_single_model=None,
                     formula='central', step=0.001,
                     objective_option='det',
-                    if_Cholesky=False, L_LB=1E-10, L_initial=None):
+                    if_Cholesky=False, L_LB=1E-10, L_initial=None, reuse_model=False,
+                    scenario_workers=None, threads_per_worker=1, mp_context=None, chain_warm_start=False, perturb_in_place=False):
         '''
         This function solves a square Pyomo model with fixed design variables to compute the FIM.
         The problem is structured in one of the four following modes:
@@ -537,11 +804,13 @@ class DesignOfExperiments:
         3. sequential_sipopt: calculate sensitivity by sIPOPT.
         4. sequential_kaug: calculate sensitivity by k_aug
         5. direct_kaug: calculate sensitivity by k_aug with direct sensitivity. **In construction**
+        6. direct_sensitivity: solve the base case once, then calculate the sensitivity of all measurements to all parameters 
+        in this process from one factorization of the constraint Jacobian, see __direct_sensitivity()
 
         Parameters:
         -----------
         design_values: a dict whose keys are design variable names, values are a dict whose keys are time point and values are the design variable value at that time point
-        mode: use mode='sequential_finite', 'simultaneous_finite', 'sequential_sipopt', 'sequential_kaug'
+        mode: use mode='sequential_finite', 'simultaneous_finite', 'sequential_sipopt', 'sequential_kaug', 'direct_sensitivity'
         FIM_store_name: if storing the FIM in a .csv, give the file name here as a string, '**.csv' or '**.txt'.
         specified_prior: if user needs a different prior, replace this toggle without creating a new object
         tee_opt: if IPOPT console output is printed
@@ -557,6 +826,21 @@ class DesignOfExperiments:
         L_LB: if FIM is positive definite, the diagonal element should be positive, so we can set a LB like 1E-10
         L_initial: initialize the L
 
+        Only effective when mode='sequential_finite':
+        reuse_model: if True, the model of each scenario is built at the first call and kept in self.model_pool.
+            Later calls only update the design variables (or mutable parameters, e.g. create_model(parametric=True) of the fixed bed)
+            and re-solve from the previous solution with a persistent solver. Call clear_model_pool() when the model arguments change.
+        scenario_workers: if more than 1, the base case is solved first, then the perturbed scenarios are solved concurrently 
+            in this number of worker processes, each initialized from the base case solution
+        threads_per_worker: the number of linear solver (BLAS/OpenMP) threads of each worker
+        mp_context: the multiprocessing context of the workers, see run_grid_search()
+        chain_warm_start: if True, every scenario model is initialized from the last converged solution of the same scenario 
+            (of the previous design), kept in self.chain_seed
+        perturb_in_place: if True, only the base case model is built. Every perturbed scenario changes the parameters 
+            (fixed variables or mutable parameters, e.g. fitted_transport_coefficient and ua of the fixed bed) of this model in place
+            and is re-solved with IPOPT warm started from the primal and dual solution of the base case. 
+            With reuse_model=True the model is kept for the next design. scenario_workers and chain_warm_start are not used
+
         Return:
         -------
         FIM_analysis: result summary object of this solve
@@ -566,6 +850,7 @@ class DesignOfExperiments:
         self.design_values = design_values
         self.mode = mode
         self.scale_nominal_param_value = scale_nominal_param_value
+        self.scenario_converged = None
         self.scale_constant_value = scale_constant_value
         self.formula = formula
         self.step = step
@@ -612,52 +897,73 @@ class DesignOfExperiments:
                 models = []
                 time_allbuild = []
                 time_allsolve = []
-                # loop over each scenario
-                for no_s in (scena_gen.scena_keys):
-
-                    scenario_iter = scena_gen.next_sequential_scenario(no_s)
-                    print('This scenario:', scenario_iter)
-                    # create the model
-                    # TODO:(long term) add options to create model once and then update. only try this after the
-                    # package is completed and unitest is finished
-                    time0_build = time.time()
-                    mod = self.create_model(scenario_iter, args=self.args)
-                    time1_build = time.time()
-                    time_allbuild.append(time1_build-time0_build)
-
-                    # discretize if needed
-                    if self.discretize_model is not None:
-                        mod = self.discretize_model(mod)
-
-                    # extract (discretized) time
-                    time_set = []
-                    for t in mod.t:
-                        time_set.append(value(t))
-
-                    # solve model
-                    time0_solve = time.time()
-                    square_result = self.__solve_doe(mod, fix=True)
-                    time1_solve = time.time()
-                    time_allsolve.append(time1_solve-time0_solve)
+                # solve all scenarios with the base case model, warm started from the base case solution
+                if perturb_in_place:
+                    mod, output_record, time_build, time_solve = self.solve_perturbations_in_place(scena_gen, reuse_model=reuse_model)
+                    time_allbuild.append(time_build)
+                    time_allsolve += time_solve
                     models.append(mod)
 
-                    if extract_single_model is not None:
-                        mod_name = store_output + str(no_s) + '.csv'
-                        dataframe = extract_single_model(mod, square_result)
-                        dataframe.to_csv(mod_name)
-
-                    # loop over measurement item and time to store model measurements
-                    output_iter = []
-
-                    for j in self.flatten_measure_name:
-                        for t in self.flatten_measure_timeset[j]:
-                            measure_string_name = self.measure.SP_measure_name(j,t,mode='sequential_finite')
-                            C_value = value(eval(measure_string_name))
-                            output_iter.append(C_value)
+                # solve the scenarios in worker processes, initialized from the base case
+                elif scenario_workers is not None and scenario_workers > 1:
+                    # the base case is one of the scenarios of the forward and backward schemes
+                    if self.formula == 'central':
+                        base_key = 'base'
+                        base_scenario = Scenario_generator(self.param_init, formula=None, step=self.step).simultaneous_scenario()
+                    else:
+                        base_key = no_para
+                        base_scenario = scena_gen.next_sequential_scenario(base_key)
+                        
+                    # the base case is stored like the other scenarios, unless it is only the seed of the central scheme
+                    base_stored = base_key in scena_gen.scena_keys
+                    mod, output_iter, time_build, time_solve = self.solve_scenario(base_key, base_scenario, reuse_model=reuse_model, 
+                                                                                   extract_single_model=extract_single_model if base_stored else None, 
+                                                                                   store_output=store_output, chain=chain_warm_start)
+                    time_allbuild.append(time_build)
+                    time_allsolve.append(time_solve)
+                    models.append(mod)
+                    if base_stored:
+                        output_record[base_key] = output_iter
+                    
+                    seed_values = [v.value for v in mod.component_data_objects(Var)]
+                    
+                    with ProcessPoolExecutor(max_workers=scenario_workers, mp_context=mp_context, initializer=_grid_worker_init,
+                                             initargs=(self.__worker_copy(), threads_per_worker)) as executor:
+                        futures = {}
+                        for no_s in scena_gen.scena_keys:
+                            if no_s not in output_record:
+                                futures[no_s] = executor.submit(_scenario_worker_run, no_s, scena_gen.next_sequential_scenario(no_s), 
+                                                                seed_values, extract_single_model, store_output)
+                        
+                        # a failed scenario raises here, as in the sequential loop
+                        for no_s in futures:
+                            output_iter, time_build, time_solve, converged = futures[no_s].result()
+                            self.__record_convergence(converged)
+                            time_allbuild.append(time_build)
+                            time_allsolve.append(time_solve)
+                            output_record[no_s] = output_iter
+                            if self.verbose:
+                                print('Output this time: ', output_record[no_s])
+                            
+                    output_record = {no_s: output_record[no_s] for no_s in scena_gen.scena_keys}
 
-                    output_record[no_s] = output_iter
+                # loop over each scenario
+                else:
+                    for no_s in (scena_gen.scena_keys):
+                        scenario_iter = scena_gen.next_sequential_scenario(no_s)
+                        if self.verbose:
+                            print('This scenario:', scenario_iter)
+                        
+                        mod, output_iter, time_build, time_solve = self.solve_scenario(no_s, scenario_iter, reuse_model=reuse_model, 
+                                                                                       extract_single_model=extract_single_model, 
+                                                                                       store_output=store_output, chain=chain_warm_start)
+                        time_allbuild.append(time_build)
+                        time_allsolve.append(time_solve)
+                        models.append(mod)
+                        output_record[no_s] = output_iter
 
-                    print('Output this time: ', output_record[no_s])
+                        if self.verbose:
+                            print('Output this time: ', output_record[no_s])
 
                 output_record['design'] = design_values
                 if store_output is not None:
@@ -686,7 +992,7 @@ class DesignOfExperiments:
             #jacobian_split = Jac_splitter(self.param_name, self.measure, jaco_information=jac, prior_FIM=prior_in_use,
             #                              scale_constant_value=self.scale_constant_value)
             FIM_analysis = FIM_result(self.param_name, self.measure, jacobian_info=None, all_jacobian_info=jac,
-                                      prior_FIM=prior_in_use, store_FIM=FIM_store_name, scale_constant_value=self.scale_constant_value)
+                                      prior_FIM=prior_in_use, store_FIM=FIM_store_name, scale_constant_value=self.scale_constant_value, verbose=self.verbose)
 
             # Store the Jacobian information for access by users
 
@@ -724,125 +1030,89 @@ class DesignOfExperiments:
                 # time building time and solving time store list
                 time_allbuild = []
                 time_allsolve = []
-                # loop over parameters
-                for pa in range(len(self.param_name)):
-                    perturb_mea = []
-                    base_mea = []
 
-                    # create model
-                    time0_build = time.time()
-                    mod = self.create_model(scenario_all, self.args)
-                    time1_build = time.time()
-                    time_allbuild.append(time1_build - time0_build)
+                # one model for all parameters
+                time0_build = time.time()
+                mod = self.create_model(scenario_all, self.args)
+                time1_build = time.time()
+                time_allbuild.append(time1_build - time0_build)
+
+                # discretize if needed
+                if self.discretize_model is not None:
+                    mod = self.discretize_model(mod)
 
-                    # discretize if needed
-                    if self.discretize_model is not None:
-                        mod = self.discretize_model(mod)
+                # parameters to perturb
+                list_original = []
+                for ele in self.param_name:
+                    list_original.append(self.components.get(mod, ele, 0))
 
+                if self.mode == 'sequential_sipopt':
                     # For sIPOPT, fix model DOF
-                    if self.mode =='sequential_sipopt':
-                        mod = self.__fix_design(mod, self.design_values, fix_opt=True)
-
-                    # extract (discretized) time
-                    time_set = []
-                    for t in mod.t:
-                        time_set.append(value(t))
-
-                    # add sIPOPT perturbation parameters
-                    mod = self.__add_parameter(mod, perturb=pa)
-
-                    # solve the square problem with the original parameters for k_aug mode, since k_aug does not calculate these
-                    if self.mode == 'sequential_kaug':
-                        self.__solve_doe(mod, fix=True)
-
-                    # parameter name lists for sipopt
-                    list_original = []
-                    list_perturb = []
-                    for ele in self.param_name:
-                        list_original.append(eval('mod.'+ele+'[0]'))
-                    for elem in self.perturb_names:
-                        list_perturb.append(eval('mod.'+elem+'[0]'))
-
-                    # solve model
-                    if self.mode =='sequential_sipopt':
-                        time0_solve = time.time()
-                        m_sipopt = sensitivity_calculation('sipopt', mod, list_original, list_perturb, tee=self.tee_opt, solver_options='ma57')
-                    else:
-                        time0_solve = time.time()
-                        m_sipopt = sensitivity_calculation('k_aug', mod, list_original, list_perturb, tee=self.tee_opt, solver_options='ma57')
+                    mod = self.__fix_design(mod, self.design_values, fix_opt=True)
 
+                    # one sIPOPT run, with one sensitivity step per (backward) perturbed parameter
+                    time0_solve = time.time()
+                    m_sipopt = self.__sipopt_all_parameters(mod, list_original)
                     time1_solve = time.time()
                     time_allsolve.append(time1_solve - time0_solve)
 
                     # extract sipopt result
-                    for j in self.flatten_measure_name:
-                        # check if this variable needs split name
-                        if self.measure.ind_string in j:
-                            measure_name = j.split(self.measure.ind_string)[0]
-                            measure_index = j.split(self.measure.ind_string)[1]
-                            # this is needed for using eval(). if the extra index is 'CA', it converts to "'CA'". only for the extra index as a string
-                            if type(measure_index) is str:
-                                measure_index_doublequotes = '"' + measure_index + '"'
+                    for count, para in enumerate(self.param_name):
+                        perturb_mea = []
+                        base_mea = []
+                        sens_sol_state = m_sipopt.component('sens_sol_state_' + str(count+1))
+                        for j in self.flatten_measure_name:
                             for t in self.flatten_measure_timeset[j]:
-                                measure_var = getattr(m_sipopt, measure_name)
-                                # check if this variable is fixed
-                                if (measure_var[0,measure_index,t].fixed == True):
-                                    perturb_value = value(measure_var[0,measure_index,t])
-                                else:
-                                    # if it is not fixed, record its perturbed value
-                                    if self.mode =='sequential_sipopt':
-                                        perturb_value = eval('m_sipopt.sens_sol_state_1[m_sipopt.' + measure_name + '[0,'+str(measure_index_doublequotes)+',' + str(t) + ']]')
-                                    else:
-                                        perturb_value = eval('m_sipopt.' + measure_name + '[0,' +str(measure_index_doublequotes)+',' + str(t) + ']()')
+                                # fetch the measurement variable
+                                measure_var = self.components.get(m_sipopt, *self.measure.measure_index(j, t))
 
                                 # base case values
-                                if self.mode == 'sequential_sipopt':
-                                    base_value = eval('m_sipopt.' + measure_name + '[0,'+str(measure_index_doublequotes)+',' + str(t) + '].value')
+                                base_value = measure_var.value
+                                # if it is not fixed, record its perturbed value
+                                if measure_var.fixed:
+                                    perturb_value = base_value
                                 else:
-                                    base_value = value(eval('mod.' + measure_name + '[0,' +str(measure_index_doublequotes)+','+ str(t) + ']'))
+                                    perturb_value = sens_sol_state[measure_var]
 
                                 perturb_mea.append(perturb_value)
                                 base_mea.append(base_value)
 
-                        else:
-                            # fetch the measurement variable
-                            measure_var = getattr(m_sipopt, j)
-                            for t in self.flatten_measure_timeset[j]:
-                                if (measure_var[0,t].fixed == True):
-                                    perturb_value = value(measure_var[0, t])
-                                else:
-                                    # if it is not fixed, record its perturbed value
-                                    if self.mode == 'sequential_sipopt':
-                                        perturb_value = eval('m_sipopt.sens_sol_state_1[m_sipopt.' + j + '[0,' + str(t) + ']]')
-                                    else:
-                                        perturb_value = eval('m_sipopt.' + j + '[0,' + str(t) + ']()')
+                        # store extracted measurements
+                        all_perturb_measure.append(perturb_mea)
+                        all_base_measure.append(base_mea)
+
+                    # After collecting outputs from all parameters, calculate sensitivity
+                    for count, para in enumerate(self.param_name):
+                        list_jac = []
+                        for i in range(len(all_perturb_measure[0])):
+                            if self.scale_nominal_param_value:
+                                sensi = -(all_perturb_measure[count][i] - all_base_measure[count][i]) / self.step * self.scale_constant_value
+                            else:
+                                sensi = -(all_perturb_measure[count][i] - all_base_measure[count][i]) / self.step /self.param_init[para] * self.scale_constant_value
+                            list_jac.append(sensi)
+                        # get Jacobian dict, keys are parameter name, values are sensitivity info
+                        jac[para] = list_jac
 
-                                # base case values
-                                if self.mode == 'sequential_sipopt':
-                                    base_value = eval('m_sipopt.' + j + '[0,'+ str(t) + '].value')
-                                else:
-                                    base_value = value(eval('mod.' + j + '[0,'+ str(t) + ']'))
+                else:
+                    # warm start from the nearest cached solution
+                    cache_key, warm_dual = self.__warm_start(mod, scenario_all)
 
-                                perturb_mea.append(perturb_value)
-                                base_mea.append(base_value)
+                    # solve the square problem with the original parameters, then one k_aug run gives dx/dp of all parameters
+                    time0_solve = time.time()
+                    square_result = self.__solve_doe(mod, fix=True, warm_dual=warm_dual)
+                    self.__cache_solution(mod, cache_key, square_result)
+                    self.__record_convergence(self.__converged(square_result))
+
+                    var_name = []
+                    var_dict = {}
+                    for comp, name in zip(list_original, self.param_name):
+                        var_name.append(comp.name)
+                        var_dict[comp.name] = self.param_init[name]
+                    dsdp_re, col = get_dsdp(mod, var_name, var_dict, tee=self.tee_opt)
+                    time1_solve = time.time()
+                    time_allsolve.append(time1_solve - time0_solve)
 
-                    # store extracted measurements
-                    all_perturb_measure.append(perturb_mea)
-                    all_base_measure.append(base_mea)
-                    print(all_perturb_measure)
-                    print(all_base_measure)
-
-                # After collecting outputs from all scenarios, calculate sensitivity
-                for count, para in enumerate(self.param_name):
-                    list_jac = []
-                    for i in range(len(all_perturb_measure[0])):
-                        if self.scale_nominal_param_value:
-                            sensi = -(all_perturb_measure[count][i] - all_base_measure[count][i]) / self.step * self.scale_constant_value
-                        else:
-                            sensi = -(all_perturb_measure[count][i] - all_base_measure[count][i]) / self.step /self.param_init[para] * self.scale_constant_value
-                        list_jac.append(sensi)
-                    # get Jacobian dict, keys are parameter name, values are sensitivity info
-                    jac[para] = list_jac
+                    jac = self.__dsdp_jacobian(dsdp_re, col)
 
             # check if another prior experiment FIM is provided other than the user-specified one
             if specified_prior is None:
@@ -852,7 +1122,7 @@ class DesignOfExperiments:
 
             # Assemble and analyze results
             FIM_analysis = FIM_result(self.param_name, self.measure, jacobian_info=None, all_jacobian_info=jac,
-                                      prior_FIM=prior_in_use, store_FIM=FIM_store_name, scale_constant_value=self.scale_constant_value)
+                                      prior_FIM=prior_in_use, store_FIM=FIM_store_name, scale_constant_value=self.scale_constant_value, verbose=self.verbose)
 
             time11 = time.time()
             if self.verbose:
@@ -905,7 +1175,7 @@ class DesignOfExperiments:
 
             # set ub and lb to parameters
             for par in self.param_name:
-                component = eval('mod.'+par+'[0]')
+                component = self.components.get(mod, par, 0)
                 component.setlb(self.param_init[par])
                 component.setub(self.param_init[par])
 
@@ -916,65 +1186,20 @@ class DesignOfExperiments:
                 var_name.append(name+'[0]')
                 var_dict[name+'[0]'] = self.param_init[name]
 
+            # warm start from the nearest cached solution
+            cache_key, warm_dual = self.__warm_start(mod, scenario_all)
+
             # call k_aug get_dsdp function
             time0_solve = time.time()
-            square_result = self.__solve_doe(mod, fix=True)
+            square_result = self.__solve_doe(mod, fix=True, warm_dual=warm_dual)
+            self.__cache_solution(mod, cache_key, square_result)
+            self.__record_convergence(self.__converged(square_result))
             dsdp_re, col = get_dsdp(mod, var_name, var_dict, tee=self.tee_opt)
             time1_solve = time.time()
             time_solve = time1_solve - time0_solve
 
             # analyze result
-            dsdp_array = dsdp_re.toarray().T
-            # here for construction. Remove after finishing.
-            #dd = pd.DataFrame(dsdp_array)
-            #print(dd)
-            #dd.to_csv('test_kaug.csv')
-            # here for fixed bed
-            self.dsdp = dsdp_array
-            self.dsdp = col
-            # store dsdp returned
-            dsdp_extract = []
-            # get right lines from results
-            measurement_index = []
-            measurement_names = []
-            # produce the sensitivity for fixed variables
-            zero_sens = np.zeros(len(self.param_name))
-
-            # loop over measurement variables and their time points
-            for measurement_name in self.measure.model_measure_name:
-                # get right line number in kaug results
-                if self.discretize_model is not None:
-                    # for DAE model, some variables are fixed
-                    try:
-                        kaug_no = col.index(measurement_name)
-                        measurement_index.append(kaug_no)
-                        # get right line of dsdp
-                        dsdp_extract.append(dsdp_array[kaug_no])
-                    except:
-                        if self.verbose:
-                            print('The variable is fixed:', measurement_name)
-                        # for fixed variables, the sensitivity are a zero vector
-                        dsdp_extract.append(zero_sens)
-                else:
-                    kaug_no = col.index(measurement_name)
-                    measurement_index.append(kaug_no)
-                    # get right line of dsdp
-                    dsdp_extract.append(dsdp_array[kaug_no])
-
-            print('dsdp extract is:', dsdp_extract)
-            # Extract and calculate sensitivity if scaled by constants or parameters.
-            # Convert sensitivity to a dictionary
-            jac = {}
-            for par in self.param_name:
-                jac[par] = []
-
-            for d in range(len(dsdp_extract)):
-                for p, par in enumerate(self.param_name):
-                    # if scaled by parameter value or constant value
-                    if self.scale_nominal_param_value:
-                        jac[par].append(self.param_init[par]*dsdp_extract[d][p]*self.scale_constant_value)
-                    else:
-                        jac[par].append(dsdp_extract[d][p]*self.scale_constant_value)
+            jac = self.__dsdp_jacobian(dsdp_re, col)
 
             time11 = time.time()
             if self.verbose:
@@ -991,7 +1216,7 @@ class DesignOfExperiments:
             # Assemble and analyze results
             FIM_analysis = FIM_result(self.param_name,self.measure, jacobian_info=None, all_jacobian_info=jac,
                                       prior_FIM=prior_in_use, store_FIM=FIM_store_name,
-                                      scale_constant_value=self.scale_constant_value)
+                                      scale_constant_value=self.scale_constant_value, verbose=self.verbose)
             
             
             self.jac = jac
@@ -1002,8 +1227,438 @@ class DesignOfExperiments:
             return FIM_analysis
 
 
+        elif self.mode == 'direct_sensitivity':
+            time00 = time.time()
+            # create scenario class for a base case
+            scena_gen = Scenario_generator(self.param_init, formula=None, step=self.step)
+            scenario_all = scena_gen.simultaneous_scenario()
+
+            # build and solve the base case
+            mod, output_iter, time_build, time_solve = self.solve_scenario('base', scenario_all, reuse_model=reuse_model, 
+                                                                           chain=chain_warm_start)
+
+            # sensitivity of the measurements, in the order of the sequential_finite outputs
+            time0_sens = time.time()
+            dydp = self.__direct_sensitivity(mod)
+            time_sens = time.time() - time0_sens
+
+            jac = {}
+            for p, par in enumerate(self.param_name):
+                if self.scale_nominal_param_value:
+                    jac[par] = list(dydp[:,p]*self.param_init[par]*self.scale_constant_value)
+                else:
+                    jac[par] = list(dydp[:,p]*self.scale_constant_value)
+
+            time11 = time.time()
+            if self.verbose:
+                print('Build time with direct_sensitivity mode [s]:', time_build)
+                print('Solve time with direct_sensitivity mode [s]:', time_solve)
+                print('Sensitivity time with direct_sensitivity mode [s]:', time_sens)
+                print('Total wall clock time [s]:', time11-time00)
+
+            # check if another prior experiment FIM is provided other than the user-specified one
+            if specified_prior is None:
+                prior_in_use = self.prior_FIM
+            else:
+                prior_in_use = specified_prior
+
+            FIM_analysis = FIM_result(self.param_name, self.measure, jacobian_info=None, all_jacobian_info=jac,
+                                      prior_FIM=prior_in_use, store_FIM=FIM_store_name,
+                                      scale_constant_value=self.scale_constant_value, verbose=self.verbose)
+
+            self.jac = jac
+            self.models = [mod]
+            FIM_analysis.build_time = time_build
+            FIM_analysis.solve_time = time_solve + time_sens
+
+            return FIM_analysis
+
+        else:
+            raise ValueError('This is not a valid mode. Choose from "sequential_finite", "simultaneous_finite", "sequential_sipopt", "sequential_kaug", "direct_sensitivity"')
+
+    def __sipopt_all_parameters(self, mod, param_comps):
+        '''
+        Run sIPOPT once on a model, with one sensitivity step for every parameter.
+        Step k perturbs parameter k backward by self.step and keeps the others at their nominal values,
+        so the perturbed solutions of all parameters come from one NLP solve and one KKT factorization.
+
+        Parameters
+        ----------
+        mod: the model, with the design variables fixed
+        param_comps: the parameter components, fixed variables or mutable parameters, in the order of self.param_name
+
+        Returns
+        --------
+        m_sipopt: the solved copy of the model. The perturbed solution of step k is in the suffix sens_sol_state_k
+        '''
+        sens = SensitivityInterface(mod, clone_model=True)
+        sens.setup_sensitivity(param_comps)
+        m_sipopt = sens.model_instance
+
+        for step, par in enumerate(self.param_name, start=1):
+            # step 1 suffixes are declared by the sensitivity interface
+            if step > 1:
+                for name, direction in [('sens_state_', Suffix.EXPORT), ('sens_state_value_', Suffix.EXPORT), 
+                                        ('sens_sol_state_', Suffix.IMPORT)]:
+                    m_sipopt.add_component(name + str(step), Suffix(direction=direction))
+
+            sens_state = m_sipopt.component('sens_state_' + str(step))
+            sens_state_value = m_sipopt.component('sens_state_value_' + str(step))
+            for i, (var, param, list_idx, comp_idx) in enumerate(sens.block._sens_data_list):
+                sens_state[var] = i + 1
+                if self.param_name[list_idx] == par:
+                    sens_state_value[var] = self.param_init[par]*(1 - self.step)
+                else:
+                    sens_state_value[var] = self.param_init[self.param_name[list_idx]]
+
+        ipopt_sens = SolverFactory('ipopt_sens', solver_io='nl')
+        ipopt_sens.options['run_sens'] = 'yes'
+        ipopt_sens.options['n_sens_steps'] = len(self.param_name)
+        ipopt_sens.options['linear_solver'] = 'ma57'
+        sens_result = ipopt_sens.solve(m_sipopt, tee=self.tee_opt)
+        self.__record_convergence(self.__converged(sens_result))
+
+        return m_sipopt
+
+    def __dsdp_jacobian(self, dsdp_re, col):
+        '''
+        Jacobian of the measurements from the k_aug sensitivity matrix
+
+        Parameters
+        ----------
+        dsdp_re: the sensitivity matrix returned by get_dsdp, rows are the parameters, columns are the variables
+        col: the variable names of the columns
+
+        Returns
+        --------
+        jac: Jacobian, a dictionary, keys are parameter names, values are a list of jacobian values with respect to this parameter
+        '''
+        dsdp_array = dsdp_re.toarray().T
+        self.dsdp = dsdp_array
+        # store dsdp returned
+        dsdp_extract = []
+        # produce the sensitivity for fixed variables
+        zero_sens = np.zeros(len(self.param_name))
+
+        # loop over measurement variables and their time points
+        for measurement_name in self.measure.model_measure_name:
+            # get right line number in kaug results
+            if measurement_name in col:
+                dsdp_extract.append(dsdp_array[col.index(measurement_name)])
+            else:
+                # fixed variables are not in the k_aug results, their sensitivity is a zero vector
+                if self.verbose:
+                    print('The variable is fixed:', measurement_name)
+                dsdp_extract.append(zero_sens)
+
+        # Extract and calculate sensitivity if scaled by constants or parameters.
+        # Convert sensitivity to a dictionary
+        jac = {}
+        for par in self.param_name:
+            jac[par] = []
+
+        for d in range(len(dsdp_extract)):
+            for p, par in enumerate(self.param_name):
+                # if scaled by parameter value or constant value
+                if self.scale_nominal_param_value:
+                    jac[par].append(self.param_init[par]*dsdp_extract[d][p]*self.scale_constant_value)
+                else:
+                    jac[par].append(dsdp_extract[d][p]*self.scale_constant_value)
+        return jac
+
+    def __direct_sensitivity(self, mod, wrt=None):
+        '''
+        Sensitivity of the measurements to the parameters at the solution of a square model.
+        At a solution of a square problem the constraint rows of the KKT conditions give J_x dx/dp = -J_p,
+        where J_x is the Jacobian of the equality constraints to the free variables and J_p to the parameters,
+        so dx/dp is solved from one sparse LU factorization of J_x with one right-hand side per parameter.
+        The Jacobians are assembled with reverse mode differentiation of the constraint expressions.
+
+        Parameters
+        ----------
+        mod: the solved model. Parameters are mod.<name>[0], fixed variables or mutable parameters
+        wrt: a list of fixed variables or mutable parameters the sensitivity is taken to, e.g. the design variables.
+            If None, the parameters
+
+        Returns
+        --------
+        dydp: an array, rows are the measurements in the order of the sequential_finite outputs, columns are the parameters (or wrt)
+        '''
+        # parameter columns
+        if wrt is None:
+            param_comps = []
+            for par in self.param_name:
+                param_comps.append(self.components.get(mod, par, 0))
+        else:
+            param_comps = list(wrt)
+        param_col = {id(comp): p for p, comp in enumerate(param_comps)}
+
+        # free variable columns, numbered in the order they appear in the constraints
+        var_col = {}
+        rows_x, cols_x, vals_x = [], [], []
+        rows_p, cols_p, vals_p = [], [], []
+
+        constraints = list(mod.component_data_objects(Constraint, active=True))
+        for i, con in enumerate(constraints):
+            if not con.equality:
+                raise ValueError('direct_sensitivity needs a square model of equality constraints, ' + con.name + ' is an inequality.')
+
+            for comp, deriv in reverse_ad(con.body).items():
+                if id(comp) in param_col:
+                    rows_p.append(i)
+                    cols_p.append(param_col[id(comp)])
+                    vals_p.append(deriv)
+                elif getattr(comp, 'is_variable_type', lambda: False)() and not comp.fixed:
+                    if id(comp) not in var_col:
+                        var_col[id(comp)] = len(var_col)
+                    rows_x.append(i)
+                    cols_x.append(var_col[id(comp)])
+                    vals_x.append(deriv)
+
+        if len(var_col) != len(constraints):
+            raise ValueError('direct_sensitivity needs a square model. Found ' + str(len(constraints)) + ' equality constraints and '
+                             + str(len(var_col)) + ' free variables.')
+
+        n = len(constraints)
+        J_x = coo_matrix((vals_x, (rows_x, cols_x)), shape=(n, n)).tocsc()
+        J_p = coo_matrix((vals_p, (rows_p, cols_p)), shape=(n, len(param_comps))).toarray()
+
+        # one factorization, one solve with a right-hand side for every parameter
+        dxdp = -splu(J_x).solve(J_p)
+
+        # sensitivity of the measurements, variables or expressions of the variables and parameters
+        dydp = []
+        for j in self.flatten_measure_name:
+            for t in self.flatten_measure_timeset[j]:
+                measurement = self.components.get(mod, *self.measure.measure_index(j, t))
+
+                sens = np.zeros(len(param_comps))
+                if measurement.is_variable_type():
+                    derivatives = [(measurement, 1.0)]
+                else:
+                    derivatives = reverse_ad(measurement).items()
+
+                for comp, deriv in derivatives:
+                    if id(comp) in param_col:
+                        sens[param_col[id(comp)]] += deriv
+                    elif id(comp) in var_col:
+                        sens += deriv*dxdp[var_col[id(comp)]]
+                dydp.append(sens)
+
+        return np.array(dydp)
+
+    def solve_scenario(self, no_s, scenario_iter, reuse_model=False, seed_values=None, extract_single_model=None, store_output=None,
+                       chain=False):
+        '''
+        Build (or reuse) and solve the model of one scenario of sequential_finite mode, with the design of the last compute_FIM() call
+
+        Parameters
+        ----------
+        no_s: scenario No., the key of the model in self.model_pool
+        scenario_iter: scenario dict of this model
+        reuse_model: if True, the model is kept in self.model_pool, see compute_FIM()
+        seed_values: values of all variables of a solved model of the same structure, in component_data_objects order,
+            e.g. the base case. The variables that are not fixed are initialized with them
+        extract_single_model: a function (model, solver result) returning a dataframe stored as store_output + str(no_s) + '.csv'
+        store_output: the name the extracted model is stored with
+        chain: if True and seed_values is None, the model is initialized from self.chain_seed[no_s], 
+            and a converged solution replaces it
+
+        Returns
+        --------
+        mod: the solved model
+        output_iter: a list of the measurements
+        time_build: build time [s]
+        time_solve: solve time [s]
+        '''
+        # reuse the model of this scenario, warm started from its last solution
+        if reuse_model and no_s in self.model_pool:
+            mod, mod_solver = self.model_pool[no_s]
+            time_build = 0
+
+        else:
+            # create the model
+            time0_build = time.time()
+            mod = self.create_model(scenario_iter, args=self.args)
+            time1_build = time.time()
+            time_build = time1_build-time0_build
+
+            # discretize if needed
+            if self.discretize_model is not None:
+                mod = self.discretize_model(mod)
+
+            mod_solver = self.solver
+            if reuse_model:
+                mod_solver = self.__get_persistent_solver()
+                self.model_pool[no_s] = (mod, mod_solver)
+
+        if chain and seed_values is None:
+            seed_values = self.chain_seed.get(no_s)
+
+        if seed_values is not None:
+            var_list = list(mod.component_data_objects(Var))
+            if len(var_list) != len(seed_values):
+                raise ValueError('The seed values do not match the variables of scenario ' + str(no_s))
+            for v, val in zip(var_list, seed_values):
+                if not v.fixed and val is not None:
+                    v.set_value(val, skip_validation=True)
+
+        # warm start from the nearest cached solution
+        cache_key, warm_dual = self.__warm_start(mod, scenario_iter)
+
+        # solve model
+        time0_solve = time.time()
+        square_result = self.__solve_doe(mod, fix=True, warm_dual=warm_dual, solver=mod_solver)
+        time1_solve = time.time()
+        time_solve = time1_solve-time0_solve
+        self.__cache_solution(mod, cache_key, square_result)
+        # solver result of the last scenario solved
+        self.scenario_result = square_result
+        self.__record_convergence(self.__converged(square_result))
+
+        if chain and self.__converged(square_result):
+            self.chain_seed[no_s] = [v.value for v in mod.component_data_objects(Var)]
+
+        if extract_single_model is not None:
+            mod_name = store_output + str(no_s) + '.csv'
+            dataframe = extract_single_model(mod, square_result)
+            dataframe.to_csv(mod_name)
+
+        # loop over measurement item and time to store model measurements
+        output_iter = []
+
+        for j in self.flatten_measure_name:
+            for t in self.flatten_measure_timeset[j]:
+                C_value = value(self.components.get(mod, *self.measure.measure_index(j, t)))
+                output_iter.append(C_value)
+
+        return mod, output_iter, time_build, time_solve
+
+    def solve_perturbations_in_place(self, scena_gen, reuse_model=False):
+        '''
+        Solve all scenarios of sequential_finite mode with one model, with the design of the last compute_FIM() call.
+        The base case is solved first. For every perturbed scenario the parameters are changed in place and the model is 
+        re-solved from the base case primal and dual solution (IPOPT warm_start_init_point)
+
+        Parameters
+        ----------
+        scena_gen: the Scenario_generator of the sequential scenarios, after generate_sequential_para()
+        reuse_model: if True, the model is kept in self.model_pool['in_place'] for the next design
+
+        Returns
+        --------
+        mod: the model, with the parameters of the base case
+        output_record: a dictionary, keys are the scenario No., values are a list of the measurements
+        time_build: build time [s]
+        time_solve: a list of the solve time of the base case and each scenario [s]
+        '''
+        # the base case: nominal parameters
+        base_scenario = Scenario_generator(self.param_init, formula=None, step=self.step).simultaneous_scenario()
+
+        if reuse_model and 'in_place' in self.model_pool:
+            mod, base_solution = self.model_pool['in_place']
+            time_build = 0
         else:
-            raise ValueError('This is not a valid mode. Choose from "sequential_finite", "simultaneous_finite", "sequential_sipopt", "sequential_kaug"')
+            time0_build = time.time()
+            mod = self.create_model(base_scenario, args=self.args)
+            time_build = time.time() - time0_build
+
+            if self.discretize_model is not None:
+                mod = self.discretize_model(mod)
+
+            # one entry: the base case solution with duals and bound multipliers
+            base_solution = Solution_cache(max_entries=1, store_dual=True, verbose=False)
+            if reuse_model:
+                self.model_pool['in_place'] = (mod, base_solution)
+        base_solution.prepare(mod)
+
+        param_comps = [self.components.get(mod, par, 0) for par in self.param_name]
+
+        def set_parameters(param_values):
+            for comp, par in zip(param_comps, self.param_name):
+                if comp.is_variable_type():
+                    comp.fix(param_values[par])
+                else:
+                    comp.set_value(param_values[par])
+
+        def measurements():
+            return [value(self.components.get(mod, *self.measure.measure_index(j, t)))
+                    for j in self.flatten_measure_name for t in self.flatten_measure_timeset[j]]
+
+        # solve the base case, warm started from the base case of the last design if the model is reused
+        set_parameters(self.param_init)
+        warm_dual = base_solution.warm_start(mod, {})
+        time0_solve = time.time()
+        base_result = self.__solve_doe(mod, fix=True, warm_dual=warm_dual)
+        time_solve = [time.time() - time0_solve]
+        self.__record_convergence(self.__converged(base_result))
+        if not self.__converged(base_result):
+            raise RuntimeError('The base case did not converge at the design ' + str(self.design_values))
+        base_solution.store(mod, {})
+        base_output = measurements()
+
+        output_record = {}
+        for no_s in scena_gen.scena_keys:
+            # the base case is one of the scenarios of the forward and backward schemes
+            if scena_gen.scena[no_s] == self.param_init:
+                output_record[no_s] = base_output
+                continue
+
+            set_parameters(scena_gen.scena[no_s])
+            warm_dual = base_solution.warm_start(mod, {})
+            time0_solve = time.time()
+            result = self.__solve_doe(mod, fix=True, warm_dual=warm_dual)
+            time_solve.append(time.time() - time0_solve)
+            self.__record_convergence(self.__converged(result))
+            if not self.__converged(result):
+                # leave a reused model at the base case before giving up
+                set_parameters(self.param_init)
+                raise RuntimeError('The perturbed scenario ' + str(no_s) + ' did not converge at the design ' + str(self.design_values))
+            output_record[no_s] = measurements()
+
+            if self.verbose:
+                print('Output this time: ', output_record[no_s])
+
+        # leave the model at the base case for the next design
+        set_parameters(self.param_init)
+        base_solution.warm_start(mod, {})
+
+        return mod, output_record, time_build, time_solve
+
+    def solve_scenario_sensitivity(self, no_s, scenario_iter, design_keys):
+        '''
+        Solve the model of one scenario of sequential_finite mode with the design of self.design_values, kept in self.model_pool, 
+        and compute the sensitivity of its measurements to the design variables. 
+        This is the work of one scenario block of optimize_doe(decomposition='schur')
+
+        Parameters
+        ----------
+        no_s: scenario No., the key of the model in self.model_pool
+        scenario_iter: scenario dict of this model
+        design_keys: a list of (design variable name, time) of the design variables, time is None if it is not indexed by time
+
+        Returns
+        --------
+        output_iter: a list of the measurements
+        dydd: an array, rows are the measurements, columns are the design variables of design_keys
+        bounds: a list of (lower bound, upper bound) of the design variables
+        converged: if the solve converged
+        '''
+        mod, output_iter, time_build, time_solve = self.solve_scenario(no_s, scenario_iter, reuse_model=True)
+        converged = self.__converged(self.scenario_result)
+
+        design_comps = []
+        bounds = []
+        for dname, tim in design_keys:
+            comp = self.components.get(mod, dname) if tim is None else self.components.get(mod, dname, tim)
+            design_comps.append(comp)
+            if comp.is_variable_type():
+                bounds.append((comp.lb, comp.ub))
+            else:
+                bounds.append((None, None))
+
+        dydd = self.__direct_sensitivity(mod, wrt=design_comps)
+        return output_iter, dydd, bounds, converged
 
     def __finite_calculation(self, output_record, scena_gen):
         '''
@@ -1072,7 +1727,7 @@ class DesignOfExperiments:
         Parameters:
         -----------
         design_values_set: a list of experiments, each element is one design_values dictionary
-        mode: use mode='sequential_finite', 'simultaneous_finite', 'sequential_sipopt', 'sequential_kaug'
+        mode: use mode='sequential_finite', 'simultaneous_finite', 'sequential_sipopt', 'sequential_kaug', 'direct_sensitivity'
         tee_option: if IPOPT console output is printed
         scale_nominal_param_value: if True, the parameters are scaled by its own nominal value in param_init
         scale_constant_value: how many order of magnitudes the Jacobian value is scaled by. Use when the Jac or FIM value is too small
@@ -1124,8 +1779,8 @@ class DesignOfExperiments:
             if (self.mode == 'simultaneous_finite'):
                 result_iter.extract_FIM(self.m, self.design_timeset, self.square_result, self.objective_option, add_fim=True)
 
-            elif (self.mode in ['sequential_finite', 'sequential_sipopt', 'sequential_kaug']):
-                result_iter.calculate_FIM(self.jac, self.design_values)
+            elif (self.mode in ['sequential_finite', 'sequential_sipopt', 'sequential_kaug', 'direct_sensitivity']):
+                result_iter.calculate_FIM(self.design_values, converged=self.scenario_converged)
 
             # attach these results to the store list
             result_object_list.append(result_iter)
@@ -1135,10 +1790,12 @@ class DesignOfExperiments:
 
     def run_grid_search(self, design_values, design_ranges, design_dimension_names, design_control_time, mode='sequential_finite',
                         tee_option=False, scale_nominal_param_value=False, scale_constant_value=1, store_name= None, read_name=None,
-                        filename=None, formula='central', step=0.001):
+                        filename=None, formula='central', step=0.001, reuse_model=False, 
+                        workers=None, threads_per_worker=1, mp_context=None, checkpoint=None, resume=False, 
+                        traversal='product', perturb_in_place=False):
         '''
         Enumerate through full grid search for any number of design variables;
-        solve square problems sequentially to compute FIMs.
+        solve square problems sequentially, or in parallel worker processes, to compute FIMs.
         It calculates FIM with sensitivity information from four ways:
         1. Simultaneous: Calculate a multiple scenario model. Sensitivity info estimated by finite difference
         2. Sequential_ipopt: Calculates a one scenario model multiple times for
@@ -1153,7 +1810,7 @@ class DesignOfExperiments:
         design_ranges: a list of design variable values to go over
         design_dimension_names: a list of design variable names of each design range
         deisgn_control_time: a list of control time points that should be fixed to the values in dv_ranges
-        mode: use mode='sequential_finite', 'simultaneous_finite', 'sequential_sipopt', 'sequential_kaug'
+        mode: use mode='sequential_finite', 'simultaneous_finite', 'sequential_sipopt', 'sequential_kaug', 'direct_sensitivity'
         tee_option: if IPOPT console output is made
         scale_nominal_param_value: if True, the parameters are scaled by its own nominal value in param_init
         scale_constant_value: how many order of magnitudes the Jacobian value is scaled by. Use when the Jac or FIM value is too small
@@ -1162,6 +1819,27 @@ class DesignOfExperiments:
         Only effective when finite=True:
         formula: choose from 'central', 'forward', 'backward', None
         step: Sensitivity perturbation step size, a fraction between [0,1]. default is 0.001
+        reuse_model: if True, the models are built once and re-solved at every design with a persistent solver, see compute_FIM().
+            With workers, every worker process keeps its own models and solvers
+
+        Parallel options:
+        workers: the number of worker processes. If None or 1, the designs are solved in this process
+        threads_per_worker: the number of linear solver (BLAS/OpenMP) threads of each worker, so that workers*threads_per_worker 
+            does not oversubscribe the machine
+        mp_context: the multiprocessing context of the workers, e.g. multiprocessing.get_context('spawn'). 
+            If None, the platform default is used. With 'spawn', create_model must be importable (not defined in a notebook)
+
+        Checkpoint options:
+        checkpoint: a file name. Every finished design (FIM, Jacobian, solver status, timings) is appended to this file 
+            as soon as it finishes. Load it with Grid_Search_Result.from_checkpoint()
+        resume: if True, the designs that converged in the checkpoint are not solved again. Failed designs are solved again
+
+        traversal: the order the designs are solved in, see grid_traversal(). 'product' solves every design from the 
+            initial point of create_model. 'serpentine' and 'nearest' visit adjacent designs in turn, and every scenario model 
+            is initialized from the converged solution of the previous design. With workers, each worker chains from the last 
+            design it solved
+        perturb_in_place: if True, every design builds (or with reuse_model, reuses) only the base case model, 
+            see compute_FIM()
 
         Return:
         -------
@@ -1180,41 +1858,16 @@ class DesignOfExperiments:
 
         # when defining design space, design variable values are defined as in design_values argument
         # the design var value defined in dv_ranges only applies to control time points given in dv_apply_time
-        grid_dimension = len(design_ranges)
 
         # to store all FIM results
         result_combine = {}
 
-
-
-        # iteration 0
-        count = 0
-        failed_count = 0
-        # how many sets of design variables will be run
-        total_count = 1
-        for i in range(grid_dimension):
-            total_count *= len(design_ranges[i])
-        print(total_count, ' design vectors will be searched.')
-
         # generate combinations of design variable values to go over
-        search_design_set = product(*design_ranges)
-
-        build_time_store=[]
-        solve_time_store=[]
-
-        # loop over deign value combinations
-        for design_set_iter in search_design_set:
+        # every design point is (design tuple, design variable dictionary, store name, read name)
+        design_points = []
+        for count, design_set_iter in enumerate(product(*design_ranges)):
             # generate the design variable dictionary needed for running compute_FIM
-            # first copy value from design_Values
-            design_iter = design_values.copy()
-
-            # update the controlled value of certain time points for certain design variables
-            for i in range(grid_dimension):
-                for v, value in enumerate(design_control_time[i]):
-                    design_iter[design_dimension_names[i]][value] = list(design_set_iter)[i]
-
-            print('=======This is the ', count+1, 'th iteration=======')
-            print('Design variable values of this iteration:', design_iter)
+            design_iter = self.__design_dictionary(design_values, design_set_iter, design_dimension_names, design_control_time)
 
             # generate store name
             if store_name is None:
@@ -1227,45 +1880,101 @@ class DesignOfExperiments:
             else:
                 read_input_name = None
 
-            # call compute_FIM to get FIM
-            try:
-                result_iter = self.compute_FIM(design_iter, mode=mode,
-                                               tee_opt=tee_option,
-                                               scale_nominal_param_value=scale_nominal_param_value,
-                                               scale_constant_value = scale_constant_value,
-                                               store_output=store_output_name, read_output=read_input_name,
-                                               #extract_single_model=extract3_v2,
-                                               formula=formula, step=step)
-                if read_input_name is None:
-                    build_time_store.append(result_iter.build_time)
-                    solve_time_store.append(result_iter.solve_time)
-
-                count += 1
-
-                if (mode=='simultaneous_finite'):
-                    result_iter.extract_FIM(self.m, self.design_timeset, self.square_result, self.objective_option)
+            design_points.append((tuple(design_set_iter), design_iter, store_output_name, read_input_name))
 
-                elif (mode in ['sequential_finite', 'sequential_sipopt', 'sequential_kaug', 'direct_kaug']):
-                    result_iter.calculate_FIM(self.jac, self.design_values)
-
-                t_now = time.time()
+        # how many sets of design variables will be run
+        total_count = len(design_points)
+        print(total_count, ' design vectors will be searched.')
 
-                if self.verbose:
-                    # give run information at each iteration
-                    print('This is the ', count+1, ' run out of ', total_count, 'run.')
-                    print('The code has run %.04f seconds.'% (t_now-t_enumeration_begin))
-                    print('Estimated remaining time: %.4f seconds' % ((t_now-t_enumeration_begin)/(count+1)*(total_count-count-1)))
+        # options of compute_FIM
+        fim_options = {'mode': mode, 'tee_opt': tee_option, 'scale_nominal_param_value': scale_nominal_param_value,
+                       'scale_constant_value': scale_constant_value, 'formula': formula, 'step': step, 
+                       'reuse_model': reuse_model}
+        if traversal != 'product':
+            fim_options['chain_warm_start'] = True
+        if perturb_in_place:
+            fim_options['perturb_in_place'] = True
 
+        build_time_store=[]
+        solve_time_store=[]
+        failed_count = 0
 
-                # the combined result object are organized as a dictionary, keys are a tuple of the design variable values, values are a result object
-                result_combine[tuple(design_set_iter)] = result_iter
+        # the combined result object are organized as a dictionary, keys are a tuple of the design variable values, values are a result object
+        results = {}
+
+        if checkpoint is not None:
+            store_checkpoint = Grid_search_checkpoint(checkpoint)
+            finished = store_checkpoint.start(design_ranges, design_dimension_names, design_control_time, resume=resume)
+            for design_key in finished:
+                if finished[design_key]['result'] is not None:
+                    results[design_key] = finished[design_key]['result']
+            if resume:
+                print(len(results), ' design vectors are loaded from the checkpoint.')
+
+        design_values_of = {design_key: design_iter for design_key, design_iter, store_output_name, read_input_name in design_points}
+        design_points = [point for point in design_points if point[0] not in results]
+        total_count = len(design_points)
+
+        # order the designs along the traversal path
+        order = {design_key: i for i, design_key in enumerate(grid_traversal(design_ranges, traversal=traversal))}
+        design_points.sort(key=lambda point: order[point[0]])
+        
+        def record(count, design_key, result_iter, error):
+            '''Record the result of one design point, run in the order of completion'''
+            nonlocal failed_count
+            if checkpoint is not None:
+                store_checkpoint.append(design_key, design_values_of[design_key], result_iter, error)
 
-            except:
+            if result_iter is None:
                 print(':::::::::::ERROR: Cannot converge this run.::::::::::::')
-                count += 1
+                print('Design:', design_key, error)
                 failed_count += 1
                 print('failed count:', failed_count)
-                result_combine[tuple(design_set_iter)] = None
+            else:
+                if getattr(result_iter, 'build_time', None) is not None:
+                    build_time_store.append(result_iter.build_time)
+                    solve_time_store.append(result_iter.solve_time)
+
+            t_now = time.time()
+            if self.verbose:
+                # give run information at each iteration
+                print('This is the ', count, ' run out of ', total_count, 'run.')
+                print('The code has run %.04f seconds.'% (t_now-t_enumeration_begin))
+                print('Estimated remaining time: %.4f seconds' % ((t_now-t_enumeration_begin)/count*(total_count-count)))
+
+        if workers is None or workers <= 1:
+            # loop over deign value combinations
+            for count, (design_key, design_iter, store_output_name, read_input_name) in enumerate(design_points):
+                print('=======This is the ', count+1, 'th iteration=======')
+                print('Design variable values of this iteration:', design_iter)
+
+                results[design_key], error = self.compute_grid_point(design_iter, store_output=store_output_name,
+                                                                     read_output=read_input_name, **fim_options)
+                record(count+1, design_key, results[design_key], error)
+
+        else:
+            # every worker keeps a copy of this object, with its own models and solvers
+            worker_doe = self.__worker_copy()
+
+            with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_grid_worker_init,
+                                     initargs=(worker_doe, threads_per_worker)) as executor:
+                futures = {}
+                for design_key, design_iter, store_output_name, read_input_name in design_points:
+                    future = executor.submit(_grid_worker_run, design_iter, store_output_name, read_input_name, fim_options)
+                    futures[future] = design_key
+
+                for count, future in enumerate(as_completed(futures)):
+                    design_key = futures[future]
+                    try:
+                        results[design_key], error = future.result()
+                    except Exception as err:
+                        # the worker process died, e.g. a solver crash
+                        results[design_key], error = None, repr(err)
+                    record(count+1, design_key, results[design_key], error)
+
+        # results are ordered as the grid, independent of the completion order
+        for design_key in design_values_of:
+            result_combine[design_key] = results[design_key]
 
         # For user's access
         self.all_fim = result_combine
@@ -1283,12 +1992,251 @@ class DesignOfExperiments:
 
         t_enumeration_stop = time.time()
         if self.verbose:
+            if self.cache is not None and (workers is None or workers <= 1):
+                print('Warm start cache hits:', self.cache.hits, ', misses:', self.cache.misses, ', evicted:', self.cache.evicted)
+            print('Failed designs:', failed_count)
             print('Overall model building time [s]:', sum(build_time_store))
             print('Overall model solve time [s]:', sum(solve_time_store))
             print('Overall wall clock time [s]:', t_enumeration_stop - t_enumeration_begin)
 
         return figure_draw_object
 
+    def run_adaptive_search(self, design_values, design_ranges, design_dimension_names, design_control_time, 
+                            mode='sequential_finite', criterion='D', max_evaluations=None, initial_samples=None, 
+                            batch_size=1, sampling='lhs', exploration=0.5, refinement=0.25, seed=None, 
+                            tee_option=False, scale_nominal_param_value=False, scale_constant_value=1,
+                            formula='central', step=0.001, reuse_model=False, filename=None):
+        '''
+        Search the design space with a fraction of the solves of run_grid_search().
+        The search starts from a space-filling sample of the grid of design_ranges, then adds the designs with the highest score of
+        a surrogate (radial basis function interpolation of log10 of the criterion over the finished designs). The score of a design is
+        the sum of the scaled predicted criterion, refinement times the scaled spread of the criterion between its nearest finished designs
+        (where it changes quickly), and exploration times its scaled distance to the finished designs.
+
+        Parameters:
+        -----------
+        design_values, design_ranges, design_dimension_names, design_control_time: the grid, see run_grid_search()
+        mode: use mode='sequential_finite', 'sequential_sipopt', 'sequential_kaug'
+        criterion: the criterion to maximize, 'D' (determinant) or 'A' (trace)
+        max_evaluations: the maximum number of designs solved. If None, a quarter of the grid
+        initial_samples: the size of the space-filling sample. If None, max(2*dimensions+1, max_evaluations//3)
+        batch_size: the number of designs added by each surrogate update
+        sampling: the space-filling sample, 'lhs' (Latin hypercube) or 'sobol'
+        exploration: the initial weight of the distance to the finished designs in the score, it decreases linearly to 0 
+            as the evaluations are used up
+        refinement: the weight of the spread of the criterion between the nearest finished designs in the score
+        seed: the random seed of the space-filling sample
+        reuse_model: if True, the models are built once, see compute_FIM(). 
+            Either way, every design is initialized from the last converged solution, see compute_FIM(chain_warm_start=True)
+        filename: if given, the criteria of the finished designs are stored in this csv file with extract_criteria()
+        tee_option, scale_nominal_param_value, scale_constant_value, formula, step: see run_grid_search()
+
+        Return:
+        -------
+        figure_draw_object: a Grid_Search_Result object, the designs that are not solved are None. 
+            figure_draw_object.search_order is the list of the designs in the order they are solved
+        '''
+        t_search_begin = time.time()
+
+        # Set the Objective Function to 0 helps solve square problem quickly
+        self.objective_option='zero'
+        self.fim_scale_constant_value = scale_constant_value ** 2
+
+        criterion_attribute = {'D': 'det', 'A': 'trace'}
+        if criterion not in criterion_attribute:
+            raise ValueError("criterion must be 'D' or 'A'.")
+
+        # all designs of the grid, and their coordinates scaled to [0,1]
+        candidates = list(product(*design_ranges))
+        dimension = len(design_ranges)
+        coordinates = np.array(candidates, dtype=float).reshape(len(candidates), dimension)
+        lower = coordinates.min(axis=0)
+        span = np.ptp(coordinates, axis=0)
+        coordinates = (coordinates - lower) / np.where(span > 0, span, 1)
+
+        if max_evaluations is None:
+            max_evaluations = max(1, len(candidates)//4)
+        max_evaluations = min(max_evaluations, len(candidates))
+        if initial_samples is None:
+            initial_samples = max(2*dimension+1, max_evaluations//3)
+        initial_samples = min(initial_samples, max_evaluations)
+
+        print(max_evaluations, ' of ', len(candidates), ' design vectors will be searched.')
+
+        fim_options = {'mode': mode, 'tee_opt': tee_option, 'scale_nominal_param_value': scale_nominal_param_value,
+                       'scale_constant_value': scale_constant_value, 'formula': formula, 'step': step, 
+                       'reuse_model': reuse_model, 'chain_warm_start': True}
+
+        # solved designs, index of candidates: result object
+        results = {}
+        # log10 of the criterion of converged designs, index of candidates: value
+        log_criterion = {}
+        search_order = []
+
+        def solve(index):
+            design_key = candidates[index]
+            design_iter = self.__design_dictionary(design_values, design_key, design_dimension_names, design_control_time)
+            print('=======This is the ', len(search_order)+1, 'th iteration=======')
+            print('Design variable values of this iteration:', design_iter)
+
+            result_iter, error = self.compute_grid_point(design_iter, **fim_options)
+            results[index] = result_iter
+            search_order.append(design_key)
+
+            if result_iter is None:
+                print(':::::::::::ERROR: Cannot converge this run.::::::::::::')
+                print('Design:', design_key, error)
+            else:
+                value_iter = getattr(result_iter, criterion_attribute[criterion])
+                if value_iter > 0:
+                    log_criterion[index] = np.log10(value_iter)
+
+        def scaled(x):
+            '''Scale an array to [0,1]'''
+            x_span = np.ptp(x)
+            return (x - x.min()) / x_span if x_span > 0 else np.zeros_like(x)
+
+        def distance_to(selected):
+            '''Distance of every candidate to the nearest selected candidate'''
+            dist = np.full(len(candidates), np.inf)
+            for i in selected:
+                dist = np.minimum(dist, np.sqrt(np.sum((coordinates - coordinates[i])**2, axis=1)))
+            return dist
+
+        # space-filling sample, snapped to the nearest grid values
+        if sampling == 'lhs':
+            sampler = qmc.LatinHypercube(d=dimension, seed=seed)
+        elif sampling == 'sobol':
+            sampler = qmc.Sobol(d=dimension, scramble=True, seed=seed)
+        else:
+            raise ValueError("sampling must be 'lhs' or 'sobol'.")
+
+        initial = []
+        if sampling == 'sobol':
+            # Sobol' points are balanced in powers of 2
+            sample = sampler.random_base2(int(np.ceil(np.log2(initial_samples))))[:initial_samples]
+        else:
+            sample = sampler.random(initial_samples)
+
+        for u in sample:
+            index = int(np.argmin(np.sum((coordinates - u)**2, axis=1)))
+            if index not in initial:
+                initial.append(index)
+
+        # samples snapped to the same design are replaced by the candidates furthest from the sample
+        while len(initial) < initial_samples:
+            initial.append(int(np.argmax(distance_to(initial))))
+
+        for index in initial:
+            solve(index)
+
+        # adaptive refinement
+        while len(results) < max_evaluations:
+            unsolved = np.array([i for i in range(len(candidates)) if i not in results])
+            batch = []
+            converged = sorted(log_criterion)
+
+            if len(converged) >= dimension + 2:
+                X = coordinates[converged]
+                y = np.array([log_criterion[i] for i in converged])
+                surrogate = RBFInterpolator(X, y, kernel='thin_plate_spline', degree=1)
+                prediction = surrogate(coordinates[unsolved])
+
+                # spread of the criterion between the nearest converged designs
+                neighbours = min(dimension + 1, len(converged))
+                spread = np.zeros(len(unsolved))
+                for n, i in enumerate(unsolved):
+                    nearest = np.argsort(np.sum((X - coordinates[i])**2, axis=1))[:neighbours]
+                    spread[n] = np.std(y[nearest])
+
+                exploit = scaled(prediction) + refinement*scaled(spread)
+            else:
+                # too few converged designs for the surrogate, only explore
+                exploit = np.zeros(len(unsolved))
+
+            # the exploration weight decreases linearly to 0 at the last design
+            weight = exploration*(max_evaluations - len(results))/max(max_evaluations - len(initial), 1)
+
+            # the designs in a batch are chosen one by one, so that they spread out
+            for _ in range(min(batch_size, max_evaluations - len(results), len(unsolved))):
+                dist = distance_to(list(results) + batch)[unsolved]
+                score = exploit + weight*scaled(dist)
+                score[np.isin(unsolved, batch)] = -np.inf
+                batch.append(int(unsolved[np.argmax(score)]))
+
+            for index in batch:
+                solve(index)
+
+        result_combine = {candidates[i]: results.get(i) for i in range(len(candidates))}
+        self.all_fim = result_combine
+
+        figure_draw_object = Grid_Search_Result(design_ranges, design_dimension_names, design_control_time, result_combine, 
+                                                store_optimality_name=filename)
+        figure_draw_object.search_order = search_order
+
+        if self.verbose:
+            if len(log_criterion) > 0:
+                best = max(log_criterion, key=log_criterion.get)
+                print('Best design:', candidates[best], ', log10', criterion, '-optimality:', log_criterion[best])
+            print('Solved designs:', len(results), ', failed:', len(results) - len([r for r in results.values() if r is not None]))
+            print('Overall wall clock time [s]:', time.time() - t_search_begin)
+
+        return figure_draw_object
+
+    def compute_grid_point(self, design_values, **kwargs):
+        '''
+        Compute and analyze the FIM of one design of a grid search.
+        Errors are caught, so that a failed design does not stop the grid search.
+
+        Parameters:
+        -----------
+        design_values: a dict whose keys are design variable names, values are a dict whose keys are time point and values are the design variable value at that time point
+        kwargs: the options of compute_FIM()
+
+        Return:
+        -------
+        result_iter: FIM_result object, None if this design failed
+        error: the error message if this design failed, else None
+        '''
+        try:
+            result_iter = self.compute_FIM(design_values, **kwargs)
+
+            if kwargs.get('read_output') is not None:
+                result_iter.build_time = None
+
+            if (self.mode=='simultaneous_finite'):
+                result_iter.extract_FIM(self.m, self.design_timeset, self.square_result, self.objective_option)
+
+            elif (self.mode in ['sequential_finite', 'sequential_sipopt', 'sequential_kaug', 'direct_kaug', 'direct_sensitivity']):
+                result_iter.calculate_FIM(self.design_values, converged=self.scenario_converged)
+
+            return result_iter, None
+
+        except Exception as err:
+            return None, repr(err)
+
+    def __design_dictionary(self, design_values, design_set_iter, design_dimension_names, design_control_time):
+        '''The design variable dictionary of a design of the grid, a copy of design_values with the controlled time points updated
+        '''
+        # first copy value from design_Values
+        design_iter = copy.deepcopy(design_values)
+
+        # update the controlled value of certain time points for certain design variables
+        for i in range(len(design_dimension_names)):
+            for v, value in enumerate(design_control_time[i]):
+                design_iter[design_dimension_names[i]][value] = design_set_iter[i]
+        return design_iter
+
+    def __worker_copy(self):
+        '''A copy of this object for the grid search workers, without the models of this process
+        '''
+        worker_doe = copy.copy(self)
+        worker_doe.model_pool = {}
+        worker_doe.components = Component_cache()
+        for attr in ['m', 'models', 'square_result']:
+            if attr in worker_doe.__dict__:
+                del worker_doe.__dict__[attr]
+        return worker_doe
 
     def __create_doe_model(self):
         '''
@@ -1318,6 +2266,7 @@ class DesignOfExperiments:
         # call generator function to get scenario dictionary
         scena_gen = Scenario_generator(self.param_init, formula=self.formula, step=self.step, store=True)
         scenario_all = scena_gen.simultaneous_scenario()
+        self.scenario_all = scenario_all
         
         # create model
         m = self.create_model(scenario_all, args= self.args)
@@ -1365,9 +2314,14 @@ class DesignOfExperiments:
                     if not (t in m.t):
                         raise ValueError('Warning: Control timepoints should be in the time list.')
 
+        # lean model: Jacobian, FIM and trace are expressions, see optimize_doe()
+        lean = getattr(self, 'lean_model', False)
+
         ### Define variables
-        # Elements in Jacobian matrix
-        if self.jac_initial is not None:
+        # Elements in Jacobian matrix, an Expression defined with its rule below for the lean model
+        if lean:
+            pass
+        elif self.jac_initial is not None:
             dict_jac = {}
             for i, bu in enumerate(m.y_set):
                 for j, un in enumerate(m.para_set):
@@ -1375,7 +2329,7 @@ class DesignOfExperiments:
                         dict_jac[(bu,un,tim)] = self.jac_initial[i,j,t]
 
             def jac_initialize(m,i,j,t):
-                return dict_jac[(bu,un,tim)]
+                return dict_jac[(i,j,t)]
 
             m.jac = Var(m.y_set, m.para_set, m.tmea_set, initialize=jac_initialize)
 
@@ -1390,7 +2344,9 @@ class DesignOfExperiments:
                 return 0
 
         # initialize FIM
-        if self.fim_initial is not None:
+        if lean:
+            pass
+        elif self.fim_initial is not None:
             dict_fim = {}
             for i, bu in enumerate(m.para_set):
                 for j, un in enumerate(m.para_set):
@@ -1404,27 +2360,37 @@ class DesignOfExperiments:
 
         if self.objective_option=='trace':
             # Trace of FIM
-            m.trace = Var(initialize=1, within=NonNegativeReals)
-        elif self.objective_option=='det':
-            # Determinant of FIM
-            m.det = Var(initialize=0.5, within=NonNegativeReals)
-        elif (self.objective_option != 'zero'):
+            if not lean:
+                m.trace = Var(initialize=1, within=NonNegativeReals)
+        elif (self.objective_option not in ['det', 'zero']):
             raise ValueError('Undefined objective function type. Available options are "trace" and "det".')
 
+        # the determinant is computed from the Cholesky decomposition FIM = L*L^T, log(det) = 2*sum(log(L_jj)).
+        # This needs p(p+1)/2 constraints of up to p terms, instead of the p! terms of the Leibniz formula
+        use_cholesky = self.Cholesky_option or (self.objective_option=='det')
+
+        # if L is not given, initialize it from the initial FIM if that is positive definite
+        L_initial = self.L_initial
+        if (L_initial is None) and (self.fim_initial is not None):
+            try:
+                L_initial = np.linalg.cholesky(np.asarray(self.fim_initial, dtype=float))
+            except np.linalg.LinAlgError:
+                L_initial = None
+
         # move the L matrix initial point to a dictionary
-        if self.L_initial is not None:
+        if L_initial is not None:
             dict_cho={}
             for i, bu in enumerate(m.para_set):
                 for j, un in enumerate(m.para_set):
-                    dict_cho[(bu,un)] = self.L_initial[i][j]
+                    dict_cho[(bu,un)] = L_initial[i][j]
         # use the L dictionary to initialize L matrix
         def init_cho(m,i,j):
             return dict_cho[(i,j)]
 
-        if self.Cholesky_option:
+        if use_cholesky:
             # Define elements of Cholesky decomposition matrix as Pyomo variables and either
             # Initialize with L in L_initial
-            if self.L_initial is not None:
+            if L_initial is not None:
                 m.L_ele = Var(m.para_set, m.para_set, initialize=init_cho)
             # or initialize with the identity matrix
             else:
@@ -1441,6 +2407,14 @@ class DesignOfExperiments:
                         if c==d:
                             m.L_ele[c,d].setlb(self.L_LB)
 
+            # Determinant of FIM, for reporting
+            def det_cholesky(m):
+                det_L = 1
+                for j in m.para_set:
+                    det_L = det_L*m.L_ele[j,j]
+                return det_L**2
+            m.det = Expression(rule=det_cholesky)
+
 
         def jac_numerical(m,j,p,t):
             '''
@@ -1448,21 +2422,26 @@ class DesignOfExperiments:
             j: model responses
             p: model parameters
             t: timepoints
+            For the lean model, this returns the Jacobian element itself
             '''
             # A better way to do this: 
             # https://github.com/IDAES/idaes-pse/blob/274e58bef55f2f969f0df97cbb1fb7d99342388e/idaes/apps/uncertainty_propagation/sens.py#L296
             # check if j is a measurement with extra index by checking if there is '_index_' in its name
-            up_C_name, lo_C_name, legal_t_option = self.measure.SP_measure_name(j,t,scenario_all=scenario_all, mode='simultaneous_finite', p=p)
-            if legal_t_option:
-                up_C = eval(up_C_name)
-                lo_C = eval(lo_C_name)
+            # a measurement with extra index is only legal at its own time points
+            if self.measure.ind_string not in j or t in self.flatten_measure_timeset[j]:
+                up_C = self.components.get(m, *self.measure.measure_index(j, t, scenario=scenario_all['jac-index'][p][0]))
+                lo_C = self.components.get(m, *self.measure.measure_index(j, t, scenario=scenario_all['jac-index'][p][1]))
                 if self.scale_nominal_param_value:
-                    return m.jac[j, p, t] == (up_C - lo_C) / scenario_all['eps-abs'][p] * self.param_init[p] * self.scale_constant_value
+                    jac_element = (up_C - lo_C) / scenario_all['eps-abs'][p] * self.param_init[p] * self.scale_constant_value
                 else:
-                    return m.jac[j, p, t] == (up_C - lo_C) / scenario_all['eps-abs'][p] * self.scale_constant_value
+                    jac_element = (up_C - lo_C) / scenario_all['eps-abs'][p] * self.scale_constant_value
                 # if t is not measured, let the value be 0
             else:
-                return m.jac[j, p, t] == 0
+                jac_element = 0
+
+            if lean:
+                return jac_element
+            return m.jac[j, p, t] == jac_element
 
         #A constraint to calculate elements in Hessian matrix
         # transfer prior FIM to be Expressions
@@ -1478,12 +2457,17 @@ class DesignOfExperiments:
         def calc_FIM(m,j,d):
             '''
             Calculate FIM elements
+            For the lean model, this returns the FIM element itself
             '''
             # check if scale
             if self.scale_nominal_param_value:
-                return m.FIM[j,d] == sum(sum(m.jac[z,j,i]*self.param_init[j]*self.param_init[d]*m.jac[z,d,i] for z in m.y_set) for i in m.tmea_set) + m.refele[j, d]*self.fim_scale_constant_value
+                fim_element = sum(sum(m.jac[z,j,i]*self.param_init[j]*self.param_init[d]*m.jac[z,d,i] for z in m.y_set) for i in m.tmea_set) + m.refele[j, d]*self.fim_scale_constant_value
             else:
-                return m.FIM[j,d] == sum(sum(m.jac[z,j,i]*m.jac[z,d,i] for z in m.y_set) for i in m.tmea_set) + m.refele[j, d]*self.fim_scale_constant_value
+                fim_element = sum(sum(m.jac[z,j,i]*m.jac[z,d,i] for z in m.y_set) for i in m.tmea_set) + m.refele[j, d]*self.fim_scale_constant_value
+
+            if lean:
+                return fim_element
+            return m.FIM[j,d] == fim_element
 
         def trace_calc(m):
             '''
@@ -1496,32 +2480,6 @@ class DesignOfExperiments:
                         sum_x += m.FIM[j,d]
             return m.trace == sum_x 
 
-        def det_general(m):
-            '''Calculate determinant. Can be applied to FIM of any size. 
-            det(A) = sum_{\sigma \in \S_n} (sgn(\sigma) * \Prod_{i=1}^n a_{i,\sigma_i})
-            Use permutation() to get permutations, sgn() to get signature
-            '''
-            r_list = list(range(len(m.para_set)))
-            # get all permutations 
-            object_p = itertools.permutations(r_list)
-            list_p = list(object_p)
-
-            # generate a name_order to iterate \sigma_i
-            det_perm = 0
-            for i in range(len(list_p)):
-                name_order = []
-                x_order = list_p[i]
-                # sigma_i is the value in the i-th position after the reordering \sigma
-                for x in range(len(x_order)):
-                    for y, element in enumerate(m.para_set):
-                        if x_order[x] == y:
-                            name_order.append(element)
-
-            # det(A) = sum_{\sigma \in \S_n} (sgn(\sigma) * \Prod_{i=1}^n a_{i,\sigma_i})
-            det_perm = sum( self.__sgn(list_p[d])*sum(m.FIM[each, name_order[b]] for b, each in enumerate(m.para_set)) for d in range(len(list_p)))
-            return m.det == det_perm
-
-
         def cholesky_imp(m,c,d):
             '''
             Calculate Cholesky L matrix using algebraic constraints
@@ -1535,25 +2493,28 @@ class DesignOfExperiments:
 
 
         ### Constraints and Objective function
-        m.dC_value = Constraint(m.y_set, m.para_set, m.tmea_set, rule=jac_numerical)
-        m.ele_rule = Constraint(m.para_set, m.para_set, rule=calc_FIM)
+        if lean:
+            m.jac = Expression(m.y_set, m.para_set, m.tmea_set, rule=jac_numerical)
+            m.FIM = Expression(m.para_set, m.para_set, rule=calc_FIM)
+            if self.objective_option=='trace':
+                m.trace = Expression(expr=sum(m.FIM[j,j] for j in m.para_set))
+        else:
+            m.dC_value = Constraint(m.y_set, m.para_set, m.tmea_set, rule=jac_numerical)
+            m.ele_rule = Constraint(m.para_set, m.para_set, rule=calc_FIM)
 
         #if m.Obj.available():
         m.Obj.deactivate()
 
             # Only giving the objective function when there's Degree of freedom. Make OBJ=0 when it's a square problem, which helps converge.
         if self.optimize:
-            # if cholesky, calculating L and evaluate the OBJ with Cholesky decomposition
-            if self.Cholesky_option:
+            # if cholesky or determinant, calculating L and evaluate the OBJ, log(det), with Cholesky decomposition
+            if use_cholesky:
                 m.cholesky_cons = Constraint(m.para_set, m.para_set, rule=cholesky_imp)
                 m.Obj = Objective(expr=2*sum(log(m.L_ele[j,j]) for j in m.para_set), sense=maximize)
-            # if not cholesky but determinant, calculating det and evaluate the OBJ with det 
-            elif (self.objective_option=='det'):
-                m.det_rule =  Constraint(rule=det_general)
-                m.Obj = Objective(expr=log(m.det), sense=maximize)
             # if not determinant or cholesky, calculating the OBJ with trace
             elif (self.objective_option=='trace'):
-                m.trace_rule = Constraint(rule=trace_calc)
+                if not lean:
+                    m.trace_rule = Constraint(rule=trace_calc)
                 m.Obj = Objective(expr=log(m.trace), sense=maximize)
             elif (self.objective_option=='zero'):
                 m.Obj = Objective(expr=0)
@@ -1582,10 +2543,14 @@ class DesignOfExperiments:
             # if design variables are indexed by time
             if self.design_time[d] is not None:
                 for t, time in enumerate(self.design_time[d]):
-                    newvar = eval('m.' + dname + '[' + str(time) + ']')
+                    newvar = self.components.get(m, dname, time)
                     fix_v = design_val[dname][time]
 
-                    if fix_opt:
+                    if not newvar.is_variable_type():
+                        # a mutable parameter, e.g. of a parametric model, is only updated
+                        if fix_opt:
+                            newvar.set_value(fix_v)
+                    elif fix_opt:
                         newvar.fix(fix_v)
                         #print(newvar, 'is fixed at ', fix_v)
                     else:
@@ -1595,10 +2560,13 @@ class DesignOfExperiments:
                             if optimize_option[dname]:
                                 newvar.unfix()
             else:
-                newvar = eval('m.' + dname)
+                newvar = self.components.get(m, dname)
                 fix_v = design_val[dname][0]
 
-                if fix_opt:
+                if not newvar.is_variable_type():
+                    if fix_opt:
+                        newvar.set_value(fix_v)
+                elif fix_opt:
                     newvar.fix(fix_v)
                     #print(newvar, 'is fixed at ', fix_v)
                 else:
@@ -1614,7 +2582,40 @@ class DesignOfExperiments:
         solver.options['max_iter'] = 3000
         return solver
 
-    def __solve_doe(self, m, fix=False, opt_option=None):
+    def __get_persistent_solver(self):
+        ''' A new persistent solver for a model kept with reuse_model=True.
+        APPSI Ipopt keeps the model representation and only updates the changed parameters and variable bounds between solves.
+        '''
+        if self.persistent_solver is not None:
+            return self.persistent_solver()
+
+        try:
+            from pyomo.contrib.appsi.solvers import Ipopt
+            solver = Ipopt()
+            if solver.available():
+                solver.ipopt_options.update(self.solver.options)
+                # only variables, parameters and bounds change between the solves
+                solver.update_config.check_for_new_or_removed_constraints = False
+                solver.update_config.check_for_new_or_removed_vars = False
+                solver.update_config.check_for_new_or_removed_params = False
+                solver.update_config.check_for_new_objective = False
+                solver.update_config.update_constraints = False
+                solver.update_config.update_named_expressions = False
+                solver.update_config.update_objective = False
+                return solver
+        except ImportError:
+            pass
+
+        if self.verbose:
+            print('APPSI Ipopt is not available, the reused models are solved with the default solver')
+        return self.solver
+
+    def clear_model_pool(self):
+        ''' Discard the models kept by compute_FIM(reuse_model=True)
+        '''
+        self.model_pool = {}
+
+    def __solve_doe(self, m, fix=False, opt_option=None, warm_dual=False, solver=None):
         '''Solve DOE model.
         If it's a square problem, fix design variable and solve.
         Else, fix design variable and solve square problem firstly, then unfix them and solve the optimization problem
@@ -1623,6 +2624,8 @@ class DesignOfExperiments:
         -----------
         m:model
         fix: if true, solve two times (square first). Else, just solve the square problem
+        warm_dual: if true, the duals are initialized from the cache and IPOPT is warm started with them
+        solver: the solver of this model, if None, self.solver
 
         Return:
         -------
@@ -1631,72 +2634,659 @@ class DesignOfExperiments:
         ### Solve square problem
         mod = self.__fix_design(m, self.design_values, fix_opt=fix, optimize_option=opt_option)
 
+        # IPOPT options for a primal-dual warm start, restored after this solve
+        warm_options = {'warm_start_init_point': 'yes', 'warm_start_bound_push': 1E-9,
+                        'warm_start_mult_bound_push': 1E-9, 'mu_init': 1E-6}
+        if solver is None:
+            solver = self.solver
+
+        # APPSI solvers are configured with config and ipopt_options
+        appsi = hasattr(solver, 'ipopt_options')
+        options = solver.ipopt_options if appsi else solver.options
+
+        saved_options = {}
+        if warm_dual:
+            for opt in warm_options:
+                saved_options[opt] = options.get(opt, None)
+                options[opt] = warm_options[opt]
+
         # if user gives solver, use this solver. if not, use default IPOPT solver
-        solver_result = self.solver.solve(mod,tee=self.tee_opt)
+        try:
+            if appsi:
+                solver.config.stream_solver = self.tee_opt
+                solver_result = solver.solve(mod)
+            else:
+                solver_result = solver.solve(mod,tee=self.tee_opt)
+        finally:
+            for opt in saved_options:
+                if saved_options[opt] is None:
+                    del options[opt]
+                else:
+                    options[opt] = saved_options[opt]
 
         return solver_result
 
-    def __add_parameter(self, m, perturb=0):
+    def __warm_start(self, m, scenario):
+        '''Warm start a model from the nearest cached solution
+
+        Parameters:
+        -----------
+        m: model
+        scenario: the scenario dict the model is created with
+
+        Return:
+        -------
+        cache_key: the cache key of this solve, None if no cache is used
+        warm_dual: if the duals are initialized
         '''
-        For sIPOPT: add parameter perturbation set
+        if self.cache is None:
+            return None, False
+
+        cache_key = self.cache.features(m, self.design_values, scenario)
+        warm_dual = self.cache.warm_start(m, cache_key)
+        self.cache.prepare(m)
+        return cache_key, warm_dual
+
+    def __cache_solution(self, m, cache_key, solver_result):
+        '''Add a converged solution to the cache
 
         Parameters:
         -----------
-        m: model name
-        self.param_names: perturbation parameter names
-        perturb: which parameter to perturb
-        '''
-        # model parameters perturbation, backward disturb
-        param_backward = self.param_value.copy()
-        # perturb parameter
-        param_backward[perturb] *= (1-self.step)
-
-        # generate sIPOPT perturbed parameter names
-        param_perturb_names = self.param_name.copy()
-        for x, xname in enumerate(self.param_name):
-            param_perturb_names[x] = xname+'_pert'
-        if self.verbose:
-            print('perturb names are:', param_perturb_names)
+        m: solved model
+        cache_key: the cache key of this solve
+        solver_result: solver results
+        '''
+        if self.cache is None or cache_key is None:
+            return
 
-        self.perturb_names = param_perturb_names
-        if self.verbose:
-            print('Perturbation parameters are set:')
-        for change in range(len(self.perturb_names)):
-            setattr(m, self.perturb_names[change], Param(m.scena, initialize=param_backward[change]))
-            if self.verbose:
-                print(self.perturb_names[change], ': ', value(eval('m.'+self.perturb_names[change]+'[0]')))
-        return m
+        if self.__converged(solver_result):
+            self.cache.store(m, cache_key)
+
+    def __record_convergence(self, converged):
+        '''Combine the convergence of one more square solve into self.scenario_converged
+        '''
+        self.scenario_converged = bool(converged) and self.scenario_converged is not False
 
-    def __sgn(self,p):
+    def __converged(self, solver_result):
+        '''If the solver results are optimal
         '''
-        Give the signature of a permutation
+        if hasattr(solver_result, 'solver'):
+            return (solver_result.solver.status == SolverStatus.ok) and (
+                solver_result.solver.termination_condition == TerminationCondition.optimal)
+        # APPSI results
+        return solver_result.termination_condition.name == 'optimal'
+
+
+def design_criteria(FIM_stack):
+    '''
+    Design criteria of a stack of FIMs, from one batched symmetric eigendecomposition
+
+    Parameters:
+    -----------
+    FIM_stack: symmetric FIMs, an array of shape [designs, parameters, parameters], or a single FIM
+
+    Return:
+    -------
+    a pandas dataframe with one row per FIM, columns:
+        ~['A']: trace
+        ~['D']: determinant
+        ~['logD']: log10 determinant, computed from the eigenvalues so it does not overflow. NaN if not P.D.
+        ~['E']: minimal eigenvalue
+        ~['ME']: condition number, maximal over minimal eigenvalue
+    '''
+    FIM_stack = np.asarray(FIM_stack, dtype=float).reshape(-1, np.shape(FIM_stack)[-2], np.shape(FIM_stack)[-1])
+
+    # eigenvalues in ascending order, [designs, parameters]
+    eig = np.linalg.eigvalsh(FIM_stack)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        criteria = pd.DataFrame({'A': np.trace(FIM_stack, axis1=1, axis2=2),
+                                 'D': np.prod(eig, axis=1),
+                                 'logD': np.where(eig[:, 0] > 0, np.sum(np.log10(np.abs(eig)), axis=1), np.nan),
+                                 'E': eig[:, 0],
+                                 'ME': eig[:, -1] / eig[:, 0]})
+    return criteria
+
+
+def assemble_FIM(jac_array, variance, prior_FIM=None):
+    '''
+    Assemble FIMs from 3-D Jacobians, FIM = sum_r Q_r*Q_r^T/sigma_r^2 + prior, 
+    as one tensor contraction over measurements, time and, for a stack of Jacobians, designs
+
+    Parameters:
+    -----------
+    jac_array: the Jacobian, an array of shape [measurements, parameters, time], 
+        or a stack of Jacobians, shape [designs, measurements, parameters, time], e.g. np.stack of FIM_result.jac_array
+    variance: the variance of each measurement, shape [measurements]
+    prior_FIM: the prior FIM, shape [parameters, parameters], added to every FIM
+
+    Return:
+    -------
+    the FIM, shape [parameters, parameters], or [designs, parameters, parameters] for a stack
+    '''
+    jac_array = np.asarray(jac_array, dtype=float)
+    weight = 1/np.asarray(variance, dtype=float)
+
+    fim = np.einsum('...rpt,...rqt,r->...pq', jac_array, jac_array, weight, optimize=True)
+
+    if prior_FIM is not None:
+        fim = fim + np.asarray(prior_FIM, dtype=float)
+    return fim
+
+
+def benchmark_logdet(p_values=range(2, 11), n_candidates=30, solver=None, seed=0):
+    '''
+    Benchmark the Cholesky log-determinant objective used for objective_option='det'.
+    For every number of parameters p, an approximate D-optimal design is built: maximize log(det(FIM)) with 
+    FIM = sum_k w_k q_k q_k^T over the weights w_k of n_candidates random measurements q_k, sum(w) = 1,
+    where FIM = L*L^T and log(det(FIM)) = 2*sum(log(L_jj)), as in the DOE model.
+
+    Parameters:
+    -----------
+    p_values: the numbers of parameters
+    n_candidates: the number of candidate measurements
+    solver: the solver. If None, IPOPT is used if available. If no solver is available, only the build is timed
+    seed: random seed of the candidate measurements
+
+    Return:
+    -------
+    a pandas dataframe, columns are p, variables, constraints, build_time, solve_time, logdet, logdet_numpy
+    '''
+    if solver is None:
+        solver = SolverFactory('ipopt')
+    if not solver.available(exception_flag=False):
+        solver = None
+
+    rng = np.random.default_rng(seed)
+    rows = []
+    for p in p_values:
+        Q = rng.normal(size=(n_candidates, p))
+
+        time0 = time.time()
+        m = ConcreteModel()
+        m.para_set = Set(initialize=list(range(p)))
+        m.k_set = Set(initialize=list(range(n_candidates)))
+        m.w = Var(m.k_set, bounds=(0, 1), initialize=1/n_candidates)
+        m.FIM = Var(m.para_set, m.para_set, initialize=lambda m,i,j: sum(Q[k,i]*Q[k,j] for k in range(n_candidates))/n_candidates)
+
+        # initialize L from the FIM of the uniform design
+        L_init = np.linalg.cholesky(Q.T@Q/n_candidates)
+        m.L_ele = Var(m.para_set, m.para_set, initialize=lambda m,i,j: L_init[i,j])
+        for c in m.para_set:
+            for d in m.para_set:
+                if c < d:
+                    m.L_ele[c,d].fix(0.0)
+                elif c == d:
+                    m.L_ele[c,d].setlb(1E-10)
+
+        m.weight_sum = Constraint(expr=sum(m.w[k] for k in m.k_set) == 1)
+        m.ele_rule = Constraint(m.para_set, m.para_set, 
+                                rule=lambda m,i,j: m.FIM[i,j] == sum(m.w[k]*Q[k,i]*Q[k,j] for k in m.k_set))
+
+        def cholesky_imp(m,c,d):
+            if c >= d:
+                return m.FIM[c,d] == sum(m.L_ele[c,k]*m.L_ele[d,k] for k in range(d+1))
+            return Constraint.Skip
+        m.cholesky_cons = Constraint(m.para_set, m.para_set, rule=cholesky_imp)
+        m.Obj = Objective(expr=2*sum(log(m.L_ele[j,j]) for j in m.para_set), sense=maximize)
+        build_time = time.time() - time0
+
+        solve_time = np.nan
+        logdet = value(m.Obj)
+        if solver is not None:
+            time0 = time.time()
+            solver.solve(m)
+            solve_time = time.time() - time0
+            logdet = value(m.Obj)
+
+        fim = np.array([[value(m.FIM[i,j]) for j in m.para_set] for i in m.para_set])
+        rows.append({'p': p, 
+                     'variables': len(list(m.component_data_objects(Var, active=True))), 
+                     'constraints': len(list(m.component_data_objects(Constraint, active=True))),
+                     'build_time': build_time, 'solve_time': solve_time, 
+                     'logdet': logdet, 'logdet_numpy': np.linalg.slogdet(fim)[1]})
+
+    return pd.DataFrame(rows)
+
+
+def benchmark_lean_model(doe, design_values, **optimize_options):
+    '''
+    Compare the DOE model of optimize_doe() with the Jacobian and FIM as variables and as expressions (lean_model=True)
+
+    Parameters:
+    -----------
+    doe: a DesignOfExperiments object
+    design_values: the initial design, see optimize_doe()
+    optimize_options: other arguments of optimize_doe(), e.g. objective_option
+
+    Return:
+    -------
+    a pandas dataframe, one row per formulation, columns are lean_model, variables, constraints, solve_time
+        (of the square and the optimization problem), logdet and trace of the final FIM
+    '''
+    rows = []
+    for lean_model in [False, True]:
+        results = doe.optimize_doe(copy.deepcopy(design_values), lean_model=lean_model, **optimize_options)
+        if type(results) is not tuple:
+            results = (results,)
+
+        rows.append({'lean_model': lean_model,
+                     'variables': doe.model_size['variables'],
+                     'constraints': doe.model_size['constraints'],
+                     'solve_time': sum(r.solve_time for r in results),
+                     'logdet': np.linalg.slogdet(results[-1].FIM)[1],
+                     'trace': results[-1].trace})
+
+    comparison = pd.DataFrame(rows)
+    if doe.verbose:
+        print('Lean model removes', comparison['variables'][0] - comparison['variables'][1], 'variables and', 
+              comparison['constraints'][0] - comparison['constraints'][1], 'constraints, IPOPT time saved [s]:', 
+              comparison['solve_time'][0] - comparison['solve_time'][1])
+    return comparison
+
+
+def grid_traversal(design_ranges, traversal='product'):
+    '''
+    Order the designs of a grid
+
+    Parameters:
+    -----------
+    design_ranges: a list of design variable values of each dimension
+    traversal: 
+        'product': the itertools.product order
+        'serpentine': the product order with every inner dimension reversed on alternate passes, 
+            so consecutive designs are adjacent on the grid
+        'nearest': greedy nearest neighbour path from the first design, 
+            distances are scaled by the span of each dimension
+
+    Return:
+    -------
+    a list of design tuples
+    '''
+    if traversal == 'product':
+        return list(product(*design_ranges))
+
+    elif traversal == 'serpentine':
+        def serpentine(ranges):
+            if len(ranges) == 0:
+                return [()]
+            inner = serpentine(ranges[1:])
+            path = []
+            for i, v in enumerate(ranges[0]):
+                for rest in (inner if i % 2 == 0 else inner[::-1]):
+                    path.append((v,) + rest)
+            return path
+        return serpentine(list(design_ranges))
+
+    elif traversal == 'nearest':
+        designs = list(product(*design_ranges))
+        points = np.array(designs, dtype=float).reshape(len(designs), -1)
+        span = np.ptp(points, axis=0)
+        points = points / np.where(span > 0, span, 1)
+
+        path = [0]
+        unvisited = np.ones(len(designs), dtype=bool)
+        unvisited[0] = False
+        for _ in range(len(designs) - 1):
+            dist = np.sum((points - points[path[-1]])**2, axis=1)
+            dist[~unvisited] = np.inf
+            nxt = int(np.argmin(dist))
+            path.append(nxt)
+            unvisited[nxt] = False
+        return [designs[i] for i in path]
+
+    else:
+        raise ValueError("traversal must be 'product', 'serpentine' or 'nearest'.")
+
+
+# the DesignOfExperiments object of a grid search worker process
+_grid_worker_doe = None
+
+def _grid_worker_init(doe, threads_per_worker=1):
+    '''
+    Initialize a grid search worker process
+
+    Parameters:
+    -----------
+    doe: the DesignOfExperiments object kept by this worker
+    threads_per_worker: the number of BLAS/OpenMP threads, inherited by the solver subprocesses
+    '''
+    global _grid_worker_doe
+    _grid_worker_doe = doe
+
+    for env in ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS']:
+        os.environ[env] = str(threads_per_worker)
+
+    # also limit numpy in this process if threadpoolctl is installed
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads_per_worker)
+    except ImportError:
+        pass
+
+def _scenario_worker_run(no_s, scenario, seed_values, extract_single_model, store_output):
+    '''
+    Solve one perturbed scenario of sequential_finite mode in a worker process
+
+    Return:
+    -------
+    output_iter: a list of the measurements
+    time_build: build time [s]
+    time_solve: solve time [s]
+    converged: if the solve converged
+    '''
+    _grid_worker_doe.scenario_converged = None
+    mod, output_iter, time_build, time_solve = _grid_worker_doe.solve_scenario(no_s, scenario, seed_values=seed_values, 
+                                                                             extract_single_model=extract_single_model, 
+                                                                             store_output=store_output)
+    return output_iter, time_build, time_solve, _grid_worker_doe.scenario_converged
+
+def _schur_worker_run(no_s, scenario, design_values, design_keys):
+    '''
+    Solve one scenario block of optimize_doe(decomposition='schur') in a worker process, see solve_scenario_sensitivity()
+    '''
+    _grid_worker_doe.design_values = design_values
+    return _grid_worker_doe.solve_scenario_sensitivity(no_s, scenario, design_keys)
+
+def _grid_worker_run(design_values, store_output, read_output, fim_options):
+    '''
+    Compute one design of a grid search in a worker process
+
+    Return:
+    -------
+    result_iter: FIM_result object without the model, None if this design failed
+    error: the error message if this design failed, else None
+    '''
+    result_iter, error = _grid_worker_doe.compute_grid_point(design_values, store_output=store_output, 
+                                                            read_output=read_output, **fim_options)
+    if result_iter is not None and hasattr(result_iter, 'model'):
+        result_iter.model = None
+    return result_iter, error
+
+
+class Component_cache:
+    def __init__(self):
+        '''
+        References to model components, resolved once from their name and index and reused for every later lookup.
+        The references of a model are dropped together with the model.
+        '''
+        # keys are models, values are a dictionary, keys are (component name, index), values are the components
+        self.models = weakref.WeakKeyDictionary()
+
+    def get(self, m, name, index=None):
+        '''
+        Find a component of a model
 
         Parameters:
         -----------
-        p: the permutation (a list)
+        m: model
+        name: component name, e.g. 'C', or a dotted name of a component on a sub-block
+        index: index of the component, e.g. (0, 'CA', 1.0). None for a scalar component
 
         Return:
-        ------
-        1 if the number of exchange is an even number
-        -1 if the number is an odd number
+        -------
+        the component (data) object
         '''
+        references = self.models.get(m)
+        if references is None:
+            references = self.models[m] = {}
+
+        component = references.get((name, index))
+        # resolve again if the component was deleted from the model since. 
+        # The data of a deleted indexed component loses its parent component too
+        if component is not None:
+            parent = component.parent_component()
+            if parent is None or parent.parent_block() is None:
+                component = None
+        if component is None:
+            component = m
+            for n in name.split('.'):
+                component = getattr(component, n)
+            if index is not None:
+                component = component[index]
+            references[(name, index)] = component
+        return component
+
+    def clear(self, m=None):
+        '''Drop the references of a model, or of all models if m is None'''
+        if m is None:
+            self.models = weakref.WeakKeyDictionary()
+        else:
+            self.models.pop(m, None)
+
+    def __getstate__(self):
+        # models are not sent to other processes, neither are their references
+        return {}
 
-        if len(p) == 1:
-            return True
+    def __setstate__(self, state):
+        self.models = weakref.WeakKeyDictionary()
 
-        trans = 0
 
-        for i in range(0, len(p)):
-            j = i + 1
+class Solution_cache:
+    def __init__(self, max_entries=20, max_bytes=None, store_dual=False, scale=None, max_distance=None,
+                 model_features=None, verbose=True):
+        '''
+        Cache of converged solutions used to warm start new solves from the nearest cached neighbour.
+        Entries are keyed by the design variable values, the parameter values of the scenarios, and
+        optional model features (e.g. fixed operating conditions, the grid). Only solutions of models
+        with the same structure (same variables and constraints) are reused.
+        The least recently used entries are evicted when the size limits are exceeded.
 
-            for j in range(j, len(p)):
-                if p[i] > p[j]:
-                    trans = trans + 1
+        Parameters:
+        -----------
+        max_entries: the maximum number of cached solutions
+        max_bytes: the maximum total size of the cached solutions [bytes]. If None, only max_entries applies
+        store_dual: if True, also cache constraint duals and bound multipliers, and warm start IPOPT with them
+        scale: a dict, keys are feature names, values are the scale of this feature in the distance.
+            If a feature is not given, the relative difference is used
+        max_distance: neighbours further away than this are not used. If None, the nearest neighbour is always used
+        model_features: a function that takes the model and returns a dict of extra features,
+            keys are names, values are numbers or arrays
+        verbose: if print statements are made
+        '''
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.store_dual = store_dual
+        self.scale = {} if scale is None else scale
+        self.max_distance = max_distance
+        self.model_features = model_features
+        self.verbose = verbose
 
-        if (trans % 2) == 0:
-            return 1
-        else:
-            return -1
+        # cached entries, ordered from the least to the most recently used
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.__next_id = 0
+
+        # statistics
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def features(self, m, design_values, scenario):
+        '''
+        Generate the cache key of a solve
+
+        Parameters:
+        -----------
+        m: the model
+        design_values: a dict whose keys are design variable names, values are a dict whose keys are time point and values are the design variable value at that time point
+        scenario: the scenario dict passed to create_model
+
+        Return:
+        -------
+        key: a dict, keys are feature names, values are arrays
+        '''
+        key = {}
+        for dname in design_values:
+            times = sorted(design_values[dname])
+            key[dname] = np.array([design_values[dname][t] for t in times], dtype=float)
+
+        for pname in scenario:
+            if pname not in ['jac-index', 'eps-abs', 'scena-name']:
+                key[pname] = np.array([scenario[pname][s] for s in scenario['scena-name']], dtype=float)
+
+        # the design variable values take priority over the model values, which are not fixed to the design yet
+        if self.model_features is not None:
+            for fname, fvalue in self.model_features(m).items():
+                if fname not in key:
+                    key[fname] = np.atleast_1d(np.asarray(fvalue, dtype=float))
+
+        return key
+
+    def distance(self, key1, key2):
+        '''
+        Scaled distance of two cache keys, inf if the keys are not comparable
+        '''
+        if key1.keys() != key2.keys():
+            return np.inf
+
+        dist = 0
+        for fname in key1:
+            x1, x2 = key1[fname], key2[fname]
+            if x1.shape != x2.shape:
+                return np.inf
+            if fname in self.scale:
+                diff = (x1 - x2)/self.scale[fname]
+            else:
+                diff = (x1 - x2)/np.maximum(np.maximum(abs(x1), abs(x2)), 1.0E-8)
+            dist += np.mean(diff**2)
+
+        return np.sqrt(dist)
+
+    def prepare(self, m):
+        '''
+        Add the suffixes needed to import and export duals if store_dual is True
+
+        Parameters:
+        -----------
+        m: the model to be solved
+        '''
+        if not self.store_dual:
+            return
+        if m.component('dual') is None:
+            m.dual = Suffix(direction=Suffix.IMPORT_EXPORT)
+        for name, direction in [('ipopt_zL_out', Suffix.IMPORT), ('ipopt_zU_out', Suffix.IMPORT),
+                                ('ipopt_zL_in', Suffix.EXPORT), ('ipopt_zU_in', Suffix.EXPORT)]:
+            if m.component(name) is None:
+                m.add_component(name, Suffix(direction=direction))
+
+    def __structure(self, m):
+        '''
+        Structure signature of a model: names and sizes of the variables (and constraints if duals are cached)
+        '''
+        signature = [(v.name, len(v)) for v in m.component_objects(Var, descend_into=True)]
+        if self.store_dual:
+            signature += [(c.name, len(c)) for c in m.component_objects(Constraint, active=True, descend_into=True)]
+        return tuple(signature)
+
+    def store(self, m, key):
+        '''
+        Store a converged solution
+
+        Parameters:
+        -----------
+        m: the solved model
+        key: the cache key, generated by features()
+        '''
+        primal = []
+        for var in m.component_objects(Var, descend_into=True):
+            primal.append(np.array([np.nan if v.value is None else v.value for v in var.values()], dtype=float))
+
+        dual = None
+        if self.store_dual and m.component('dual') is not None:
+            dual = {'dual': [], 'ipopt_zL_out': [], 'ipopt_zU_out': []}
+            for con in m.component_objects(Constraint, active=True, descend_into=True):
+                dual['dual'].append(np.array([m.dual.get(c, 0) for c in con.values()], dtype=float))
+            for var in m.component_objects(Var, descend_into=True):
+                for name in ['ipopt_zL_out', 'ipopt_zU_out']:
+                    suffix = m.component(name)
+                    dual[name].append(np.array([0 if suffix is None else suffix.get(v, 0) for v in var.values()], dtype=float))
+
+        size = sum(a.nbytes for a in primal)
+        if dual is not None:
+            size += sum(a.nbytes for values in dual.values() for a in values)
+
+        self.entries[self.__next_id] = {'key': key, 'structure': self.__structure(m), 'primal': primal, 'dual': dual, 'bytes': size}
+        self.__next_id += 1
+        self.total_bytes += size
+
+        # evict the least recently used entries
+        while len(self.entries) > self.max_entries or (self.max_bytes is not None and self.total_bytes > self.max_bytes and len(self.entries) > 1):
+            _, entry = self.entries.popitem(last=False)
+            self.total_bytes -= entry['bytes']
+            self.evicted += 1
+
+    def nearest(self, m, key):
+        '''
+        Find the nearest cached solution of a model with the same structure
+
+        Parameters:
+        -----------
+        m: the model
+        key: the cache key, generated by features()
+
+        Return:
+        -------
+        entry_id: the id of the nearest entry, None if no entry can be used
+        dist: the distance to the nearest entry
+        '''
+        structure = self.__structure(m)
+        best_id, best_dist = None, np.inf
+        for entry_id, entry in self.entries.items():
+            if entry['structure'] != structure:
+                continue
+            dist = self.distance(key, entry['key'])
+            if dist < best_dist:
+                best_id, best_dist = entry_id, dist
+
+        if self.max_distance is not None and best_dist > self.max_distance:
+            return None, best_dist
+        return best_id, best_dist
+
+    def warm_start(self, m, key):
+        '''
+        Initialize the free variables of a model with the nearest cached solution.
+        Fixed variables are not changed.
+
+        Parameters:
+        -----------
+        m: the model
+        key: the cache key, generated by features()
+
+        Return:
+        -------
+        warm_dual: True if the duals are initialized too, so IPOPT can use warm_start_init_point
+        '''
+        entry_id, dist = self.nearest(m, key)
+        if entry_id is None:
+            self.misses += 1
+            return False
+
+        self.hits += 1
+        # mark as most recently used
+        self.entries.move_to_end(entry_id)
+        entry = self.entries[entry_id]
+        if self.verbose:
+            print('Warm start from a cached solution at distance', dist)
+
+        for var, values in zip(m.component_objects(Var, descend_into=True), entry['primal']):
+            for v, val in zip(var.values(), values):
+                if not v.fixed and not np.isnan(val):
+                    v.set_value(val, skip_validation=True)
+
+        if entry['dual'] is None or not self.store_dual:
+            return False
+
+        self.prepare(m)
+        for con, values in zip(m.component_objects(Constraint, active=True, descend_into=True), entry['dual']['dual']):
+            for c, val in zip(con.values(), values):
+                m.dual[c] = val
+        for name_out, name_in in [('ipopt_zL_out', 'ipopt_zL_in'), ('ipopt_zU_out', 'ipopt_zU_in')]:
+            suffix = m.component(name_in)
+            for var, values in zip(m.component_objects(Var, descend_into=True), entry['dual'][name_out]):
+                for v, val in zip(var.values(), values):
+                    suffix[v] = val
+        return True
 
 
 class Scenario_generator:
@@ -1997,7 +3587,7 @@ class FIM_result:
         self.max_condition_number = max_condition_number
         self.verbose = verbose
 
-    def calculate_FIM(self, dv_values, result=None):
+    def calculate_FIM(self, dv_values, result=None, converged=None):
         '''
         Calculate FIM from Jacobian information. This is for grid search (combined models) results
 
@@ -2005,6 +3595,8 @@ class FIM_result:
         -----------
         dv_values: design variable value dictionary
         result: solver status returned by IPOPT
+        converged: if all square solves of the sequential scenarios converged, e.g. DesignOfExperiments.scenario_converged. 
+            Only used when result is None, None if unknown
 
         Return:
         ------
@@ -2023,38 +3615,30 @@ class FIM_result:
         self.result = result
         self.doe_result = None
 
-        # get number of parameters
-        no_param = len(self.para_name)
-
-        # reform jacobian, split the overall Q into Q_r, each r is a flattened measurement name
-        Q_response_list, variance_list = self.__jac_reform_3D(self.jaco_information, Q_response=True)
-
-        fim = np.zeros((no_param, no_param))
+        # reform jacobian to [measurements, parameters, time], split the overall Q into Q_r, each r is a flattened measurement name
+        self.jac_array, variance_list = self.__jac_reform_3D(self.jaco_information, Q_response=True)
 
-        for i in range(len(Q_response_list)):
-            #print(1/variance_list[i])
-            #print(np.shape(Q_response_list[i]))
-            #print(np.shape(Q_response_list[i]@Q_response_list[i].T))
-            fim += ((1/variance_list[i])*(Q_response_list[i]@Q_response_list[i].T))
-        #print('shape of fim:', np.shape(fim))
+        # FIM = sum_r Q_r*Q_r^T/sigma_r^2, plus the prior
+        try:
+            fim = assemble_FIM(self.jac_array, variance_list, prior_FIM=self.prior_FIM)
+        except ValueError:
+            raise ValueError('Check the shape of prior FIM')
 
-        # add prior information
-        if (self.prior_FIM is not None):
-            try:
-                fim = fim + self.prior_FIM
+        if self.verbose:
+            if self.prior_FIM is not None:
                 print('Existed information has been added.')
-            except:
-                raise ValueError('Check the shape of prior FIM')
 
-        if np.linalg.cond(fim) > self.max_condition_number:
-            print("Warning: FIM is near singular.")
-            print('The condition number is:', np.linalg.cond(fim), ';')
-            print('A condition number bigger than ', self.max_condition_number, ' is considered near singular.')
+            if np.linalg.cond(fim) > self.max_condition_number:
+                print("Warning: FIM is near singular.")
+                print('The condition number is:', np.linalg.cond(fim), ';')
+                print('A condition number bigger than ', self.max_condition_number, ' is considered near singular.')
 
         # call private methods
         self.__print_FIM_info(fim, dv_set=dv_values)
         if self.result is not None:
             self.__get_solver_info()
+        elif converged is not None:
+            self.status = 'converged' if converged else 'not converged'
 
         # if given store file name, store the FIM
         if (self.store_FIM is not None):
@@ -2079,7 +3663,7 @@ class FIM_result:
         small_jac = self.__split_jacobian(measurement_subset)
 
         # create a new subject
-        FIM_subclass = FIM_result(self.para_name, measurement_subset, jacobian_info=small_jac, prior_FIM=self.prior_FIM, store_FIM=self.store_FIM, scale_constant_value=self.scale_constant_value, max_condition_number=self.max_condition_number)
+        FIM_subclass = FIM_result(self.para_name, measurement_subset, jacobian_info=small_jac, prior_FIM=self.prior_FIM, store_FIM=self.store_FIM, scale_constant_value=self.scale_constant_value, max_condition_number=self.max_condition_number, verbose=self.verbose)
 
         return FIM_subclass
 
@@ -2092,30 +3676,33 @@ class FIM_result:
         Returns:
             jaco_info: splitted Jacobian
         '''
-        # create a dict for FIM. It has the same keys as the Jacobian dict.
-        jaco_info = {}
-
         # convert the form of jacobian for split
-        jaco_3D = self.__jac_reform_3D(self.jacobian_info)
+        jaco_3D = self.__jac_reform_3D(self.jaco_information)
 
         involved_flatten_index = measurement_subset.flatten_measure_name
         if self.verbose:
             print('involved flatten name:', involved_flatten_index)
 
-        # reorganize the jacobian subset with the same form of the jacobian
-        # loop over parameters
-        for p, par in enumerate(self.para_name):
-            jaco_info[par] = []
-            # loop over flatten measurements
-            for n, nam in enumerate(involved_flatten_index):
-                if nam in self.flatten_all_measure:
-                    print('get :', nam)
-                    n_all_measure = self.flatten_all_measure.index(nam)
-                    # loop over time
-                    for d in range(len(jaco_3D[n_all_measure, p, :])):
-                        jaco_info[par].append(jaco_3D[n_all_measure, p, d])
+        # rows of the involved measurements, in the order of the subset
+        rows = [self.flatten_all_measure.index(nam) for nam in involved_flatten_index if nam in self.flatten_all_measure]
+
+        # reorganize the jacobian subset with the same form of the jacobian, a dict with the same keys as the Jacobian dict
+        # each parameter's list is ordered by measurement, then time
+        jaco_sub = jaco_3D[rows].transpose(1, 0, 2).reshape(len(self.para_name), -1)
+        jaco_info = {par: list(jaco_sub[p]) for p, par in enumerate(self.para_name)}
         return jaco_info
 
+    def jacobian_array(self):
+        '''
+        The Jacobian of this result as a 3D numpy array and the variance of each measurement
+
+        Return:
+        -------
+        jac_array: the Jacobian, shape [measurements, parameters, time], measurements in the order of self.flatten_all_measure
+        variance: the variance of each measurement, shape [measurements]
+        '''
+        return self.__jac_reform_3D(self.jaco_information, Q_response=True)
+
     def __jac_reform_3D(self, jac_original, Q_response=False):
         '''
         Reform the Jacobian returned by __finite_calculation() to be a 3D numpy array, [measurements, parameters, time]
@@ -2123,23 +3710,14 @@ class FIM_result:
         # 3-D array form of jacobian [measurements, parameters, time]
         self.measure_timeset = list(self.measurement_timeset.values())[0]
         no_time = len(self.measure_timeset)
-        jac_3Darray = np.zeros((len(self.flatten_all_measure), len(self.para_name), no_time))
-        # reorganize the matrix
-        for m, mname in enumerate(self.flatten_all_measure):
-            for p, para in enumerate(self.para_name):
-                for t, tim in enumerate(self.measure_timeset):
-                    jac_3Darray[m, p, t] = jac_original[para][m * no_time + t]
+        # each parameter's list is ordered by measurement, then time
+        jac_3Darray = np.array([jac_original[para] for para in self.para_name], dtype=float)
+        jac_3Darray = jac_3Darray.reshape(len(self.para_name), len(self.flatten_all_measure), no_time).transpose(1, 0, 2)
+
         if Q_response:
-            Qr_list = []
-            var_list = []
-            for m, mname in enumerate(self.flatten_all_measure):
-                Qr_list.append(jac_3Darray[m, :, :])
-                var_list.append(self.measure_object.flatten_variance[mname])
-            print(type(Qr_list[0]))
-            print(Qr_list[0])
-            print(var_list)
-
-            return Qr_list, var_list
+            # the Q_r of measurement r is jac_3Darray[r]
+            var_list = np.array([self.measure_object.flatten_variance[mname] for mname in self.flatten_all_measure], dtype=float)
+            return jac_3Darray, var_list
         else:
             return jac_3Darray
 
@@ -2165,20 +3743,21 @@ class FIM_result:
             ~['Eigen values:']: a list of all eigen values
             ~['Eigen vectors:']: a list of all eigen vectors
         '''
-        eig = np.linalg.eigvals(FIM)
+        # one symmetric eigendecomposition gives all criteria, eigenvalues in ascending order
+        eig, eig_vecs = np.linalg.eigh(FIM)
         self.FIM = FIM
         self.trace = np.trace(FIM)
-        self.det = np.linalg.det(FIM)
-        self.min_eig = min(eig)
-        self.cond = max(eig) / min(eig)
+        self.det = np.prod(eig)
+        self.min_eig = eig[0]
+        self.cond = eig[-1] / eig[0]
         self.eig_vals = eig
-        self.eig_vecs = np.linalg.eig(FIM)[1]
+        self.eig_vecs = eig_vecs
 
         dv_names = list(dv_set.keys())
 
         FIM_dv_info = {}
-        FIM_dv_info[dv_names[0]] = dv_set[dv_names[0]]
-        FIM_dv_info[dv_names[1]] = dv_set[dv_names[1]]
+        for dv in dv_names:
+            FIM_dv_info[dv] = dv_set[dv]
 
         self.dv_info = FIM_dv_info
 
@@ -2211,14 +3790,17 @@ class FIM_result:
             -[design variable name]: a list of design variable solution
         '''
         self.obj_value = value(m.obj)
-        print('Model objective:', self.obj_value)
+        if self.verbose:
+            print('Model objective:', self.obj_value)
 
         if self.obj == 'det':
             self.obj_det = np.exp(value(m.obj)) / (self.fim_scale_constant_value) ** (len(self.para_name))
-            print('Objective(determinant) is:', self.obj_det)
+            if self.verbose:
+                print('Objective(determinant) is:', self.obj_det)
         elif self.obj == 'trace':
             self.obj_trace = np.exp(value(m.obj)) / (self.fim_scale_constant_value)
-            print('Objective(trace) is:', self.obj_trace)
+            if self.verbose:
+                print('Objective(trace) is:', self.obj_trace)
 
         dv_names = list(dv_set.keys())
         dv_times = list(dv_set.values())
@@ -2228,10 +3810,10 @@ class FIM_result:
             sol = []
             if dv_times[d] is not None:
                 for t, time in enumerate(dv_times[d]):
-                    newvar = eval('m.' + dname + '[' + str(time) + ']')
+                    newvar = getattr(m, dname)[time]
                     sol.append(value(newvar))
             else:
-                newvar = eval('m.' + dname)
+                newvar = getattr(m, dname)
                 sol.append(value(newvar))
 
             solution[dname] = sol
@@ -2257,18 +3839,392 @@ class FIM_result:
             ~['square']: a string of square result solver status
             -['doe']: a string of doe result solver status
         '''
-        print('======problem solver output======')
-
         if (self.result.solver.status == SolverStatus.ok) and (
                 self.result.solver.termination_condition == TerminationCondition.optimal):
             self.status = 'converged'
-            print('converged')
         elif (self.result.solver.termination_condition == TerminationCondition.infeasible):
             self.status = 'infeasible'
-            print('infeasible solution')
         else:
             self.status = self.result.solver.status
-            print('solver status:', self.result.solver.status)
+
+        if self.verbose:
+            print('======problem solver output======')
+            print('solver status:', self.status)
+
+
+class Sensor_selection:
+    def __init__(self, FIM_result, candidates='time', prior_FIM=None, verbose=True):
+        '''
+        Choose which measurements to take from the Jacobian of one FIM_result, without any new solves.
+        The FIM contribution of every candidate is computed once, so the FIM of any subset is a sum of precomputed matrices.
+
+        Parameters:
+        -----------
+        FIM_result: a FIM_result object of all possible measurements, e.g. all thermocouple positions at all times
+        candidates: how measurements are grouped into candidates
+            'time': every measurement at every time point is a candidate, e.g. FCO2 sampling times
+            'measurement': every flattened measurement with all its time points is a candidate, e.g. thermocouple positions
+            or a dictionary, keys are candidate names, values are a list of (flattened measurement name, time) tuples.
+            Selections refer to candidates by name or by position (any integer that is not a candidate name)
+        prior_FIM: the FIM every subset starts from. If None, the prior FIM of FIM_result
+        verbose: if print statements
+        '''
+        self.para_name = FIM_result.para_name
+        self.measure_object = FIM_result.measure_object
+        self.flatten_all_measure = FIM_result.flatten_all_measure
+        self.verbose = verbose
+
+        jac_array, variance = FIM_result.jacobian_array()
+        self.measure_timeset = list(FIM_result.measurement_timeset.values())[0]
+
+        # rank-one contribution of each measurement at each time point, [measurements, time, parameters, parameters]
+        point_contribution = np.einsum('rpt,rqt,r->rtpq', jac_array, jac_array, 1/variance, optimize=True)
+
+        if candidates == 'time':
+            groups = {(nam, tim): [(nam, tim)] for nam in self.flatten_all_measure for tim in self.measure_timeset}
+        elif candidates == 'measurement':
+            groups = {nam: [(nam, tim) for tim in self.measure_timeset] for nam in self.flatten_all_measure}
+        elif type(candidates) is dict:
+            groups = candidates
+        else:
+            raise ValueError('candidates must be time, measurement or a dictionary.')
+
+        # FIM contribution of each candidate, [candidates, parameters, parameters]
+        self.candidate_names = list(groups.keys())
+        self.candidate_points = list(groups.values())
+        self.contributions = np.zeros((len(groups), len(self.para_name), len(self.para_name)))
+        for c, points in enumerate(self.candidate_points):
+            for nam, tim in points:
+                self.contributions[c] += point_contribution[self.flatten_all_measure.index(nam), self.measure_timeset.index(tim)]
+
+        if prior_FIM is None:
+            prior_FIM = FIM_result.prior_FIM
+        self.prior_FIM = np.zeros((len(self.para_name), len(self.para_name))) if prior_FIM is None else np.asarray(prior_FIM, dtype=float)
+
+        # regularization, only used to rank candidates while the FIM of a selection is still singular
+        self.jitter = 1.0E-10 * max(np.trace(self.contributions.sum(axis=0)), 1.0)
+
+        if self.verbose:
+            print(len(self.candidate_names), 'candidate measurements.')
+
+    def __criterion_value(self, FIM_stack, criterion, regularize=False):
+        '''
+        Criterion values of a stack of FIMs, larger is better
+
+        Parameters:
+        -----------
+        FIM_stack: FIMs, shape [subsets, parameters, parameters]
+        criterion: 'D' (log10 determinant), 'A' (trace) or 'E' (minimal eigenvalue)
+        regularize: if add self.jitter to the diagonal, so singular FIMs can still be ranked
+
+        Return:
+        -------
+        criterion values, shape [subsets]. -inf for a singular FIM under 'D'
+        '''
+        if criterion == 'A':
+            return np.trace(FIM_stack, axis1=1, axis2=2)
+
+        if regularize:
+            FIM_stack = FIM_stack + self.jitter*np.eye(len(self.para_name))
+        eig = np.linalg.eigvalsh(FIM_stack)
+
+        if criterion == 'D':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.where(eig[:, 0] > 0, np.sum(np.log10(np.abs(eig)), axis=1), -np.inf)
+        elif criterion == 'E':
+            return eig[:, 0]
+        else:
+            raise ValueError('criterion must be D, A or E.')
+
+    def __index(self, selection):
+        '''Candidate indexes of a selection given by candidate names or indexes. 
+        A candidate name takes precedence, so an integer is only an index if it is not a candidate name, e.g. a z position
+        '''
+        indexes = []
+        for c in selection:
+            if c in self.candidate_names:
+                indexes.append(self.candidate_names.index(c))
+            elif isinstance(c, numbers.Integral):
+                indexes.append(int(c))
+            else:
+                raise ValueError(str(c) + ' is not a candidate name or index.')
+        return indexes
+
+    def FIM(self, selection):
+        '''
+        FIM of a selection of candidates
+
+        Parameters:
+        -----------
+        selection: a list of candidate names or indexes
+
+        Return:
+        -------
+        the FIM, prior included
+        '''
+        return self.prior_FIM + self.contributions[self.__index(selection)].sum(axis=0)
+
+    def evaluate(self, subsets, criterion='D'):
+        '''
+        Evaluate many subsets at once
+
+        Parameters:
+        -----------
+        subsets: a list of selections, each a list of candidate names or indexes,
+            or a boolean array, shape [subsets, candidates]
+        criterion: 'D' (log10 determinant), 'A' (trace) or 'E' (minimal eigenvalue)
+
+        Return:
+        -------
+        criterion values, shape [subsets]
+        '''
+        if type(subsets) is np.ndarray and subsets.dtype == bool:
+            mask = subsets.astype(float)
+        else:
+            mask = np.zeros((len(subsets), len(self.candidate_names)))
+            for s, selection in enumerate(subsets):
+                mask[s, self.__index(selection)] = 1
+
+        FIM_stack = self.prior_FIM + np.einsum('sc,cpq->spq', mask, self.contributions, optimize=True)
+        return self.__criterion_value(FIM_stack, criterion)
+
+    def greedy(self, k, criterion='D', fixed=None):
+        '''
+        Greedy selection: add the candidate that improves the criterion most, until k are chosen
+
+        Parameters:
+        -----------
+        k: number of candidates to choose
+        criterion: 'D' (log10 determinant), 'A' (trace) or 'E' (minimal eigenvalue)
+        fixed: a list of candidate names or indexes that are always chosen, counted in k
+
+        Return:
+        -------
+        selected: a list of chosen candidate names, in the order they are added
+        value: criterion value of the selection
+        '''
+        selected = [] if fixed is None else self.__index(fixed)
+        current = self.FIM(selected)
+
+        while len(selected) < min(k, len(self.candidate_names)):
+            remaining = [c for c in range(len(self.candidate_names)) if c not in selected]
+            trial = current + self.contributions[remaining]
+
+            # minimal eigenvalues are all zero while the FIM is singular, rank those steps by determinant
+            if criterion == 'E' and np.linalg.matrix_rank(current) < len(self.para_name):
+                score = self.__criterion_value(trial, 'D', regularize=True)
+            else:
+                score = self.__criterion_value(trial, criterion, regularize=True)
+
+            best = remaining[int(np.argmax(score))]
+            selected.append(best)
+            current = current + self.contributions[best]
+
+            if self.verbose:
+                print('Add', self.candidate_names[best])
+
+        value = self.__criterion_value(current[None, :, :], criterion)[0]
+        return [self.candidate_names[c] for c in selected], value
+
+    def exchange(self, k, criterion='D', initial=None, fixed=None, max_iter=100):
+        '''
+        Exchange selection: starting from a selection, swap one chosen and one unchosen candidate
+        whenever it improves the criterion, until no swap does
+
+        Parameters:
+        -----------
+        k: number of candidates to choose
+        criterion: 'D' (log10 determinant), 'A' (trace) or 'E' (minimal eigenvalue)
+        initial: the starting selection, a list of k candidate names or indexes. If None, the greedy selection
+        fixed: a list of candidate names or indexes that are always chosen, never swapped out
+        max_iter: maximal number of swaps
+
+        Return:
+        -------
+        selected: a list of chosen candidate names
+        value: criterion value of the selection
+        '''
+        fixed = [] if fixed is None else self.__index(fixed)
+        if initial is None:
+            initial, _ = self.greedy(k, criterion=criterion, fixed=fixed)
+        selected = self.__index(initial)
+
+        current = self.FIM(selected)
+        value = self.__criterion_value(current[None, :, :], criterion, regularize=True)[0]
+
+        for it in range(max_iter):
+            remaining = [c for c in range(len(self.candidate_names)) if c not in selected]
+            if not remaining:
+                break
+
+            best_value, best_swap = value, None
+            for out in selected:
+                if out in fixed:
+                    continue
+                # all swaps of this candidate in one stack
+                trial = current - self.contributions[out] + self.contributions[remaining]
+                score = self.__criterion_value(trial, criterion, regularize=True)
+                if np.max(score) > best_value:
+                    best_value, best_swap = np.max(score), (out, remaining[int(np.argmax(score))])
+
+            # no improving swap
+            if best_swap is None or best_value - value <= 1.0E-12*abs(value):
+                break
+
+            out, into = best_swap
+            selected[selected.index(out)] = into
+            current = current - self.contributions[out] + self.contributions[into]
+            value = best_value
+
+            if self.verbose:
+                print('Swap', self.candidate_names[out], 'for', self.candidate_names[into])
+
+        value = self.__criterion_value(current[None, :, :], criterion)[0]
+        return [self.candidate_names[c] for c in selected], value
+
+    def selected_measurements(self, selection):
+        '''
+        The measurement dictionary of a selection, to create a Measurements object of the chosen measurements.
+        FIM_result.subset() only splits whole measurements, so it needs candidates='measurement'
+
+        Parameters:
+        -----------
+        selection: a list of candidate names or indexes
+
+        Return:
+        -------
+        a dictionary in the form of Measurements' measurement_index_time, e.g. {'FCO2': {19: [...]}, 'temp': {10: [...]}}
+        '''
+        points = set()
+        for c in self.__index(selection):
+            points.update(self.candidate_points[c])
+
+        ind_string = self.measure_object.ind_string
+        measurement_index_time = {}
+        for nam in self.flatten_all_measure:
+            times = [tim for tim in self.measure_timeset if (nam, tim) in points]
+            if not times:
+                continue
+            # split the flattened name if needed
+            if ind_string in nam:
+                measure_name, measure_index = nam.split(ind_string)
+                if type(self.measure_object.name_and_index[measure_name][0]) is int:
+                    measure_index = int(measure_index)
+                measurement_index_time.setdefault(measure_name, {})[measure_index] = times
+            else:
+                measurement_index_time[nam] = times
+        return measurement_index_time
+
+
+class Grid_search_checkpoint:
+    def __init__(self, file):
+        '''
+        Append-only checkpoint of a grid search.
+        The file is a stream of pickled records: a header with the grid definition, then one record per finished design.
+        A record is only appended after its design is finished, so a crash leaves at most one truncated record at the end,
+        which is ignored when reading and cut off before appending.
+
+        Parameters:
+        -----------
+        file: the checkpoint file name
+        '''
+        self.file = file
+
+    def read(self):
+        '''
+        Read the checkpoint
+
+        Returns:
+        -------
+        header: a dict with the grid definition, keys are 'design_ranges', 'design_dimension_names', 'design_control_time'.
+            None if the file does not exist or is empty
+        records: a dict, keys are design tuples, values are the latest record of this design, a dict with keys
+            'design', 'design_values', 'result', 'FIM', 'jac', 'status', 'error', 'build_time', 'solve_time'
+        valid_bytes: the length of the readable part of the file
+        '''
+        header = None
+        records = {}
+        valid_bytes = 0
+
+        if not os.path.exists(self.file):
+            return header, records, valid_bytes
+
+        with open(self.file, 'rb') as f:
+            while True:
+                try:
+                    record = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError, ValueError, TypeError, AttributeError, IndexError):
+                    # end of file, or a record truncated by a crash
+                    break
+                if header is None:
+                    header = record
+                else:
+                    records[record['design']] = record
+                valid_bytes = f.tell()
+
+        return header, records, valid_bytes
+
+    def start(self, design_ranges, design_dimension_names, design_control_time, resume=False):
+        '''
+        Start writing the checkpoint
+
+        Parameters:
+        -----------
+        design_ranges, design_dimension_names, design_control_time: the grid, see run_grid_search()
+        resume: if True, keep the records of a checkpoint of the same grid. Else, the file is overwritten
+
+        Returns:
+        -------
+        records: a dict of the kept records, keys are design tuples, see read()
+        '''
+        header = {'design_ranges': [list(r) for r in design_ranges], 
+                  'design_dimension_names': list(design_dimension_names),
+                  'design_control_time': [list(t) for t in design_control_time]}
+
+        records = {}
+        if resume:
+            old_header, records, valid_bytes = self.read()
+            if old_header is not None:
+                if old_header != header:
+                    raise ValueError('The checkpoint ' + str(self.file) + ' was written for a different grid.')
+                # cut off a truncated record
+                with open(self.file, 'r+b') as f:
+                    f.truncate(valid_bytes)
+                return records
+
+        with open(self.file, 'wb') as f:
+            pickle.dump(header, f)
+        return records
+
+    def append(self, design, design_values, result, error=None):
+        '''
+        Append a finished design
+
+        Parameters:
+        -----------
+        design: the design tuple
+        design_values: the design variable dictionary of this design
+        result: FIM_result object, None if this design failed
+        error: the error message if this design failed
+        '''
+        record = {'design': design, 'design_values': design_values, 'result': result, 
+                  'FIM': getattr(result, 'FIM', None), 
+                  'jac': getattr(result, 'all_jacobian_info', None),
+                  'status': 'failed' if result is None else getattr(result, 'status', 'unknown'),
+                  'error': error,
+                  'build_time': getattr(result, 'build_time', None), 
+                  'solve_time': getattr(result, 'solve_time', None)}
+
+        # drop the model of simultaneous mode
+        if hasattr(result, 'model'):
+            result = copy.copy(result)
+            result.model = None
+            record['result'] = result
+
+        with open(self.file, 'ab') as f:
+            pickle.dump(record, f)
+            f.flush()
+            os.fsync(f.fileno())
 
 
 class Grid_Search_Result:
@@ -2295,6 +4251,37 @@ class Grid_Search_Result:
         self.store_optimality_name = store_optimality_name
         self.verbose = verbose
 
+    @classmethod
+    def from_checkpoint(cls, file, store_optimality_name=None, verbose=True):
+        '''
+        Load the results of a grid search checkpoint, without solving anything.
+        Designs that are not finished, or failed, are None
+
+        Parameters:
+        -----------
+        file: the checkpoint file name, see run_grid_search()
+        store_optimality_name: a csv file name containing all four optimalities value
+        verbose: if print statements
+
+        Return:
+        -------
+        a Grid_Search_Result object
+        '''
+        header, records, valid_bytes = Grid_search_checkpoint(file).read()
+        if header is None:
+            raise ValueError(str(file) + ' is not a grid search checkpoint.')
+
+        FIM_result_list = {}
+        for design in product(*header['design_ranges']):
+            record = records.get(design)
+            FIM_result_list[design] = None if record is None else record['result']
+
+        if verbose:
+            print(len(records), 'of', len(FIM_result_list), 'designs are in the checkpoint.')
+
+        return cls(header['design_ranges'], header['design_dimension_names'], header['design_control_time'], FIM_result_list,
+                   store_optimality_name=store_optimality_name, verbose=verbose)
+
     def extract_criteria(self):
         '''
         Extract design criteria values for every 'grid' (design variable combination) searched.
@@ -2305,32 +4292,27 @@ class Grid_Search_Result:
             Each row contains the design variable value for this 'grid', and the 4 design criteria value for this 'grid'.
         '''
 
-        # a list store all results
-        store_all_results = []
-
         # generate combinations of design variable values to go over
-        search_design_set = product(*self.design_ranges)
+        search_design_set = list(product(*self.design_ranges))
 
-        # loop over deign value combinations
-        for design_set_iter in search_design_set:
-            if self.verbose:
-                print('Design variable: ', self.design_names)
-                print('Value          : ', design_set_iter)
-
-            # locate this grid in the dictionary of combined results
-            result_object_asdict = {k:v for k,v in self.FIM_result_list.items() if k==design_set_iter}
-            # an result object is identified by a tuple of the design variable value it uses
-            result_object_iter = result_object_asdict[design_set_iter]
-
-            # store results as a row in the dataframe
-            store_iteration_result = list(design_set_iter)
-            store_iteration_result.append(result_object_iter.trace)
-            store_iteration_result.append(result_object_iter.det)
-            store_iteration_result.append(result_object_iter.min_eig)
-            store_iteration_result.append(result_object_iter.cond)
-
-            # add this row to the dataframe
-            store_all_results.append(store_iteration_result)
+        # an result object is identified by a tuple of the design variable value it uses
+        # failed or unfinished designs are None
+        result_objects = [self.FIM_result_list.get(design_set_iter) for design_set_iter in search_design_set]
+        finished = [i for i, result_object_iter in enumerate(result_objects) if result_object_iter is not None]
+
+        # criteria of all finished designs from one stacked eigendecomposition, NaN for the others
+        criteria = np.full((len(search_design_set), 4), np.nan)
+        if finished:
+            FIM_stack = np.array([result_objects[i].FIM for i in finished], dtype=float)
+            criteria_finished = design_criteria(FIM_stack)
+            criteria[finished] = criteria_finished[['A', 'D', 'E', 'ME']].values
+
+        if self.verbose:
+            print('Design variable: ', self.design_names)
+            print(len(finished), 'of', len(search_design_set), 'designs have results.')
+
+        # each row contains the design variable values and the 4 design criteria values
+        store_all_results = [list(design_set_iter) + list(criteria[i]) for i, design_set_iter in enumerate(search_design_set)]
 
         # generate column names for the dataframe
         column_names = []
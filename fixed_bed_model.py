@@ -3,8 +3,15 @@ import pyomo.environ as pyo
 from pyomo.dae import ContinuousSet, DerivativeVar
 
 import numpy as np
-from scipy.interpolate import interp2d
+from scipy.interpolate import RegularGridInterpolator
 import pandas as pd
+import time
+import functools
+import contextlib
+from itertools import product
+from pyomo.common.gc_manager import PauseGC
+
+import fixed_bed_store as fbs
 
 ### Reference list
 #[Hughes et al., 2011] Hughes, R., Kotamreddy, G., Ostace, A., Bhattacharyya, D., Siegelman, R. L., Parker, S. T., ... & Matuszewski, M. (2021).
@@ -40,9 +47,12 @@ else:
 # Molecular weight [g/mol]    
 MW = {'N2':28.013, 'CO2':44.010}
 
-# Number of axial grid elements
+# Number of axial grid elements, default of create_model
 Ngrid = 20
 
+# Position of the middle thermocouple, fraction of the bed length (grid 10 of the default 20 grids)
+z_mid = 0.55
+
 # R as gas constant [kJ/mol/K]
 RPV = 8.31446261815324E-3
 
@@ -117,7 +127,7 @@ cps = 1457
 # Value from [Hughes et al., 2021]
 Lbed = 0.1334
 
-# Length of each axial element [m]
+# Length of each axial element of the default uniform grid [m]
 dz = Lbed/Ngrid
 
 # Viscosity [Pa*s]
@@ -202,7 +212,121 @@ tort = 50
 temp_base = 298.15
 
 
-def create_model(scena, temp_feed=313.15, temp_bath=313.15, y=0.15, Q_init=0, doe_model=True, k_aug=False, opt = False, optimize_trace=True, diff=0, eps=0.01):
+def axial_grid(ngrid=Ngrid, inlet=0.0, front=None, front_weight=2.0, width=0.1):
+    '''
+    Generate axial grid positions, optionally clustered near the inlet and around the adsorption front.
+    The grid density is 1 + inlet*exp(-x/width) + front_weight*exp(-((x-front)/width)^2) along the
+    scaled bed position x, and the grids divide its integral into equal parts.
+    
+    Arguments:
+        ngrid: number of axial grid elements
+        inlet: clustering strength near the inlet. 0 for no clustering
+        front: position of the adsorption front, fraction of the bed length. None for no clustering
+        front_weight: clustering strength around the front
+        width: width of the clustered regions, fraction of the bed length
+        
+    Return: grid positions, the outlet end of each element as a fraction of the bed length. The last one is 1.
+    '''
+    x = np.linspace(0, 1, 2001)
+    density = 1 + inlet*np.exp(-x/width)
+    if front is not None:
+        density += front_weight*np.exp(-((x-front)/width)**2)
+    
+    # cumulative integral of the density with the trapezoid rule
+    cum = np.concatenate(([0], np.cumsum((density[1:]+density[:-1])/2*np.diff(x))))
+    positions = np.interp(np.linspace(0, cum[-1], ngrid+1)[1:], cum, x)
+    positions[-1] = 1.0
+    return positions
+
+
+def grid_positions(grid=None):
+    '''
+    Axial grid positions from the grid argument of create_model
+    
+    Arguments:
+        grid: None for the default uniform grid with Ngrid elements, an integer for a uniform grid with this
+            number of elements, or a list of grid positions (see axial_grid())
+            
+    Return: grid positions, the outlet end of each element as a fraction of the bed length
+    '''
+    if grid is None:
+        grid = Ngrid
+    
+    if np.ndim(grid) == 0:
+        return np.arange(1, int(grid)+1)/int(grid)
+    
+    positions = np.asarray(grid, dtype=float)
+    if positions[0] <= 0 or np.any(np.diff(positions) <= 0) or not np.isclose(positions[-1], 1.0):
+        raise ValueError('Grid positions should be increasing in (0, 1] and end with 1.')
+    return positions
+
+
+def grid_index(m, position):
+    '''
+    Find the grid closest to a bed position
+    
+    Arguments:
+        m: model
+        position: bed position, fraction of the bed length
+        
+    Return: index in m.zgrid
+    '''
+    return min(m.zgrid, key=lambda z: abs(pyo.value(m.z_position[z]) - position))
+
+
+def start_build_profile(m):
+    '''
+    Record the construction time of every component added to the model from now on, 
+    in m.build_profile: a dict, keys are component names, values are construction times [s]
+    
+    Arguments:
+        m: the model
+        
+    Return: None
+    '''
+    m.build_profile = {}
+    add_component = m.add_component
+    
+    def timed_add_component(name, val):
+        time0 = time.perf_counter()
+        add_component(name, val)
+        m.build_profile[name] = m.build_profile.get(name, 0) + time.perf_counter() - time0
+        
+    # instance attribute, shadows Block.add_component which the attribute assignments call
+    object.__setattr__(m, 'add_component', timed_add_component)
+    
+
+def stop_build_profile(m):
+    '''
+    Stop recording the construction time, see start_build_profile()
+    '''
+    if 'add_component' in m.__dict__:
+        object.__delattr__(m, 'add_component')
+        
+        
+def report_build_profile(m, top=15):
+    '''
+    Print the build time by component and by build stage
+    
+    Arguments:
+        m: the model, built with profile=True
+        top: how many of the slowest components to print
+        
+    Return: a pandas dataframe of the component construction times [s], slowest first
+    '''
+    stop_build_profile(m)
+    profile = pd.Series(getattr(m, 'build_profile', {}), dtype=float).sort_values(ascending=False)
+    
+    for stage, t_stage in getattr(m, 'build_stages', {}).items():
+        print('Build stage', stage, '[s]:', t_stage)
+    print('Component construction total [s]:', profile.sum())
+    for name, t_comp in profile.iloc[:top].items():
+        print('   ', name, ':', t_comp)
+    
+    return profile.rename('time').to_frame()
+
+
+def create_model(scena, temp_feed=313.15, temp_bath=313.15, y=0.15, Q_init=0, doe_model=True, k_aug=False, opt = False, optimize_trace=True, diff=0, eps=0.01, grid=None, fast_build=False, profile=False, parametric=False):
     ''' 
     Creates a concrete Pyomo model and adds sets/parameters.
     Toggles are saved into the model object.
@@ -226,6 +350,14 @@ def create_model(scena, temp_feed=313.15, temp_bath=313.15, y=0.15, Q_init=0, do
                 optimize_trace: if True, optimize trace. if not, optimize det.
                 diff: 0: no derivative estimate, 1: forward, -1: backward, 2: central
                 eps: step size for the finite difference perturbation
+            grid: axial grid. None for the default uniform grid with Ngrid elements, an integer for a uniform grid 
+                with this number of elements, or a list of grid positions, e.g. from axial_grid()
+            fast_build: if True, the garbage collector is paused in add_variables() and add_equations(), 
+                add_variables() sets bounds from index tables instead of calling the bounds functions for every index, 
+                and builds the temperature-dependent Expressions in one pass (these two need the time points given)
+            profile: if True, record the construction time of every component, see report_build_profile()
+            parametric: (active when doe_model is True) if True, temp_feed, temp_bath and yfeed are mutable parameters, 
+                so the model is built once and reused for other conditions, see set_conditions()
         energy: decide if energy balance is added to the model
         isotherm: decide if isotherm part is True. Must open if one of the chemsorb/physsorb is opened.
         chemsorb: decide if chemical adsorption part is opened to calculate adsorption kinetics
@@ -239,8 +371,12 @@ def create_model(scena, temp_feed=313.15, temp_bath=313.15, y=0.15, Q_init=0, do
     
     # create concrete Pyomo model
     m = pyo.ConcreteModel()
+    if profile:
+        start_build_profile(m)
 
     # Store model toggles
+    m.fast_build = fast_build
+    m.parametric = parametric and doe_model
     m.scena_all = scena
     m.doe_model = doe_model
     m.k_aug = k_aug
@@ -275,7 +411,13 @@ def create_model(scena, temp_feed=313.15, temp_bath=313.15, y=0.15, Q_init=0, do
     yfeed = {'N2':1-y, 'CO2':y}
     
     # Original bed temperature, [K]
-    if m.doe_model:
+    if m.parametric:
+        # updated in place by set_conditions()
+        m.temp_feed = pyo.Param(initialize=temp_feed, mutable=True)
+        m.temp_bath = pyo.Param(initialize=temp_bath, mutable=True)
+        m.yfeed = pyo.Param(initialize=y, mutable=True)
+        
+    elif m.doe_model:
         m.temp_feed = pyo.Var(initialize=temp_feed, bounds=(293.15, 373.15))
         m.temp_bath = pyo.Var(initialize=temp_bath, bounds=(274, 600))
         m.yfeed = pyo.Var(initialize=y, bounds=(0,0.4), within=pyo.NonNegativeReals)
@@ -292,7 +434,14 @@ def create_model(scena, temp_feed=313.15, temp_bath=313.15, y=0.15, Q_init=0, do
     m.Dax = pyo.Param(m.COMPS,initialize=Dax)
     
     # Manually discretize axial dimension
-    m.zgrid = pyo.Set(initialize=range(0,Ngrid))
+    positions = grid_positions(grid)
+    m.zgrid = pyo.Set(initialize=range(0,len(positions)))
+    
+    # Grid position, outlet end of each element as a fraction of the bed length
+    m.z_position = pyo.Param(m.zgrid, initialize={z: positions[z] for z in range(len(positions))})
+    
+    # Length of each axial element [m]
+    m.dz = pyo.Param(m.zgrid, initialize={z: Lbed*(positions[z] - (positions[z-1] if z > 0 else 0)) for z in range(len(positions))})
    
     # Initial bed N2 concentration at time 0.0 [mol/m3]
     # LHS: mol/m3
@@ -304,11 +453,14 @@ def create_model(scena, temp_feed=313.15, temp_bath=313.15, y=0.15, Q_init=0, do
 
     print('The inlet feed density is', pyo.value(m.totden_f), '[mol/m3]')
 
+    # the parametric model keeps the feed density as an expression of temp_feed
+    totden_f = m.totden_f if m.parametric else pyo.value(m.totden_f)
+    
     def den_f_rule_doe(m,i):
         if i=='CO2':
-            return m.yfeed*pyo.value(m.totden_f)
+            return m.yfeed*totden_f
         elif i=='N2':
-            return (1-m.yfeed)*pyo.value(m.totden_f)
+            return (1-m.yfeed)*totden_f
 
     m.den_f = pyo.Expression(m.COMPS, rule=den_f_rule_doe)
         
@@ -410,7 +562,7 @@ def breakthrough_bounds(z,t):
     return False
 
     
-def den_bounds_pert(m,j,c,t,z):
+def den_bounds_pert(m,j,c,z,t):
     '''
     density bounds, [mol/m3]
     '''
@@ -480,6 +632,103 @@ def jac_bounds(m, t):
     '''
     return (-1, 1)
 
+def fast_build_gc(build):
+    '''
+    Decorator for the model building functions: in fast build mode (m.fast_build), the garbage collector is 
+    paused while the function runs. The collector otherwise repeatedly scans the growing number of 
+    Pyomo objects, which dominates the build time of large models.
+    '''
+    @functools.wraps(build)
+    def build_paused(m, *args, **kwargs):
+        if getattr(m, 'fast_build', False):
+            with PauseGC():
+                return build(m, *args, **kwargs)
+        return build(m, *args, **kwargs)
+    return build_paused
+
+
+def add_bounded_var(m, name, sets, rule, table=None, **kwargs):
+    '''
+    Add a variable indexed by (sets, zgrid, t) with bounds from a bounds function. 
+    Fast build (table is given): the bounds function is called once for the constant bounds, at the outlet and 
+    the final time, and then only for the (z, t) in the index table where it can differ, instead of for every index.
+    
+    Arguments:
+        m: the model
+        name: variable name
+        sets: the leading index sets, e.g. [m.scena, m.SCOMPS]
+        rule: bounds function, e.g. den_bounds_pert
+        table: a list of (z, t) where the bounds function differs from the constant bounds. None to call 
+            the bounds function for every index
+        kwargs: other arguments of pyo.Var, e.g. initialize
+        
+    Return: the variable
+    '''
+    if table is None:
+        m.add_component(name, pyo.Var(*sets, m.zgrid, m.t, bounds=rule, **kwargs))
+        return getattr(m, name)
+    
+    leading = list(product(*sets))
+    bounds = rule(m, *leading[0], m.zgrid.last(), m.t.last())
+    m.add_component(name, pyo.Var(*sets, m.zgrid, m.t, bounds=bounds, **kwargs))
+    var = getattr(m, name)
+    
+    for lead in leading:
+        for z, t in table:
+            lb, ub = rule(m, *lead, z, t)
+            var[lead + (z, t)].setlb(lb)
+            var[lead + (z, t)].setub(ub)
+    return var
+            
+
+def temperature_expressions(m):
+    '''
+    Fast build of the temperature-dependent Expressions of add_variables() from one pass over the 
+    (scenario, grid, time) index table. The inverse and powers of the temperature at each index are formed 
+    once and shared by all these Expressions and components.
+    Same equations as the rules in add_variables().
+    
+    Arguments:
+        m: the model, with m.temp and m.fitted_transport_coefficient defined
+        
+    Return: a dict, keys are Expression names, values are the initialize dicts of the Expressions
+    '''
+    exprs = {name: {} for name in ['inv_K_oc', 'inv_K_op', 'cpg', 'h', 'b_a', 'n_a', 'K_eq', 'b_b', 'nmax_p']}
+    
+    for j, z, t in product(m.scena, m.zgrid, m.t):
+        temp = m.temp[j,z,t]
+        inv_temp = 1/temp
+        temp2 = temp**2
+        temp3 = temp**3
+        temp4 = temp**4
+        
+        # 1/k_oc, 1/k_op in [1/s]
+        exprs['inv_K_oc'][j,z,t] = m.fitted_transport_coefficient[j]+1/(K_c0*pyo.exp(-E_c/RPV*inv_temp + E_c/(RPV*T0)))
+        exprs['inv_K_op'][j,z,t] = m.fitted_transport_coefficient[j]+1/(K_p0*pyo.exp(-E_p/RPV*inv_temp + E_p/(RPV*T0)))
+        
+        # Cpg in [J/mol/K]
+        trans_t = temp*0.001
+        trans_t2 = trans_t**2
+        trans_t3 = trans_t**3
+        exprs['cpg'][j,'N2',z,t] = 29 + 1.85*trans_t - 9.65*trans_t2 + 16.64*trans_t3 + 0.000117/trans_t2
+        exprs['cpg'][j,'CO2',z,t] = 25 + 55.19*trans_t - 33.69*trans_t2 + 7.95*trans_t3 -0.1366/trans_t2
+        
+        # h in [J/mol], the reference temperature is temp_base
+        exprs['h'][j,'N2',z,t] = 29*(temp - temp_base) + 1.85E-3/2*(temp2-temp_base**2) - 9.65E-6/3*(temp3-temp_base**3) + 16.64E-9/4*(temp4 - temp_base**4) -117*inv_temp + 117/temp_base
+        exprs['h'][j,'CO2',z,t] = 25*(temp - temp_base) + 55.19E-3/2*(temp2-temp_base**2) - 33.69E-6/3*(temp3 - temp_base**3) + 7.95E-9/4*(temp4 - temp_base**4) +136638*inv_temp - 136638/temp_base
+        
+        # isotherm parameters
+        t0_ratio = T0*inv_temp-1
+        exprs['b_a'][j,z,t] = b_a0*pyo.exp(Q_sta/(RPV*T0)*t0_ratio)
+        exprs['n_a'][j,z,t] = n_a1*pyo.exp(E_na/(RPV*T0)*t0_ratio + small_bound)
+        exprs['K_eq'][j,z,t] = pyo.exp(Ka + Kb*inv_temp + small_bound)
+        exprs['b_b'][j,z,t] = b_b0*pyo.exp(Q_stb/(RPV*T0)*t0_ratio + small_bound)
+        exp_p = pyo.exp(Kc+Kd*inv_temp + small_bound)
+        exprs['nmax_p'][j,z,t] = nmax_p1*(exp_p/(1+exp_p))
+        
+    return exprs
+
+@fast_build_gc
 def add_variables(m,tf=3200, timesteps=None, start=0):
     '''
     Add variables to the Pyomo model using the toggles previously specified.
@@ -502,10 +751,19 @@ def add_variables(m,tf=3200, timesteps=None, start=0):
         m.t = ContinuousSet(bounds=(start,max(timesteps)), initialize=timesteps)
         m.tf = max(timesteps)
         m.t0 = min(timesteps)
+        
+    # Fast build: index tables where the bounds functions are not constant, see add_bounded_var().
+    # Needs all time points, the DAE transformation would add time points the tables do not cover
+    fast = m.fast_build and timesteps is not None
+    if fast:
+        breakthrough_table = [(z, t) for z in m.zgrid for t in m.t if breakthrough_bounds(z, t)]
+        t0_table = [(z, t) for z in m.zgrid for t in m.t if t == 0.0]
+    else:
+        breakthrough_table = None
+        t0_table = None
 
-          
     # Gas phase density (concentration) [mol/m^3]
-    m.C = pyo.Var(m.scena, m.COMPS, m.zgrid, m.t, bounds=den_bounds_pert)
+    add_bounded_var(m, 'C', [m.scena, m.COMPS], den_bounds_pert, breakthrough_table)
 
     # Gas phase density derivative, [mol/m^3] / [s]
     m.dCdt = DerivativeVar(m.C, wrt=m.t)
@@ -514,7 +772,7 @@ def add_variables(m,tf=3200, timesteps=None, start=0):
     m.total_den = pyo.Var(m.scena, m.zgrid, m.t, bounds=(tden_low, tden_high))
         
     # Gas phase velocity [cm/s]
-    m.v = pyo.Var(m.scena, m.zgrid, m.t, initialize=0.1, bounds=bounds_velocity_pert)
+    add_bounded_var(m, 'v', [m.scena], bounds_velocity_pert, t0_table, initialize=0.1)
     if m.v_fix:
         m.v.fix()
         
@@ -542,6 +800,18 @@ def add_variables(m,tf=3200, timesteps=None, start=0):
             m.ua =  pyo.Param(m.scena, initialize=m.scena_all['ua'], mutable=True)
         elif m.k_aug:
             m.ua = pyo.Var(m.scena, initialize=m.scena_all['ua'], bounds=(5, 12))
+            
+        # Fast build: all temperature-dependent Expressions in one pass, see temperature_expressions()
+        if fast:
+            temp_exprs = temperature_expressions(m)
+            
+        def temp_expression(name, sets, rule):
+            '''
+            Temperature-dependent Expression from its rule, or from temp_exprs in fast build mode
+            '''
+            if fast:
+                return pyo.Expression(*sets, initialize=temp_exprs[name])
+            return pyo.Expression(*sets, rule=rule)
 
         # define inv_k_oc, inv_k_op according to perturbation
         def inv_k_oc_init_en(m, j, z, t):
@@ -558,8 +828,8 @@ def add_variables(m,tf=3200, timesteps=None, start=0):
 
         # For square problem/optimization problem, parameter, k_oc/p are parameters
         #if not m.k_aug:
-        m.inv_K_oc = pyo.Expression(m.scena, m.zgrid, m.t, rule=inv_k_oc_init_en)
-        m.inv_K_op = pyo.Expression(m.scena, m.zgrid, m.t, rule=inv_k_op_init_en)
+        m.inv_K_oc = temp_expression('inv_K_oc', [m.scena, m.zgrid, m.t], inv_k_oc_init_en)
+        m.inv_K_op = temp_expression('inv_K_op', [m.scena, m.zgrid, m.t], inv_k_op_init_en)
             
         # If not square problem, k_oc/p are defined as parameters variable with temperature, defined in add_model()
           
@@ -573,7 +843,7 @@ def add_variables(m,tf=3200, timesteps=None, start=0):
                 return 29 + 1.85*trans_t - 9.65*trans_t**2 + 16.64*trans_t**3 + 0.000117/trans_t/trans_t
             elif i=='CO2':
                 return 25 + 55.19*trans_t - 33.69*trans_t**2 + 7.95*trans_t**3 -0.1366/trans_t/trans_t
-        m.cpg = pyo.Expression(m.scena, m.COMPS, m.zgrid, m.t, rule=cpg_rule)
+        m.cpg = temp_expression('cpg', [m.scena, m.COMPS, m.zgrid, m.t], cpg_rule)
         
         
         def h_rule(m,j,i,z,t):
@@ -586,7 +856,7 @@ def add_variables(m,tf=3200, timesteps=None, start=0):
             elif i=='CO2':
                 return 25*(m.temp[j,z,t] - temp_base) + 55.19E-3/2*(m.temp[j,z,t]**2-temp_base**2) - 33.69E-6/3*(m.temp[j,z,t]**3 - temp_base**3) + 7.95E-9/4*(m.temp[j,z,t]**4 - temp_base**4) +136638/m.temp[j,z,t] - 136638/temp_base
                 
-        m.h = pyo.Expression(m.scena, m.COMPS, m.zgrid, m.t, rule=h_rule)
+        m.h = temp_expression('h', [m.scena, m.COMPS, m.zgrid, m.t], h_rule)
         
         # Feed heat at the feed temperature [W/m2/K]
         def h_feed_rule(m,i):
@@ -608,19 +878,19 @@ def add_variables(m,tf=3200, timesteps=None, start=0):
     if m.isotherm:
         
         # Surface partial pressure, [bar]
-        m.spp = pyo.Var(m.scena, m.SCOMPS, m.zgrid, m.t, initialize=small_initial, bounds=surface_partial_pressure_bounds_pert)
+        add_bounded_var(m, 'spp', [m.scena, m.SCOMPS], surface_partial_pressure_bounds_pert, breakthrough_table, initialize=small_initial)
         
         # Chemical adsorption equilibrium, [mol / kg]
-        m.nchemstar = pyo.Var(m.scena, m.SCOMPS, m.zgrid, m.t, initialize = small_initial, bounds=chem_star_bounds_pert)
+        add_bounded_var(m, 'nchemstar', [m.scena, m.SCOMPS], chem_star_bounds_pert, breakthrough_table, initialize=small_initial)
         
         # Chemical adsorption equilibrium, modified [mol / kg]
-        m.nchemstar_mod = pyo.Var(m.scena, m.SCOMPS, m.zgrid, m.t, initialize = small_initial, bounds=chem_star_bounds_pert)
+        add_bounded_var(m, 'nchemstar_mod', [m.scena, m.SCOMPS], chem_star_bounds_pert, breakthrough_table, initialize=small_initial)
         
         # Physical adsorption equilibrium, [mol / kg]
-        m.nphysstar = pyo.Var(m.scena, m.SCOMPS, m.zgrid, m.t, initialize = small_initial, bounds=phys_star_bounds_pert)
+        add_bounded_var(m, 'nphysstar', [m.scena, m.SCOMPS], phys_star_bounds_pert, breakthrough_table, initialize=small_initial)
         
         # Physical adsorption equilibrium with linear region [mol/kg]
-        m.nphysstar_mod = pyo.Var(m.scena, m.SCOMPS, m.zgrid, m.t, initialize =small_initial, bounds=phys_star_bounds_pert)
+        add_bounded_var(m, 'nphysstar_mod', [m.scena, m.SCOMPS], phys_star_bounds_pert, breakthrough_table, initialize=small_initial)
         
         # alpha used to form linearized pressure
         if alpha_variable:
@@ -629,14 +899,14 @@ def add_variables(m,tf=3200, timesteps=None, start=0):
     if m.chemsorb:
          
         # Chemical adsorption loading, [mol of gas/ kg of sorbent]
-        m.nchem = pyo.Var(m.scena, m.SCOMPS, m.zgrid, m.t, initialize = small_initial, bounds=chem_star_bounds_pert)
+        add_bounded_var(m, 'nchem', [m.scena, m.SCOMPS], chem_star_bounds_pert, breakthrough_table, initialize=small_initial)
 
         # Time derivative, [mol/kg/s]
         m.dnchemdt = DerivativeVar(m.nchem, wrt=m.t)
         
     if m.physsorb:
         # Physical adsorption equilibrium loading, [mol of gas/kg of sorbent]
-        m.nphys = pyo.Var(m.scena, m.SCOMPS, m.zgrid, m.t, initialize = small_initial, bounds=phys_star_bounds_pert)
+        add_bounded_var(m, 'nphys', [m.scena, m.SCOMPS], phys_star_bounds_pert, breakthrough_table, initialize=small_initial)
         
         # Time derivative, [mol/kg/s]
         m.dnphysdt = DerivativeVar(m.nphys, wrt=m.t)
@@ -650,14 +920,14 @@ def add_variables(m,tf=3200, timesteps=None, start=0):
         # Eq 14 in Aug. 2018 WVU report
         # LHS: [1/bar]
         # RHS: [1/bar] * exp( [kJ/mol]/[kJ/mol/K * K] ) = [1/b] * exp( [ dimensionless ] )
-        m.b_a = pyo.Expression(m.scena, m.zgrid, m.t, rule=b_a_en) 
+        m.b_a = temp_expression('b_a', [m.scena, m.zgrid, m.t], b_a_en) 
 
         # Eq 15 in Aug. 2018 WVU report
         # LHS: dimensionless
         # RHS: dimensionless * exp( [kJ/mol]/[kJ/mol/K * K] ) = [dimensionless] * exp( [ dimensionless ])
         def n_a_en(m,j,z,t):
             return n_a1*pyo.exp(E_na/(RPV*T0)*(T0/m.temp[j,z,t]-1) + small_bound)
-        m.n_a = pyo.Expression(m.scena, m.zgrid, m.t, rule=n_a_en)
+        m.n_a = temp_expression('n_a', [m.scena, m.zgrid, m.t], n_a_en)
 
         def inv_n_a_en(m,j,z,t):
             return 1/m.n_a[j,z,t]
@@ -668,7 +938,7 @@ def add_variables(m,tf=3200, timesteps=None, start=0):
         # RHS: dimensionless + K/K
         def k_eq_en(m,j,z,t):
             return pyo.exp(Ka + Kb/m.temp[j,z,t] + small_bound)
-        m.K_eq = pyo.Expression(m.scena, m.zgrid, m.t, rule=k_eq_en)
+        m.K_eq = temp_expression('K_eq', [m.scena, m.zgrid, m.t], k_eq_en)
 
         ### Physical adsorption isotherm
         # Eq 14 in Aug. 2018 WVU report
@@ -676,7 +946,7 @@ def add_variables(m,tf=3200, timesteps=None, start=0):
         # RHS: bar-1 * (kJ/mol)/(kJ/mol/K * K)
         def b_b_en(m,j,z,t):
             return b_b0*pyo.exp(Q_stb/(RPV*T0)*(T0/m.temp[j,z,t]-1) + small_bound)
-        m.b_b = pyo.Expression(m.scena, m.zgrid, m.t, rule=b_b_en)
+        m.b_b = temp_expression('b_b', [m.scena, m.zgrid, m.t], b_b_en)
 
 
         # Eq 16 in Aug. 2018 WVU report
@@ -684,7 +954,7 @@ def add_variables(m,tf=3200, timesteps=None, start=0):
         # RHS: mol/kg * 1
         def nmax_p_en(m,j,z,t):
             return nmax_p1*(pyo.exp(Kc+Kd/m.temp[j,z,t] + small_bound)/(1+pyo.exp(Kc+Kd/m.temp[j,z,t] + small_bound)))
-        m.nmax_p = pyo.Expression(m.scena, m.zgrid, m.t, rule=nmax_p_en)
+        m.nmax_p = temp_expression('nmax_p', [m.scena, m.zgrid, m.t], nmax_p_en)
 
         # Eq 12 in Aug. 2018 WVU report
         # LHS: mol/kg
@@ -706,6 +976,30 @@ def add_variables(m,tf=3200, timesteps=None, start=0):
         
 ### DEFINE EQUATION FUNCTION
 
+def second_difference(m, j, i, z, t):
+    '''
+    Second derivative of the gas phase density in z, for the dispersion term.
+    Three-point stencil on the (possibly non-uniform) grid; the first and last grids use the stencil of their neighbour.
+    
+    Arguments: 
+        m: model
+        j: model.perturb 
+        i: model.COMPS
+        z: model.zgrid
+        t: model.t
+        
+    Return: d2C/dz2 [mol/m5]
+    '''
+    # center of the stencil
+    zc = min(max(z, m.zgrid.first()+1), m.zgrid.last()-1)
+    
+    # distance to the previous and the next grid [m]
+    h_back = m.dz[zc]
+    h_next = m.dz[zc+1]
+    
+    return 2*(h_back*m.C[j,i,zc+1,t] - (h_back+h_next)*m.C[j,i,zc,t] + h_next*m.C[j,i,zc-1,t])/(h_back*h_next*(h_back+h_next))
+
+
 def gas_comp_mb(m, j, i, z, t):
     '''
     Calculate bulk gas phase species balances.
@@ -725,9 +1019,9 @@ def gas_comp_mb(m, j, i, z, t):
     # LHS: mol/m3/s
     # RHS: (cm/s * mol/m3 / (100cm/m) - cm/s * mol/m3 / (100cm/m))/m = mol/m3/s
     if z == 0:
-        dvCdz = (m.v[j,z,t]*0.01*m.C[j,i,z,t] - vel_f*0.01*m.totden_f*m.yfeed[i])/dz
+        dvCdz = (m.v[j,z,t]*0.01*m.C[j,i,z,t] - vel_f*0.01*m.totden_f*m.yfeed[i])/m.dz[z]
     else:
-        dvCdz = (m.v[j,z,t]*0.01*m.C[j,i,z,t] - m.v[j,z-1,t]*0.01*m.C[j,i,z-1,t])/dz
+        dvCdz = (m.v[j,z,t]*0.01*m.C[j,i,z,t] - m.v[j,z-1,t]*0.01*m.C[j,i,z-1,t])/m.dz[z]
 
     diff_term = 0
     # LDF from ACM code
@@ -743,12 +1037,7 @@ def gas_comp_mb(m, j, i, z, t):
         # LHS: mol/m3/s
         # RHS: m2/s * mol/m3/m2
         # combine the two gas mas balances, so it can be toggled on and off 
-        if z == 0:
-            disp_term = Dax[i] * (m.C[j,i,z+2,t]-2*m.C[j,i,z+1,t]+m.C[j,i,z,t])/(dz*dz)
-        elif z == 19:
-            disp_term = Dax[i] * (m.C[j,i,z,t]-2*m.C[j,i,z-1,t]+m.C[j,i,z-2,t])/(dz*dz)
-        else: 
-            disp_term = Dax[i] * (m.C[j,i,z+1,t]-2*m.C[j,i,z,t]+m.C[j,i,z-1,t])/(dz*dz)
+        disp_term = Dax[i] * second_difference(m, j, i, z, t)
     # LHS: mol/m3/s; # RHS: mol/m3/s - mol/m3/s
     return m.dCdt[j,i,z,t] == -dvCdz / (ads_epsb) - diff_term/ (ads_epsb) - disp_term 
 
@@ -773,12 +1062,12 @@ def gas_comp_mb_doe(m, j, i, z, t):
     # RHS: (cm/s * mol/m3 / (100cm/m) - cm/s * mol/m3 / (100cm/m))/m = mol/m3/s
     if z == 0:
         if i=='CO2':
-            dvCdz = (m.v[j,z,t]*0.01*m.C[j,i,z,t] - vel_f*0.01*m.totden_f*m.yfeed)/dz
+            dvCdz = (m.v[j,z,t]*0.01*m.C[j,i,z,t] - vel_f*0.01*m.totden_f*m.yfeed)/m.dz[z]
         elif i=='N2':
-            dvCdz = (m.v[j,z,t]*0.01*m.C[j,i,z,t] - vel_f*0.01*m.totden_f*(1-m.yfeed))/dz
+            dvCdz = (m.v[j,z,t]*0.01*m.C[j,i,z,t] - vel_f*0.01*m.totden_f*(1-m.yfeed))/m.dz[z]
             
     else:
-        dvCdz = (m.v[j,z,t]*0.01*m.C[j,i,z,t] - m.v[j,z-1,t]*0.01*m.C[j,i,z-1,t])/dz
+        dvCdz = (m.v[j,z,t]*0.01*m.C[j,i,z,t] - m.v[j,z-1,t]*0.01*m.C[j,i,z-1,t])/m.dz[z]
 
     diff_term = 0
     # LDF from ACM code
@@ -794,10 +1083,7 @@ def gas_comp_mb_doe(m, j, i, z, t):
         # LHS: mol/m3/s
         # RHS: m2/s * mol/m3/m2
         # combine the two gas mas balances, so it can be toggled on and off 
-        if z == 0:
-            disp_term = Dax[i] * (m.C[j,i,z+2,t]-2*m.C[j,i,z+1,t]+m.C[j,i,z,t])/(dz*dz)
-        else:
-            disp_term = Dax[i] * (m.C[j,i,z+1,t]-2*m.C[j,i,z,t]+m.C[j,i,z-1,t])/(dz*dz)
+        disp_term = Dax[i] * second_difference(m, j, i, z, t)
     # LHS: mol/m3/s; # RHS: mol/m3/s - mol/m3/s
     return m.dCdt[j,i,z,t] == -dvCdz / (ads_epsb) - diff_term/ (ads_epsb) - disp_term 
 
@@ -840,11 +1126,11 @@ def energy_balance(m, j, z, t):
     # LHS: W/m3 = J/s/m3 
     # RHS: cm/s * 1m/100cm * J/m3 * 1/m = J/s/m3 
     if z==0: 
-        duhdz = (m.v[j,z,t]*0.01*h_sum - vel_f*0.01*h_sum_feed)/dz
+        duhdz = (m.v[j,z,t]*0.01*h_sum - vel_f*0.01*h_sum_feed)/m.dz[z]
     else:
         # heat flow of the previous grid, [J/m3]
         h_sum_back = sum(m.C[j,b,z-1,t]*m.h[j,b,z-1,t] for b in m.COMPS)
-        duhdz = (m.v[j,z,t]*0.01*h_sum - m.v[j,z-1,t]*0.01*h_sum_back)/dz
+        duhdz = (m.v[j,z,t]*0.01*h_sum - m.v[j,z-1,t]*0.01*h_sum_back)/m.dz[z]
     
     # LHS: K/s
     # RHS: (kg/m3 * kJ/kg/s * 1000J/1kJ - J/m3/s - J/s/m3/K *K)/ (J/m3/K) = K/s
@@ -910,9 +1196,9 @@ def ergun(m, j, z, t):
     beff = 150*fp_mu*(1-ads_epsb)*(1-ads_epsb)/(4*radp*radp*ads_epsb*ads_epsb*ads_epsb)
 
     if z == 0:
-        dPdz = (m.P[j,z,t] - totp_f) / dz
+        dPdz = (m.P[j,z,t] - totp_f) / m.dz[z]
     else:
-        dPdz = (m.P[j,z,t] - m.P[j,z-1,t]) / dz
+        dPdz = (m.P[j,z,t] - m.P[j,z-1,t]) / m.dz[z]
     
     # Assumption: velocity is always positive
     # LHS: [bar/m] 
@@ -1173,6 +1459,7 @@ Adsorption isotherm calculation
 Note: With constant temperature, many of the isotherm intermediates are CONSTANT
 '''
 
+@fast_build_gc
 def add_equations(mod):
     ''' 
     Adds equations to the Pyomo model using the already specified toggles.
@@ -1229,13 +1516,20 @@ def fix_initial_bed(m, v_init=2.0):
     '''
     Initialize the bed. 
     Make component density and phys/chem adsorption all over the bed at time0 to be 0.0. 
+    The bed temperature at time0 is the bath temperature; in the parametric model this is an equation,
+    so it follows temp_bath when it is changed.
     '''
+    if m.energy and m.parametric and m.component('initial_temp') is None:
+        def initial_temp(m, j, z):
+            return m.temp[j,z,m.t0] == m.temp_bath
+        m.initial_temp = pyo.Constraint(m.scena, m.zgrid, rule=initial_temp)
+        
     for j in m.scena:
         for z in m.zgrid:
             m.C[j,'CO2',z, m.t0].fix(small_initial)
             m.v[j,z,m.t0].fix(v_init)
             
-            if m.energy:
+            if m.energy and not m.parametric:
                 m.temp[j,z,m.t0].fix(pyo.value(m.temp_bath))
 
             if m.chemsorb:
@@ -1245,6 +1539,167 @@ def fix_initial_bed(m, v_init=2.0):
                 m.nphys[j,'CO2',z,m.t0].fix(small_initial)
         
 
+def set_conditions(m, temp_feed=None, yfeed=None, temp_bath=None):
+    '''
+    Change the operating conditions of a parametric model (create_model(parametric=True)) in place, for another design point.
+    The current solution stays as the initial point of the next solve.
+    Other models have the feed density and the terms derived from it fixed at build time, so they are rebuilt instead.
+    
+    Arguments:
+        m: the parametric model
+        temp_feed: the gas feed temperature, [K]. None to keep the current value
+        yfeed: CO2 feed composition, [0,1]. None to keep the current value
+        temp_bath: the water bathing temperature, [K]. None to keep the current value
+        
+    Return: None
+    '''
+    if not m.parametric:
+        raise ValueError('set_conditions() needs a model built with parametric=True and doe_model=True.')
+    
+    for comp, val in [(m.temp_feed, temp_feed), (m.yfeed, yfeed), (m.temp_bath, temp_bath)]:
+        if val is None:
+            continue
+        if comp.is_variable_type():
+            comp.fix(val)
+        else:
+            comp.set_value(val)
+            
+
+# Model variables and expressions stored in SolutionArray by default
+solution_names = ['C', 'dCdt', 'v', 'P', 'total_den', 'temp', 'dTdt', 'nplin', 'FCO2', 
+                  'spp', 'nchemstar', 'nchemstar_mod', 'nphysstar', 'alpha', 'nchem', 'dnchemdt', 'nphys', 'dnphysdt']
+
+
+def extract_array(comp, *index_sets):
+    ''' 
+    Read an indexed Pyomo variable or expression into a numpy array in one pass.
+    Variable values are read in bulk; uninitialized values are NaN.
+    
+    Arguments:
+        comp: Pyomo indexed variable or expression
+        index_sets: the index sets, in the order of the component indexes
+        
+    Return: array with shape (len(set) for set in index_sets)
+    '''
+    if isinstance(comp, pyo.Var):
+        values = comp.extract_values()
+    else:
+        values = {idx: pyo.value(e, exception=False) for idx, e in comp.items()}
+    
+    shape = tuple(len(s) for s in index_sets)
+    # single-set components are keyed by the element, not a 1-tuple
+    keys = index_sets[0] if len(index_sets) == 1 else product(*index_sets)
+    flat = np.fromiter((np.nan if values[idx] is None else values[idx] for idx in keys), 
+                       dtype=float, count=int(np.prod(shape)))
+    return flat.reshape(shape)
+
+
+class SolutionArray:
+    '''
+    Labelled array of a model solution: [variable, scenario, component, zgrid, t].
+    Variables without a component index (e.g. v, P, temp) are broadcast over the component axis; 
+    variables indexed by SCOMPS are NaN for the components that do not adsorb.
+    '''
+    def __init__(self, m, names=None):
+        '''
+        Extract the solution from the model.
+        
+        Arguments:
+            m: the model
+            names: names of the variables and expressions to extract. If None, solution_names 
+                (the ones not in the model are skipped)
+        '''
+        if names is None:
+            names = [n for n in solution_names if m.find_component(n) is not None]
+        
+        self.variables = list(names)
+        self.scenarios = list(m.scena)
+        self.components = list(m.COMPS)
+        self.zgrid = list(m.zgrid)
+        self.positions = np.array([pyo.value(m.z_position[z]) for z in m.zgrid])
+        self.time = np.array([pyo.value(t) for t in m.t])
+        
+        self.data = np.full((len(self.variables), len(self.scenarios), len(self.components), 
+                             len(self.zgrid), len(self.time)), np.nan)
+        
+        for k, name in enumerate(self.variables):
+            comp = getattr(m, name)
+            if not comp.is_indexed():
+                # e.g. nplin is a scalar parameter when the energy balance is off
+                self.data[k] = pyo.value(comp)
+                continue
+            subsets = list(comp.index_set().subsets())
+            if len(subsets) == 4:
+                # (scenario, component, zgrid, t)
+                comps = list(subsets[1])
+                values = extract_array(comp, m.scena, comps, m.zgrid, m.t)
+                for c, cname in enumerate(comps):
+                    self.data[k, :, self.components.index(cname)] = values[:, c]
+            else:
+                # (scenario, zgrid, t)
+                self.data[k] = extract_array(comp, m.scena, m.zgrid, m.t)[:, None]
+    
+    def __getitem__(self, name):
+        '''
+        Values of one variable, [scenario, component, zgrid, t]
+        '''
+        return self.data[self.variables.index(name)]
+    
+    def sel(self, name, scenario=None, component=None):
+        '''
+        Select the values of one variable
+        
+        Arguments:
+            name: variable name
+            scenario: scenario name. If None, all scenarios are returned
+            component: component name. If None, the first component is returned, which is 
+                the only one for variables without a component index
+                
+        Return: array, [scenario, zgrid, t], or [zgrid, t] if the scenario is given
+        '''
+        values = self[name]
+        if component is None:
+            values = values[:, 0]
+        else:
+            values = values[:, self.components.index(component)]
+            
+        if scenario is not None:
+            values = values[self.scenarios.index(scenario)]
+        return values
+    
+    
+def scenario_slots(m):
+    ''' 
+    Scenario names in the result slots of extract2d/extract3d and extract3_v2, according to m.diff
+    
+    Arguments:
+        m: the model
+    
+    Return: a list of four scenario names or None for the unused slots
+    '''
+    if m.diff == 0:
+        return [0, None, None, None]
+    elif m.diff == 1:
+        return ['base', 'forward_k', 'forward_ua', None]
+    elif m.diff == -1:
+        return ['base', 'backward_k', 'backward_ua', None]
+    elif m.diff == 2:
+        return ['forward_k', 'forward_ua', 'backward_k', 'backward_ua']
+
+
+def _slot_arrays(m, values, scenarios):
+    '''
+    Split [scenario, zgrid, t] values into the four result slots, unused slots are zeros
+    '''
+    D = []
+    for s in scenario_slots(m):
+        if s is None:
+            D.append(np.zeros((len(m.zgrid), len(m.t))))
+        else:
+            D.append(values[scenarios.index(s)])
+    return D
+
+
 def extract2d(m, var):
     ''' 
     Extract values for 2D variable
@@ -1254,41 +1709,14 @@ def extract2d(m, var):
         var - Pyomo Variable
         
     Returns:
-        D - 2D numpy array with values
+        D - 2D numpy array with values, one for each scenario slot (see scenario_slots)
         
     Assumptions:
         * First variable index is grid position
         * Second variable index is time position
     '''
-    # Extract length of two dimensions
-    Ngrid = len(m.zgrid)
-    NFEt = len(m.t) - 1
-
-    # Create numpy array of zeros 
-    D1 = np.zeros((Ngrid,NFEt+1))
-    D2 = np.zeros((Ngrid,NFEt+1))
-    D3 = np.zeros((Ngrid,NFEt+1))
-    D4 = np.zeros((Ngrid,NFEt+1))
-    
-    # Loop over time and space, extract values from Pyomo variable
-    for i,t in enumerate(m.t):
-        for j,z in enumerate(m.zgrid):
-            if m.diff == 0:
-                D1[j,i] = value(var[0,z,t])
-            elif m.diff == 1:
-                D1[j,i] = value(var['base',z,t])
-                D2[j,i] = value(var['forward_k',z,t])
-                D3[j,i] = value(var['forward_ua',z,t])
-            elif m.diff == -1:
-                D1[j,i] = value(var['base',z,t])
-                D2[j,i] = value(var['backward_k',z,t])
-                D3[j,i] = value(var['backward_ua',z,t])
-            elif m.diff == 2: 
-                D1[j,i] = value(var['forward_k',z,t])
-                D2[j,i] = value(var['forward_ua',z,t])
-                D3[j,i] = value(var['backward_k',z,t])
-                D4[j,i] = value(var['backward_ua',z,t])
-    
+    values = extract_array(var, m.scena, m.zgrid, m.t)
+    D1, D2, D3, D4 = _slot_arrays(m, values, list(m.scena))
     return D1,D2,D3,D4
 
 def extract3d(m, var, ind):
@@ -1301,45 +1729,19 @@ def extract3d(m, var, ind):
         ind - Index for first dimension
         
     Returns:
-        D - 2D numpy array with values
+        D - 2D numpy array with values, one for each scenario slot (see scenario_slots)
         
     Assumptions:
         * First variable index is grid position
         * Second variable index is time position
     '''
-    # Extract length of two dimensions
-    Ngrid = len(m.zgrid)
-    NFEt = len(m.t) - 1
-    
-    # Create numpy array of zeros 
-    D1 = np.zeros((Ngrid,NFEt+1))
-    D2 = np.zeros((Ngrid,NFEt+1))
-    D3 = np.zeros((Ngrid,NFEt+1))
-    D4 = np.zeros((Ngrid,NFEt+1))
-    
-    # Loop over time and space, extract values from Pyomo variable
-    for i,t in enumerate(m.t):
-        for j,z in enumerate(m.zgrid):
-            if m.diff ==0:
-                D1[j,i] = value(var[0,ind,z,t])
-            elif m.diff ==1:
-                D1[j,i] = value(var[0,ind,z,t])
-                D2[j,i] = value(var['forward_k',ind,z,t])
-                D3[j,i] = value(var['forward_ua',ind,z,t])
-            elif m.diff ==-1:
-                D1[j,i] = value(var['base',ind,z,t])
-                D2[j,i] = value(var['backward_k',ind,z,t])
-                D3[j,i] = value(var['backward_ua',ind,z,t])
-            elif m.diff ==2:
-                D1[j,i] = value(var['forward_k',ind,z,t])
-                D2[j,i] = value(var['forward_ua',ind,z,t])
-                D3[j,i] = value(var['backward_k',ind,z,t])
-                D4[j,i] = value(var['backward_ua',ind,z,t])
+    values = extract_array(var, m.scena, [ind], m.zgrid, m.t)[:, 0]
+    D1, D2, D3, D4 = _slot_arrays(m, values, list(m.scena))
     return D1,D2, D3, D4
 
 def make_plots(m):
     '''
-    Make plots. 
+    Make plots of the first scenario. 
     
     Arguments:
         m: the model
@@ -1348,159 +1750,42 @@ def make_plots(m):
     
     other: plots
     '''
-
-    # Extract grid position values
-    Z = []
-    for j in m.zgrid:
-        Z.append(value(j))
-
-    # Extract time values   
-    T = []
-    for j in m.t:
-        T.append(value(j))
-
-    # Visualize pressure
-    P1, P2 = extract2d(m, m.P)
-    if(len(T) > 1):
-        h = plt.contourf(T,Z,P1)
-        plt.xlabel('Time [sec]')
-        plt.ylabel('Bed Position [scaled]')
-        plt.colorbar(h)
-        plt.title('Pressure [bar]')
-    else:
-        plt.plot(Z,P1)
-        plt.xlabel('Bed Position [scaled]')
-        plt.ylabel('Pressure [bar]')
-    plt.show()
     
-    if m.energy:
-        temp1, temp2 = extract2d(m,m.temp)
-        if(len(T) > 1):
-            h = plt.contourf(T,Z,temp1)
-            plt.xlabel('Time [sec]')
-            plt.ylabel('Bed Position [scaled]')
-            plt.colorbar(h)
-            plt.title('Temperature [K]')
-        else:
-            plt.plot(Z,temp1)
-            plt.xlabel('Bed Position [scaled]')
-            plt.ylabel('Temperature [K]')
-        plt.show()
+    # (variable, component, label, shown)
+    plot_list = [('P', None, 'Pressure [bar]', True), 
+                 ('temp', None, 'Temperature [K]', m.energy), 
+                 ('spp', 'CO2', 'Surface pressure [bar]', m.isotherm), 
+                 ('v', None, 'Velocity [cm/s]', True), 
+                 ('C', 'N2', 'N2 Density [mol/m$^3$]', True), 
+                 ('C', 'CO2', 'CO2 Density [mol/m$^3$]', True), 
+                 ('nchemstar', 'CO2', 'Chemical Isotherm [mol/kg]', m.chemsorb), 
+                 ('nchem', 'CO2', 'Chemical Loading [mol/kg]', m.chemsorb), 
+                 ('nphysstar', 'CO2', 'Physical Isotherm [mol/kg]', m.physsorb), 
+                 ('nphys', 'CO2', 'Physical Loading [mol/kg]', m.physsorb), 
+                 ('alpha', 'CO2', 'alpha is modified isotherm [dimensionless]', m.physsorb)]
     
-    if m.isotherm:
-        SPP1, SPP2 = extract3d(m, m.spp, 'CO2')
-        if(len(T) > 1):
-            h = plt.contourf(T,Z,SPP1)
-            plt.xlabel('Time [sec]')
-            plt.ylabel('Bed Position [scaled]')
-            plt.colorbar(h)
-            plt.title('Surface pressure [bar]')
-        else:
-            plt.plot(Z,SPP1)
-            plt.xlabel('Bed Position [scaled]')
-            plt.ylabel('Surface pressure [bar]')
-        plt.show()
-
-    # Visualize velocity
-    V1, V2 = extract2d(m, m.v)
-    if(len(T) > 1):
-        h = plt.contourf(T,Z,V1)
-        plt.xlabel('Time [sec]')
-        plt.ylabel('Bed Position [scaled]')
-        plt.colorbar(h)
-        plt.title('Velocity [cm/s]')
-    else:
-        plt.plot(Z,V1)
-        plt.xlabel('Bed Position [scaled]')
-        plt.ylabel('Velocity [cm/s]')
+    sol = SolutionArray(m, names=list(dict.fromkeys(p[0] for p in plot_list if p[3])))
     
-    plt.show()
-   
-        
-    # Visualize density
-    # for c in ['N2','CO2','He']:
-    for c in ['N2','CO2']:
-        den1, den2 = extract3d(m, m.C, c)
-        if(len(T) > 1):
-            h = plt.contourf(T,Z,den1)
-            plt.xlabel('Time [sec]')
-            plt.ylabel('Bed Position [scaled]')
-            plt.colorbar(h)
-            plt.title(c +' Density [mol/m$^3$]')
-        else:
-            plt.plot(Z,den1)
-            plt.xlabel('Bed Position [scaled]')
-            plt.ylabel(c +' Density [mol/m$^3$]')
-        plt.show()
-
-    if m.chemsorb:
-        
-        # Visualize isotherm
-        nchemstar1, nchemstar2 = extract3d(m, m.nchemstar,'CO2')
-        if(len(T) > 1):
-            h = plt.contourf(T,Z,nchemstar1)
-            plt.xlabel('Time [sec]')
-            plt.ylabel('Bed Position [scaled]')
-            plt.colorbar(h)
-            plt.title('Chemical Isotherm [mol/kg]')
-        else:
-            plt.plot(Z,nchemstar1)
-            plt.xlabel('Bed Position [scaled]')
-            plt.ylabel('Chemical Isotherm [mol/kg]')
-        plt.show()
-        
-        # Visualize loading
-        nchem1, nchem2 = extract3d(m, m.nchem,'CO2')
-        if(len(T) > 1):
-            h = plt.contourf(T,Z,nchem1)
-            plt.xlabel('Time [sec]')
-            plt.ylabel('Bed Position [scaled]')
-            plt.colorbar(h)
-            plt.title('Chemical Loading [mol/kg]')
-        else:
-            plt.plot(Z,nchem2)
-            plt.xlabel('Bed Position [scaled]')
-            plt.ylabel('Chemical Loading [mol/kg]')
-        plt.show()
-        
-    if m.physsorb:
-        nphysstar1, nphysstar2 = extract3d(m, m.nphysstar,'CO2')
-        if(len(T) > 1):
-            h = plt.contourf(T,Z,nphysstar1)
-            plt.xlabel('Time [sec]')
-            plt.ylabel('Bed Position [scaled]')
-            plt.colorbar(h)
-            plt.title('Physical Isotherm [mol/kg]')
-        else:
-            plt.plot(Z,nphysstar1)
-            plt.xlabel('Bed Position [scaled]')
-            plt.ylabel('Physical Isotherm [mol/kg]')
-        plt.show()
-           
-        nphys1, nphys2 = extract3d(m, m.nphys,'CO2')
-        if(len(T) > 1):
-            h = plt.contourf(T,Z,nphys1)
-            plt.xlabel('Time [sec]')
-            plt.ylabel('Bed Position [scaled]')
-            plt.colorbar(h)
-            plt.title('Physical Loading [mol/kg]')
-        else:
-            plt.plot(Z,nphys1)
-            plt.xlabel('Bed Position [scaled]')
-            plt.ylabel('Physical Loading [mol/kg]')
-        plt.show()
+    # Extract grid position values, scaled
+    Z = sol.positions
+    # Extract time values   
+    T = sol.time
+    
+    for name, comp, label, shown in plot_list:
+        if not shown:
+            continue
         
-        alpha1, alpha2 = extract3d(m, m.alpha,'CO2')
+        values = sol.sel(name, component=comp)[0]
         if(len(T) > 1):
-            h = plt.contourf(T,Z,alpha1)
+            h = plt.contourf(T,Z,values)
             plt.xlabel('Time [sec]')
             plt.ylabel('Bed Position [scaled]')
             plt.colorbar(h)
-            plt.title('alpha is modified isotherm [dimensionless]')
+            plt.title(label)
         else:
-            plt.plot(Z,alpha1)
+            plt.plot(Z,values[:,0])
             plt.xlabel('Bed Position [scaled]')
-            plt.ylabel('alpha is modified isotherm [dimensionless]')
+            plt.ylabel(label)
         plt.show()
 
 
@@ -1591,142 +1876,331 @@ def get_size_csv(store_):
     return Ngrid, NFEt
     
 
-def initial_bed_csv(m, store_):
+# Saved solution columns and the model variables they initialize: (variable name, component or None)
+init_fields = {'den_N2': ('C', 'N2'), 'den_CO2': ('C', 'CO2'),
+               'dcdt_N2': ('dCdt', 'N2'), 'dcdt_CO2': ('dCdt', 'CO2'),
+               'vel': ('v', None), 'pressure': ('P', None), 'total_den': ('total_den', None),
+               'temp': ('temp', None), 'dTdt': ('dTdt', None),
+               'solid_pres': ('spp', 'CO2'),
+               'nchem_eq': ('nchemstar', 'CO2'), 'dndt_chem': ('dnchemdt', 'CO2'), 'nchem': ('nchem', 'CO2'),
+               'nphys_eq': ('nphysstar', 'CO2'), 'dndt_phys': ('dnphysdt', 'CO2'), 'nphys': ('nphys', 'CO2')}
+
+
+def interpolate_fields(z_src, t_src, fields, z_dst, t_dst, method='linear'):
+    '''
+    Interpolate fields from one (position, time) mesh to another, all fields in one vectorized call.
+    
+    Arguments:
+        z_src, t_src: source grid positions and time points
+        fields: a dictionary of source values, each [len(z_src), len(t_src)]
+        z_dst, t_dst: target grid positions and time points
+        method: 'linear' or 'cubic'. Linear is exact at the source nodes, cubic is not.
+            Cubic falls back to linear when a dimension has less than 4 points
+        
+    Return: a dictionary of target values, each [len(z_dst), len(t_dst)]
+    '''
+    names = list(fields)
+    
+    # on the same mesh the values are copied, so a saved solution is reloaded exactly
+    if (len(z_src) == len(z_dst) and len(t_src) == len(t_dst) 
+            and np.allclose(z_src, z_dst, rtol=1E-9, atol=1E-12) and np.allclose(t_src, t_dst, rtol=1E-9, atol=1E-12)):
+        return {name: np.array(fields[name], dtype=float) for name in names}
+    
+    if method == 'cubic' and min(len(z_src), len(t_src)) < 4:
+        method = 'linear'
+        
+    # [len(z_src), len(t_src), # of fields]
+    values = np.stack([np.asarray(fields[name], dtype=float) for name in names], axis=-1)
+    interp = RegularGridInterpolator((z_src, t_src), values, method=method, bounds_error=False, fill_value=None)
+    
+    Z_dst, T_dst = np.meshgrid(z_dst, t_dst, indexing='ij')
+    new_values = interp(np.column_stack((Z_dst.ravel(), T_dst.ravel()))).reshape(len(z_dst), len(t_dst), len(names))
+    return {name: new_values[..., k] for k, name in enumerate(names)}
+
+
+def _set_zt_values(var, leading, values, zgrid, tset, skip_fixed=False):
+    '''
+    Set values of a variable indexed by (leading..., zgrid, t) in bulk
+    
+    Arguments:
+        var: Pyomo variable
+        leading: a list of leading indexes, each a tuple
+        values: [len(zgrid), len(tset)], same values for every leading index
+        zgrid, tset: the z and t index sets
+        skip_fixed: if True, fixed variables keep their values
+    NaN values are skipped.
+    '''
+    new_values = {}
+    for lead in leading:
+        for a, z in enumerate(zgrid):
+            for b, t in enumerate(tset):
+                if np.isnan(values[a, b]) or (skip_fixed and var[lead + (z, t)].fixed):
+                    continue
+                new_values[lead + (z, t)] = values[a, b]
+    var.set_values(new_values, skip_validation=True)
+
+
+def initial_bed_csv(m, store_, method='linear', LOUD=True):
     '''
     Initialize the bed with values for every time node and every grid.
-    This version uses linear interporation
+    All fields are interpolated onto the model mesh at once and set in bulk.
+    The saved solution and the model can have different grids and time points.
 
     Arguments:
         m: model
-        store_ : the pandas dataframe storing solution
+        store_ : the pandas dataframe storing solution, or a results store / .csv file name, see read_results. 
         note that this function will be used before running the model, so this store_ will be the previous solution. 
+        method: interpolation method, 'linear' or 'cubic', see interpolate_fields
+        LOUD: if print the time it takes
 
     Return: None
 
     '''
+    time0 = time.time()
+    
+    # Saved columns needed by this model
+    columns = [c for c in init_fields if isinstance(m.find_component(init_fields[c][0]), pyo.Var)]
+    if m.energy:
+        columns.append('nplin')
+    store_ = read_results(store_, columns=['time', 'position']+columns)
     
     # Extract the length of time nodes and grid nodes
     nTime = len(m.t)
-    nGrid = len(m.zgrid)
-    n = nTime*nGrid
+    nGrid_init, NFEt_init = get_size_csv(store_)
     
+    Z = np.unique(np.asarray(store_['position'], dtype=float))
+    T = np.unique(np.asarray(store_['time'], dtype=float))
     
+    print('Model # of time grid is', nTime, ', initial point # of time grid is', len(T))
     
-    Z = np.unique(np.asarray(store_['position']))
-    T = np.unique(np.asarray(store_['time']))
+    # Scaled position of the saved grids, [0,1] from the first to the last grid
+    Z = (Z - Z[0])/(Z[-1] - Z[0])
     
-    print('Model # of time grid is', nTime, ', initial point # of time grid is', len(T))
-
-    # Extract every variable
-    den_N2 = np.asarray(store_['den_N2'])
-    den_CO2 = np.asarray(store_['den_CO2'])
-
-    dcdt_N2 = np.asarray(store_['dcdt_N2'])
-    dcdt_CO2 = np.asarray(store_['dcdt_CO2'])
+    # Scaled position of the model grids in the initial point. The saved solutions are on uniform grids, 
+    # with the position scaled to [0,1] from the first to the last grid
+    z_scaled = np.array([min(max((pyo.value(m.z_position[z])*nGrid_init - 1)/(nGrid_init - 1), 0), 1) for z in m.zgrid])
+    t_model = np.array([pyo.value(t) for t in m.t])
     
-    P = np.asarray(store_['pressure'])
-    vel_ = np.asarray(store_['vel'])
-    total_den = np.asarray(store_['total_den'])
+    # Saved fields, position-major: [# of grids, # of time nodes]
+    fields = {c: np.reshape(np.asarray(store_[c], dtype=float), (nGrid_init, NFEt_init+1)) for c in columns}
     
-    if m.energy:
-        temp_co = np.asarray(store_['temp'])
-        dTdt_co = np.asarray(store_['dTdt'])
-        nplin_co = np.asarray(store_['nplin'])
+    new_values = interpolate_fields(Z, T, fields, z_scaled, t_model, method=method)
     
+    for c in columns:
+        if c not in init_fields:
+            continue
+        name, comp = init_fields[c]
+        leading = [(j,) if comp is None else (j, comp) for j in m.scena]
+        _set_zt_values(getattr(m, name), leading, new_values[c], m.zgrid, m.t)
+        
     if m.isotherm:
-        s_pres = np.asarray(store_['solid_pres'])
-
-    if m.physsorb:
-        nphys_eq = np.asarray(store_['nphys_eq'])
-        dnphysdt = np.asarray(store_['dndt_phys'])
-        nphys = np.asarray(store_['nphys'])
+        x = alpha_scale*(new_values['solid_pres'] - plin)
         
-    if m.chemsorb:
-        nchem_eq = np.asarray(store_['nchem_eq'])
-        dnchemdt = np.asarray(store_['dndt_chem'])
-        nchem = np.asarray(store_['nchem'])
+        if alpha_option == 1:
+            alpha_ = 0.5*(1 - x / np.sqrt(eps_alpha + x*x))
+        elif alpha_option == 2:
+            alpha_ = 1 - 1 /(1 + np.exp(-x))
+        elif alpha_option == 3: 
+            alpha_ = np.zeros_like(x)
+        elif alpha_option == 4: 
+            alpha_ = np.ones_like(x)
+            
+        if alpha_variable:
+            _set_zt_values(m.alpha, [(j, 'CO2') for j in m.scena], alpha_, m.zgrid, m.t)
+            
+        if m.chemsorb:
+            # nplin is an expression of the temperature, use the saved values for the initial point 
+            nplin_ = new_values['nplin'] if m.energy else pyo.value(m.nplin)
+            nchemstar_mod_ = alpha_*nplin_*new_values['solid_pres']/plin + (1-alpha_)*new_values['nchem_eq']
+            _set_zt_values(m.nchemstar_mod, [(j, 'CO2') for j in m.scena], nchemstar_mod_, m.zgrid, m.t)
+            
+    if LOUD:
+        print('Initialization from the saved solution took', time.time()-time0, '[s]')
+
+
+### Mesh sequencing
+def build_model(scena, timesteps, grid=None, **kwargs):
+    '''
+    Create, discretize and prepare a fixed-bed model on a given mesh.
+    Same steps as model_integrate in fixed_bed_doe.ipynb, without the initialization.
+    
+    Arguments:
+        scena: scenarios, see create_model()
+        timesteps: time points, [s]
+        grid: axial grid, see create_model()
+        kwargs: other arguments of create_model(), e.g. temp_feed, temp_bath, y, doe_model, fast_build, profile
         
-    c_N2 = interp2d(Z, T, den_N2, kind='cubic')
-    c_CO2 = interp2d(Z, T, den_CO2, kind='cubic')
+    Return: the discretized model. The time of each build stage is in m.build_stages [s]; with profile=True, 
+        the component construction times are in m.build_profile, see report_build_profile()
+    '''
+    build_stages = {}
     
-    dcdt_N2_ = interp2d(Z, T, dcdt_N2, kind='cubic')
-    dcdt_CO2_ = interp2d(Z, T, dcdt_CO2, kind='cubic')
+    time0 = time.perf_counter()
+    m = create_model(scena, grid=grid, **kwargs)
+    time1 = time.perf_counter()
+    build_stages['create_model'] = time1 - time0
     
-    V = interp2d(Z, T, vel_, kind='cubic')
-    pres = interp2d(Z, T, P, kind='cubic')
-    tot_den = interp2d(Z, T, total_den, kind='cubic')
+    add_variables(m, timesteps=timesteps)
+    time2 = time.perf_counter()
+    build_stages['add_variables'] = time2 - time1
     
-    if m.energy:
-        temp_e = interp2d(Z, T, temp_co, kind='cubic')
-        dTdt_e = interp2d(Z, T, dTdt_co, kind='cubic')
-        nplin_e = interp2d(Z, T, nplin_co, kind='cubic')
+    add_equations(m)
+    time3 = time.perf_counter()
+    build_stages['add_equations'] = time3 - time2
     
-    if m.isotherm:
-        solid_pres = interp2d(Z, T, s_pres, kind='cubic')
-    if m.physsorb:
-        Nphys_e = interp2d(Z, T, nphys_eq, kind='cubic')
-        dndt_phys = interp2d(Z, T, dnphysdt, kind='cubic')
-        Nphys = interp2d(Z, T, nphys, kind='cubic')
+    with PauseGC() if m.fast_build else contextlib.nullcontext():
+        pyo.TransformationFactory('dae.finite_difference').apply_to(m, nfe=len(timesteps)-1, scheme='BACKWARD', wrt=m.t)
+    
+    for t in m.t:
+        m.Q[t].fix()
+    build_stages['discretization'] = time.perf_counter() - time3
+    
+    stop_build_profile(m)
+    m.build_stages = build_stages
+    if kwargs.get('profile', False):
+        report_build_profile(m)
         
-    if m.chemsorb:
-        Nchem_e = interp2d(Z, T, nchem_eq, kind='cubic')
-        dndt_chem = interp2d(Z, T, dnchemdt, kind='cubic')
-        Nchem = interp2d(Z, T, nchem, kind='cubic')
+    return m
+
+
+def mesh_sequence(grid=Ngrid, nfe=68, tf=3200, levels=3, ratio=2):
+    '''
+    Generate meshes from coarse to fine for solve_mesh_sequence()
+    
+    Arguments:
+        grid: number of axial grids of the finest mesh
+        nfe: number of time intervals of the finest mesh
+        tf: end time, [s]
+        levels: number of meshes
+        ratio: refinement ratio between two meshes
         
+    Return: a list of (number of grids, time points), the last one is the target mesh
+    '''
+    meshes = []
+    for l in reversed(range(levels)):
+        ngrid_l = max(int(np.ceil(grid/ratio**l)), 3)
+        nfe_l = max(int(np.ceil(nfe/ratio**l)), 4)
+        meshes.append((ngrid_l, time_points(nfe_l, tf)))
+    return meshes
 
-    # Loop for every time and grid nodes
-    for j in m.scena:
-        for z in m.zgrid:
-            for i in m.t:
-                z_ = pyo.value(z) /(Ngrid)
-                t_ = pyo.value(i)
-                m.C[j,'N2',z,i] = c_N2(z_, t_)[0]
-                m.C[j,'CO2',z,i] = c_CO2(z_,t_)[0]
-
-                m.dCdt[j,'N2',z,i] = dcdt_N2_(z_, t_)[0]
-                m.dCdt[j,'CO2',z,i] = dcdt_CO2_(z_, t_)[0]
-
-                m.v[j,z,i] = V(z_,t_)[0]    
-                m.P[j,z,i] = pres(z_,t_)[0]
-                m.total_den[j,z,i] = tot_den(z_,t_)[0]
-                
-                if m.energy:
-                    m.temp[j,z,i] = temp_e(z_, t_)[0]
-                    m.dTdt[j,z,i] = dTdt_e(z_, t_)[0]
-                    m.nplin[j,z,i] = nplin_e(z_, t_)[0]
-                    
-                if m.isotherm:
-                    m.spp[j,'CO2',z,i] = solid_pres(z_, t_)[0]
-                    x = alpha_scale*(solid_pres(z_, t_)[0] - plin)
-
-                    if alpha_option == 1:
-                        alpha_ = 0.5*(1 - x / np.sqrt(eps_alpha + x*x))
-                    elif alpha_option == 2:
-                        alpha_ = 1 - 1 /(1 + pyo.exp(-x))
-                    elif alpha_option == 3: 
-                        alpha_ = 0.0
-                    elif alpha_option == 4: 
-                        alpha_ = 1.0
-
-                    if alpha_variable:
-                        m.alpha[j,'CO2',z,i] = alpha_
-
-                if m.chemsorb:
-                    m.nchemstar[j,'CO2',z,i] = Nchem_e(z_, t_)[0]
-                    m.dnchemdt[j,'CO2',z,i] = dndt_chem(z_, t_)[0]
-                    m.nchem[j,'CO2',z,i] = Nchem(z_, t_)[0]
-                    if m.energy:
-                        m.nchemstar_mod[j,'CO2',z,i] = alpha_*pyo.value(m.nplin[j,z,i])*solid_pres(z_, t_)[0]/plin + (1-alpha_)*Nchem_e(z_, t_)[0]
-                    else:
-                        m.nchemstar_mod[j,'CO2',z,i] = alpha_*m.nplin*solid_pres(z_, t_)[0]/plin + (1-alpha_)*Nchem_e(z_, t_)[0]
-
-                if m.physsorb:
-                    m.nphysstar[j,'CO2',z,i] = Nphys_e(z_, t_)[0]
-                    #m.nphysstar_mod[j,'CO2',z,i] = alpha_*m.nplin*solid_pres(z_, t_)[0]/plin + (1-alpha_)*Nphys_e(z_, t_)[0]
-                    m.dnphysdt[j,'CO2',z,i] = dndt_phys(z_, t_)[0]
-                    m.nphys[j,'CO2',z,i] = Nphys(z_, t_)[0]   
+
+def _zt_indexed(var, m):
+    '''
+    Check if a variable is indexed by (..., zgrid, t)
+    '''
+    if not var.is_indexed():
+        return False
+    subsets = list(var.index_set().subsets())
+    return len(subsets) >= 2 and subsets[-2] is m.zgrid and subsets[-1] is m.t
+
+
+def transfer_solution(m_from, m_to, LOUD=True):
+    '''
+    Initialize a model with the solution of the same model on another mesh.
+    Every variable indexed by (..., zgrid, t) is interpolated linearly in bed position and time, 
+    one interpolation call per variable. Fixed variables are kept.
+    
+    Arguments:
+        m_from: the solved model
+        m_to: the model to initialize
+        LOUD: if print the time it takes
+        
+    Return: None
+    '''
+    time0 = time.time()
+    
+    z_from = np.array([pyo.value(m_from.z_position[z]) for z in m_from.zgrid])
+    t_from = np.array([pyo.value(t) for t in m_from.t])
+    z_to = np.array([pyo.value(m_to.z_position[z]) for z in m_to.zgrid])
+    t_to = np.array([pyo.value(t) for t in m_to.t])
+    
+    for var_to in m_to.component_objects(pyo.Var, descend_into=True):
+        var_from = m_from.find_component(var_to.name)
+        if var_from is None or not _zt_indexed(var_to, m_to) or not _zt_indexed(var_from, m_from):
+            continue
+            
+        values = var_from.extract_values()
+        
+        # leading indexes, e.g. (scenario, component)
+        leading = sorted({idx[:-2] for idx in values}, key=str)
+        fields = {}
+        for lead in leading:
+            fields[lead] = np.array([[np.nan if values[lead + (z, t)] is None else values[lead + (z, t)] for t in m_from.t] for z in m_from.zgrid])
+        fields = {lead: f for lead, f in fields.items() if not np.isnan(f).all()}
+        if not fields:
+            continue
             
+        new_values = interpolate_fields(z_from, t_from, fields, z_to, t_to)
+        for lead in fields:
+            _set_zt_values(var_to, [lead], new_values[lead], m_to.zgrid, m_to.t, skip_fixed=True)
+                        
+    if LOUD:
+        print('Solution transferred in', time.time()-time0, '[s]')
+
+
+def solve_mesh_sequence(scena, meshes, solver=None, init=None, warm_options=None, tee=False, **kwargs):
+    '''
+    Solve the fixed-bed model from a coarse mesh to the target mesh.
+    Each solution is interpolated onto the next mesh as the initial point of its solve.
+    The sequence stops at the first mesh whose solve is not optimal, so no finer mesh starts from an unconverged point.
+    
+    Arguments:
+        scena: scenarios, see create_model()
+        meshes: a list of (grid, time points) from coarse to fine, e.g. from mesh_sequence()
+        solver: a Pyomo solver. If None, Ipopt is used
+        init: a pandas dataframe of a saved solution to initialize the coarsest mesh with initial_bed_csv. 
+            If None, the variables keep their default initial values
+        warm_options: solver options used on the finer meshes only, e.g. {'mu_init': 1e-4}
+        tee: if print the solver output
+        kwargs: other arguments of create_model(), e.g. temp_feed, temp_bath, y
+        
+    Return: 
+        m: the solved model on the target mesh, or the model of the mesh that failed
+        stats: a list of dictionaries with the level, mesh size, solver status and solve time of each mesh solved. 
+            The sequence converged if the last one has level len(meshes)-1 and status 'optimal'
+    '''
+    if solver is None:
+        solver = pyo.SolverFactory('ipopt')
+        
+    stats = []
+    m_prev = None
+    for level, (grid, timesteps) in enumerate(meshes):
+        time0 = time.time()
+        m = build_model(scena, timesteps, grid=grid, **kwargs)
+        build_time = time.time() - time0
+        
+        if m_prev is not None:
+            transfer_solution(m_prev, m)
+        elif init is not None:
+            initial_bed_csv(m, init)
+        fix_initial_bed(m)
+        
+        # square problem, fix the design variables
+        if m.doe_model and not m.parametric:
+            m.temp_feed.fix()
+            m.yfeed.fix()
+        
+        # options for the warm-started solves
+        options = {}
+        if level > 0 and warm_options is not None:
+            options = warm_options
             
+        time0 = time.time()
+        result = solver.solve(m, tee=tee, options=options)
+        solve_time = time.time() - time0
+        
+        stats.append({'level': level, 'grid': len(m.zgrid), 'time_points': len(m.t), 
+                      'status': str(result.solver.termination_condition),
+                      'build_time': build_time, 'solve_time': solve_time})
+        print('Mesh', len(m.zgrid), 'x', len(m.t), ':', stats[-1]['status'], ', solved in', solve_time, '[s]')
+        
+        if result.solver.termination_condition != pyo.TerminationCondition.optimal:
+            print('Mesh sequencing stopped at level', level, 'of', len(meshes)-1, ', the solve is not optimal')
+            break
+        
+        m_prev = m
+        
+    return m, stats
 
 
 def compute_Kp(mod,LOUD=True):
@@ -1753,22 +2227,12 @@ def ext_pres_double(total, option1, option2, node):
         total: a pandas dataframe of solutions
         option: name of the variable
         node: number of timesteps
-    Note: the Ngrid is fixed to 20 
+    Note: the number of grids is the length of the dataframe divided by node 
     Return: a list
     '''
-    x_py1 = total[option1]
-    x_pyomo1 = np.zeros((20,node))
-
-    for i in range(0,20):
-        for j in range(0,node):
-            x_pyomo1[i,j] = x_py1.iloc[i*node+j]
-            
-    x_py2 = total[option2] 
-    x_pyomo2 = np.zeros((20,node))
-
-    for m in range(0,20):
-        for k in range(0,node):
-            x_pyomo2[m,k] = x_py2.iloc[m*node+k]        
+    # position-major, [# of grids, # of time nodes]
+    x_pyomo1 = np.reshape(np.asarray(total[option1]), (-1, node))
+    x_pyomo2 = np.reshape(np.asarray(total[option2]), (-1, node))
         
     return x_pyomo1, x_pyomo2
 
@@ -1797,46 +2261,22 @@ def residual(m):
     '''
     Calculate the residual with a given model
     return: 
-        res: the residual at every timepoint
+        res: the residual between the outlet flowrate computed from the extracted solution and the FCO2 expression
         FCO2: the CO2 outlet flowrate at every timepoint
     '''
+    sol = SolutionArray(m, names=['C', 'v', 'FCO2'])
+    
+    # outlet CO2 density and velocity of the first scenario
+    outlet = sol.sel('C', component='CO2')[0, -1, :]
+    outlet_velo = sol.sel('v')[0, -1, :]
+    FCO2_ = sol.sel('FCO2')[0, -1, :]
+    
+    #LHS: mmol/min
+    #RHS: mol/m3 * cm/s * m2 * 60*1000/100
+    FCO2 = outlet*outlet_velo*3.1415926*rbed*rbed*600
     
-    # Extract time 
-    T = []
-    for j in m.t:
-        T.append(value(j))
-        t_final = T[-1]
-        
-    # Extract CO2 density 
-    outlet_den = extract3d(m, m.C, 'CO2')
-    outlet_ = []
-    outlet_.append(outlet_den[Ngrid-1, :])
-    outlet = np.reshape(outlet_, len(T))
-    
-    # Extract velocity 
-    outlet_vel = extract2d(m, m.v)
-    outlet_v = []
-    outlet_v.append(outlet_vel[Ngrid-1, :])
-    outlet_velo = np.reshape(outlet_v, len(T))
-
-    # Extract values of FCO2
-    FCO2_ = []
-    for i in range(0, len(T)):
-        FCO2_.append(value(m.FCO2[T[i]]))
-    
-    # Extract values of yCO2
-    yCO2_ = []
-    for i in range(0, len(T)):
-        yCO2_.append(value(m.yCO2[T[i]]))
-     
     # Get value of residual
-    res = 0
-    for i in range(0, len(outlet)):
-        res += (outlet[i]*outlet_velo[i]*3.1415926*rbed*rbed*600 - FCO2_[i])**2
-        
-    FCO2 = np.zeros((len(outlet)))
-    for i in range(0, len(outlet)):
-        FCO2[i] = (outlet[i]*outlet_velo[i]*3.1415926*rbed*rbed*600)
+    res = np.sum((FCO2 - FCO2_)**2)
     
     return res, FCO2
 
@@ -1847,7 +2287,7 @@ def breakthrough_modify2(m, file=None, source="computer"):
     
     Arguments:
         m: Pyomo model
-        file: when source = 'computer', this is where the computer experimental data is stored. Otherwise, its default is None
+        file: when source = 'computer', this is where the computer experimental data is stored (.csv or results store). Otherwise, its default is None
         source: if computer, it is plotting the computer experiment data. If lab, its comparing the experiments from the lab
     
     Return: None 
@@ -1857,21 +2297,17 @@ def breakthrough_modify2(m, file=None, source="computer"):
     '''
     
     
+    sol = SolutionArray(m, names=['C', 'v', 'temp'])
+    
     # unit: mol/m3
-    outlet_den, _, _, _ = extract3d(m, m.C, 'CO2')
+    outlet_den = sol.sel('C', component='CO2')[0]
     
     # unit: cm/s
-    outlet_vel, _, _, _ = extract2d(m, m.v)
-    
-    outlet_n2, _, _, _ = extract3d(m, m.C, 'N2')
+    outlet_vel = sol.sel('v')[0]
     
-    model_temp, _,_,_ = extract2d(m,m.temp)
+    model_temp = sol.sel('temp')[0]
     
-    
-    T = []
-    for j in m.t:
-        T.append(value(j))
-        t_final = T[-1]
+    T = sol.time
 
     
     if source == "lab":
@@ -1895,11 +2331,11 @@ def breakthrough_modify2(m, file=None, source="computer"):
         
     elif source == "computer": 
         
-        sol = pd.read_csv(file)
+        sol = read_results(file, columns=['FCO2', 'temp_mid', 'temp_end'])
 
-        exp_fco2 = np.asarray(sol['FCO2'].values.tolist())
-        exp_temp_mid = np.asarray(sol['temp_mid'].values.tolist())
-        exp_temp_end = np.asarray(sol['temp_end'].values.tolist())
+        exp_fco2 = np.asarray(sol['FCO2'])
+        exp_temp_mid = np.asarray(sol['temp_mid'])
+        exp_temp_end = np.asarray(sol['temp_end'])
         
         plt.plot(T, exp_fco2/exp_fco2[-1], label = 'Experimental data')
         plt.plot(T, outlet_den[-1,:]*outlet_vel[-1,:]/(outlet_den[-1, -1]*outlet_vel[-1,-1]), label='Model prediction')
@@ -1910,10 +2346,13 @@ def breakthrough_modify2(m, file=None, source="computer"):
         plt.show()
         
         
+        # the grid closest to the middle thermocouple
+        z_middle = grid_index(m, z_mid)
+        
         plt.plot(T, exp_temp_mid, label='Experimental data of middle T')
-        plt.plot(T, model_temp[10,:], label='Model prediction of middle T')
+        plt.plot(T, model_temp[z_middle,:], label='Model prediction of middle T')
         plt.plot(T, exp_temp_end, label='Experimental data of end T')
-        plt.plot(T, model_temp[19,:], label='Model prediction of end T')
+        plt.plot(T, model_temp[-1,:], label='Model prediction of end T')
         plt.xlabel('time [s]')
         plt.ylabel('Temperature [K]')
         plt.title('Temperature model prediction and experimental data')
@@ -1928,12 +2367,17 @@ def makeplot_csv2(store_, temp_show = False):
     To make plots from .csv file in fixed_bed_init.ipynb: first run code before solver, then run this function
     
     Arguments: 
-        store_: a single pandas dataframe
+        store_: a single pandas dataframe, or a results store / .csv file name, see read_results
         
     Return: None
     
     Other: plots
     '''
+    columns = ['time', 'position', 'den_N2', 'den_CO2', 'vel', 'nchem_eq', 'nphys_eq', 'nchem', 'nphys', 'pressure']
+    if temp_show:
+        columns.append('temp')
+    store_ = read_results(store_, columns=columns)
+    
     # Extract variable values from dataframe
     den_N2 = np.asarray(store_['den_N2'])
     den_CO2 = np.asarray(store_['den_CO2'])
@@ -2062,15 +2506,11 @@ def ext_pres(total, option1, node):
         total: a pandas dataframe of solutions
         option: name of the variable
         node: number of timesteps
-    Note: the Ngrid is fixed to 20 
+    Note: the number of grids is the length of the dataframe divided by node 
     Return: a list
     '''
-    x_py1 = total[option1]
-    x_pyomo1 = np.zeros((20,node))
-
-    for i in range(0,20):
-        for j in range(0,node):
-            x_pyomo1[i,j] = x_py1.iloc[i*node+j]      
+    # position-major, [# of grids, # of time nodes]
+    x_pyomo1 = np.reshape(np.asarray(total[option1]), (-1, node))
         
     return x_pyomo1
 
@@ -2093,11 +2533,11 @@ def get_fco2(con_s, vel_s):
     Argument:
         con_s: a list of CO2 density
         vel_s: a list of velocity
-    Note: the Ngrid is fixed to 20 
+    Note: the outlet is the last grid
     Return: a list of FCO2
     '''
-    outlet = con_s[19, :]
-    outlet_velo = vel_s[19, :]
+    outlet = con_s[-1, :]
+    outlet_velo = vel_s[-1, :]
 
     FCO2 = np.zeros((len(outlet)))    
     for i in range(0, len(outlet)):
@@ -2106,287 +2546,152 @@ def get_fco2(con_s, vel_s):
         FCO2[i] = (outlet[i]*outlet_velo[i]*3.1415926*rbed*rbed*600)
     return FCO2
 
-def extract3_v2(m):
+# Columns of extract3_v2: (column, variable, component)
+extract_columns = [('fco2', 'FCO2', None), 
+                   ('den_N2', 'C', 'N2'), 
+                   ('den_CO2', 'C', 'CO2'), 
+                   ('dcdt_N2', 'dCdt', 'N2'), 
+                   ('dcdt_CO2', 'dCdt', 'CO2'), 
+                   ('vel', 'v', None), 
+                   ('pressure', 'P', None), 
+                   ('temp', 'temp', None), 
+                   ('dTdt', 'dTdt', None), 
+                   ('nplin', 'nplin', None), 
+                   ('total_den', 'total_den', None), 
+                   ('solid_pres', 'spp', 'CO2'), 
+                   ('nchem_eq', 'nchemstar', 'CO2'), 
+                   ('nphys_eq', 'nphysstar', 'CO2'), 
+                   ('dndt_chem', 'dnchemdt', 'CO2'), 
+                   ('dndt_phys', 'dnphysdt', 'CO2'), 
+                   ('nchem', 'nchem', 'CO2'), 
+                   ('nphys', 'nphys', 'CO2')]
+
+def extract_results(m):
     ''' 
-    Extract results from Pyomo model for brute force DoE problem. 
-    Compared to extract2: less options kept, add the design variable values 
+    Extract the columns of extract3_v2 from Pyomo model
     
     Arguments:
         m: the model
     
-    Return: a single pandas dataframe storing all results
+    Return: a dict of column arrays, [zgrid, t] flattened; None if the adsorption options are not supported
     '''
+    if not (m.chemsorb and m.physsorb):
+        print('check the adsorption options!!! not a square problem')
+        return 
+    
     nTime = len(m.t)
     nGrid = len(m.zgrid)
     n = nTime*nGrid
     
-    ### Variables to be extracted
-    
-    # Two 3D variables, for COMPS(N2, CO2, He)
-    
-    FCO2_1, FCO2_2, FCO2_3, FCO2_4 = extract2d(m, m.FCO2)
-    
-    FCO21 = np.reshape(FCO2_1, n)
-    FCO22 = np.reshape(FCO2_2, n)
-    FCO23 = np.reshape(FCO2_3, n)
-    FCO24 = np.reshape(FCO2_4, n)
-    
-    C_N2_1, C_N2_2, C_N2_3, C_N2_4 = extract3d(m,m.C,'N2')
-    C_CO2_1, C_CO2_2, C_CO2_3, C_CO2_4 = extract3d(m,m.C,'CO2')
-    
-    C_N21 = np.reshape(C_N2_1, n)
-    C_CO21 = np.reshape(C_CO2_1, n)
-    
-    C_N22 = np.reshape(C_N2_2, n)
-    C_CO22 = np.reshape(C_CO2_2, n)
-    
-    C_N23 = np.reshape(C_N2_3, n)
-    C_CO23 = np.reshape(C_CO2_3, n)
-    
-    C_N24 = np.reshape(C_N2_4, n)
-    C_CO24 = np.reshape(C_CO2_4, n)
-    
-    
-    dcdt_N2_1, dcdt_N2_2, dcdt_N2_3, dcdt_N2_4 = extract3d(m,m.dCdt,'N2')
-    dcdt_CO2_1, dcdt_CO2_2, dcdt_CO2_3, dcdt_CO2_4 = extract3d(m,m.dCdt,'CO2')
-    
-    dcdt_N21 = np.reshape(dcdt_N2_1,n)
-    dcdt_CO21 = np.reshape(dcdt_CO2_1,n)
-    
-    dcdt_N22 = np.reshape(dcdt_N2_2,n)
-    dcdt_CO22 = np.reshape(dcdt_CO2_2,n)
-    
-    dcdt_N23 = np.reshape(dcdt_N2_3,n)
-    dcdt_CO23 = np.reshape(dcdt_CO2_3,n)
-    
-    dcdt_N24 = np.reshape(dcdt_N2_4,n)
-    dcdt_CO24 = np.reshape(dcdt_CO2_4,n)
+    if m.energy:
+        # the base slot has no fco2 column, the perturbed slots have no dTdt and nplin columns
+        slot_columns = [('', [c for c in extract_columns if c[0] != 'fco2']), 
+                        ('_k', [c for c in extract_columns if c[0] not in ['dTdt', 'nplin']]), 
+                        ('_u', [c for c in extract_columns if c[0] not in ['dTdt', 'nplin']]), 
+                        ('_f', [c for c in extract_columns if c[0] not in ['dTdt', 'nplin']])]
+    else:
+        # TODO: add the third set 
+        isothermal = [c for c in extract_columns if c[0] not in ['temp', 'dTdt', 'nplin']]
+        slot_columns = [('', isothermal), 
+                        ('_u', [c for c in isothermal if c[0] != 'fco2'])]
     
-    # Three 2D variables
-    vel_1, vel_2, vel_3, vel_4 = extract2d(m, m.v)
+    ### Variables to be extracted, all in one pass
+    names = list(dict.fromkeys(c[1] for _, columns in slot_columns for c in columns))
+    sol = SolutionArray(m, names=names)
+    slots = scenario_slots(m)
     
-    vel1 = np.reshape(vel_1, n)
-    vel2 = np.reshape(vel_2,n)
-    vel3 = np.reshape(vel_3,n)
-    vel4 = np.reshape(vel_4,n)
+    # Meshgrid, [zgrid, t] flattened
+    [X,Y] = np.meshgrid(sol.time, sol.zgrid)
     
-    P_1, P_2, P_3, P_4 = extract2d(m,m.P)
-    P1 = np.reshape(P_1,n)
-    P2 = np.reshape(P_2, n)
-    P3 = np.reshape(P_3, n)
-    P4 = np.reshape(P_4, n)
+    store = {'time': np.reshape(X,n), 
+             'position': np.reshape(Y,n)}
+    if not m.energy:
+        store['T_inlet'] = pyo.value(m.temp_feed)
+        store['y_inlet'] = pyo.value(m.yfeed)
+    
+    for (suffix, columns), scena in zip(slot_columns, slots):
+        for column, name, comp in columns:
+            if scena is None:
+                # unused slot
+                store[column+suffix] = np.zeros(n)
+            else:
+                store[column+suffix] = np.reshape(sol.sel(name, scenario=scena, component=comp), n)
+    
+    model_q = [pyo.value(m.Q[t]) for t in m.t]
+    print(model_q)
     
-    total_den_1, total_den_2, total_den_3, total_den_4 = extract2d(m,m.total_den)
-    total_den1 = np.reshape(total_den_1, n)
-    total_den2 = np.reshape(total_den_2, n)
-    total_den3 = np.reshape(total_den_3, n)
-    total_den4 = np.reshape(total_den_4, n)
+    return store
+
+def extract3_v2(m):
+    ''' 
+    Extract results from Pyomo model for brute force DoE problem. 
+    Compared to extract2: less options kept, add the design variable values 
     
-    if m.energy:
-        T_1, T_2, T_3, T_4 = extract2d(m,m.temp)
-        T1 = np.reshape(T_1, n)
-        T2 = np.reshape(T_2, n)
-        T3 = np.reshape(T_3, n)
-        T4 = np.reshape(T_4, n)
-        
-        dTdt_1, dTdt_2, dTdt_3, dTdt_4 = extract2d(m,m.dTdt)
-        dTdt1 = np.reshape(dTdt_1,n)
-        dTdt2 = np.reshape(dTdt_2,n)
-        dTdt3 = np.reshape(dTdt_3,n)
-        dTdt4 = np.reshape(dTdt_4,n)
-        
-        nplin_1, nplin_2, nplin_3, nplin_4 = extract2d(m, m.nplin)
-        nplin1 = np.reshape(nplin_1, n)
-        nplin2 = np.reshape(nplin_2, n)
-        nplin3 = np.reshape(nplin_3, n)
-        nplin4 = np.reshape(nplin_4, n)
-        
+    Arguments:
+        m: the model
     
-    # Seven 3D variables, for SCOMPS(CO2)
-    spp_1, spp_2, spp_3, spp_4 = extract3d(m, m.spp, 'CO2') 
-
-    spp1 = np.reshape(spp_1,n)
-    spp2 = np.reshape(spp_2,n)
-    spp3 = np.reshape(spp_3,n)
-    spp4 = np.reshape(spp_4,n)
+    Return: a single pandas dataframe storing all results
+    '''
+    store = extract_results(m)
+    if store is not None:
+        return pd.DataFrame(store)
 
-    nchemstar_1, nchemstar_2, nchemstar_3, nchemstar_4 = extract3d(m, m.nchemstar,'CO2')
 
-    nchemstar1 = np.reshape(nchemstar_1, n)
-    nchemstar2 = np.reshape(nchemstar_2, n)
-    nchemstar3 = np.reshape(nchemstar_3, n)
-    nchemstar4 = np.reshape(nchemstar_4, n)
+def save_results(m, file, encoding='delta'):
+    '''
+    Save results from Pyomo model to a columnar binary store, see fixed_bed_store. 
+    Stores the same columns as extract3_v2, without building a dataframe
     
-
-    dnchemdt_1, dnchemdt_2, dnchemdt_3, dnchemdt_4 = extract3d(m, m.dnchemdt,'CO2')
-    dnchemdt1 = np.reshape(dnchemdt_1, n)
-    dnchemdt2 = np.reshape(dnchemdt_2, n)
-    dnchemdt3 = np.reshape(dnchemdt_3, n)
-    dnchemdt4 = np.reshape(dnchemdt_4, n)
+    Arguments:
+        m: the model
+        file: file name, conventionally ending with fbs.store_suffix
+        encoding: encoding of the perturbed scenario columns, 'float64', 'float32' or 'delta'
     
-
-    nchem_1, nchem_2, nchem_3, nchem_4 = extract3d(m, m.nchem,'CO2')
-    nchem1 = np.reshape(nchem_1, n)
-    nchem2 = np.reshape(nchem_2, n)
-    nchem3 = np.reshape(nchem_3, n)
-    nchem4 = np.reshape(nchem_4, n)
-
-
-    nphysstar_1, nphysstar_2, nphysstar_3, nphysstar_4 = extract3d(m, m.nphysstar,'CO2')
-    nphysstar1 = np.reshape(nphysstar_1, n)
-    nphysstar2 = np.reshape(nphysstar_2, n)
-    nphysstar3 = np.reshape(nphysstar_3, n)
-    nphysstar4 = np.reshape(nphysstar_4, n)
-
-    dnphysdt_1, dnphysdt_2, dnphysdt_3, dnphysdt_4 = extract3d(m, m.dnphysdt,'CO2')
-    dnphysdt1 = np.reshape(dnphysdt_1, n)
-    dnphysdt2 = np.reshape(dnphysdt_2, n)
-    dnphysdt3 = np.reshape(dnphysdt_3, n)
-    dnphysdt4 = np.reshape(dnphysdt_4, n)
-
-    nphys_1, nphys_2, nphys_3, nphys_4 = extract3d(m, m.nphys,'CO2')
-    nphys1 = np.reshape(nphys_1, n)
-    nphys2 = np.reshape(nphys_2, n)
-    nphys3 = np.reshape(nphys_3, n)
-    nphys4 = np.reshape(nphys_4, n)
+    Return: None
+    '''
+    store = extract_results(m)
+    if store is None:
+        return
     
+    meta = {'temp_feed': pyo.value(m.temp_feed), 
+            'temp_bath': pyo.value(m.temp_bath), 
+            'yfeed': pyo.value(m.yfeed), 
+            'scenarios': [str(s) for s in scenario_slots(m)]}
+    fbs.write_results(file, store, encoding=encoding, meta=meta)
 
-    
 
+def cache_features(m):
+    '''
+    Model features for the warm start cache of fim_doe.Solution_cache, besides the design variables and parameters
     
-    # Meshgrid
-    x = []
-    for t in m.t:
-        x.append(value(t))
+    Arguments:
+        m: the model
     
-    y = []
-    for z in m.zgrid:
-        y.append(value(z))
+    Return: a dict of features, keys are names, values are numbers or arrays
+    '''
+    features = {'temp_feed': pyo.value(m.temp_feed), 
+                'temp_bath': pyo.value(m.temp_bath), 
+                'yfeed': pyo.value(m.yfeed), 
+                # heat input profile, [W]
+                'Q': [pyo.value(m.Q[t]) for t in m.t], 
+                # the grid
+                'z_position': [pyo.value(m.z_position[z]) for z in m.zgrid]}
+    return features
 
+
+def read_results(source, columns=None):
+    '''
+    Read saved results, only the needed columns
     
-    [X,Y] = np.meshgrid(x,y)
-    time = np.reshape(X,n)
-    space = np.reshape(Y,n)
-    
-    model_q = []
-    for i in x:
-        model_q.append(value(m.Q[i]))
-    print(model_q)
-   
-    if m.chemsorb and m.physsorb:
-        if m.energy:
-            store = pd.DataFrame({'time': time,
-                              'position':space,
-                              #'T_inlet': m.temp_feed,
-                              #'y_inlet': m.yfeed,
-                              #'status': 0,
-                              #'fco2': FCO21, 
-                              'den_N2': C_N21,
-                              'den_CO2': C_CO21,
-                              'dcdt_N2':dcdt_N21,
-                              'dcdt_CO2':dcdt_CO21,
-                              'vel': vel1,
-                              'pressure':P1,
-                              'temp': T1,
-                              'dTdt': dTdt1, 
-                              'nplin': nplin1, 
-                              'total_den':total_den1,
-                              'solid_pres':spp1,
-                              'nchem_eq': nchemstar1,
-                              'nphys_eq': nphysstar1,
-                              'dndt_chem': dnchemdt1,
-                              'dndt_phys': dnphysdt1,
-                              'nchem': nchem1,
-                              'nphys':nphys1,
-                              'fco2_k': FCO22, 
-                              'den_N2_k': C_N22,
-                              'den_CO2_k': C_CO22,
-                              'dcdt_N2_k':dcdt_N22,
-                              'dcdt_CO2_k':dcdt_CO22,
-                              'vel_k': vel2,
-                              'pressure_k':P2,
-                              'temp_k': T2,
-                              'total_den_k':total_den2,
-                              'solid_pres_k':spp2,
-                              'nchem_eq_k': nchemstar2,
-                              'nphys_eq_k': nphysstar2,
-                              'dndt_chem_k': dnchemdt2,
-                              'dndt_phys_k': dnphysdt2,
-                              'nchem_k': nchem2,
-                              'nphys_k': nphys2,
-                              'fco2_u': FCO23, 
-                              'den_N2_u': C_N23,
-                              'den_CO2_u': C_CO23,
-                              'dcdt_N2_u':dcdt_N23,
-                              'dcdt_CO2_u':dcdt_CO23,
-                              'vel_u': vel3,
-                              'pressure_u':P3,
-                              'temp_u': T3,
-                              'total_den_u':total_den3,
-                              'solid_pres_u':spp3,
-                              'nchem_eq_u': nchemstar3,
-                              'nphys_eq_u': nphysstar3,
-                              'dndt_chem_u': dnchemdt3,
-                              'dndt_phys_u': dnphysdt3,
-                              'nchem_u': nchem3,
-                              'nphys_u': nphys3,
-                              'fco2_f': FCO24, 
-                              'den_N2_f': C_N24,
-                              'den_CO2_f': C_CO24,
-                              'dcdt_N2_f':dcdt_N24,
-                              'dcdt_CO2_f':dcdt_CO24,
-                              'vel_f': vel4,
-                              'pressure_f':P4,
-                              'temp_f': T4,
-                              'total_den_f':total_den4,
-                              'solid_pres_f':spp4,
-                              'nchem_eq_f': nchemstar4,
-                              'nphys_eq_f': nphysstar4,
-                              'dndt_chem_f': dnchemdt4,
-                              'dndt_phys_f': dnphysdt4,
-                              'nchem_f': nchem4,
-                              'nphys_f': nphys4
-                             })
-            
-        else:
-        # save the arrays into the data frame
-        # TODO: add the third set 
-            store = pd.DataFrame({'time': time,
-                              'position':space,
-                              'T_inlet': m.temp_feed,
-                              'y_inlet': m.yfeed['CO2'],
-                              'fco2': FCO21, 
-                              'den_N2': C_N21,
-                              'den_CO2': C_CO21,
-                              'dcdt_N2':dcdt_N21,
-                              'dcdt_CO2':dcdt_CO21,
-                              'vel': vel1,
-                              'pressure':P1,
-                              'total_den':total_den1,
-                              'solid_pres':spp1,
-                              'nchem_eq': nchemstar1,
-                              'nphys_eq': nphysstar1,
-                              'dndt_chem': dnchemdt1,
-                              'dndt_phys': dnphysdt1,
-                              'nchem': nchem1,
-                              'nphys':nphys1,
-                              'den_N2_u': C_N22,
-                              'den_CO2_u': C_CO22,
-                              'dcdt_N2_u':dcdt_N22,
-                              'dcdt_CO2_u':dcdt_CO22,
-                              'vel_u': vel2,
-                              'pressure_u':P2,
-                              'total_den_u':total_den2,
-                              'solid_pres_u':spp2,
-                              'nchem_eq_u': nchemstar2,
-                              'nphys_eq_u': nphysstar2,
-                              'dndt_chem_u': dnchemdt2,
-                              'dndt_phys_u': dnphysdt2,
-                              'nchem_u': nchem2,
-                              'nphys_u': nphys2
-                             })
+    Arguments:
+        source: a pandas dataframe or ResultsStore (returned as is), a results store file or a .csv file
+        columns: the columns needed. If None, all columns
     
+    Return: a pandas dataframe or a ResultsStore, both indexable by column name
+    '''
+    if not isinstance(source, str):
+        return source
+    elif source.endswith(fbs.store_suffix):
+        return fbs.load_results(source, columns=columns)
     else:
-        print('check the adsorption options!!! not a square problem')
-    
-    return store
\ No newline at end of file
+        return pd.read_csv(source, usecols=columns)
\ No newline at end of file
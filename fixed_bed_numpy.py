@@ -0,0 +1,796 @@
+import time
+from itertools import product
+
+import numpy as np
+import pandas as pd
+import pyomo.environ as pyo
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+import fixed_bed_model as fbm
+
+### Vectorized NumPy engine for the fixed-bed equations
+# The functions below evaluate the same equations as the rules in fixed_bed_model.py
+# (gas_comp_mb/gas_comp_mb_doe, energy_balance, ergun, dalton, ideal, the isotherms
+# and the adsorption kinetics), but on whole arrays instead of one index at a time.
+#
+# Array layout (same order as the Pyomo index sets):
+#   C, dCdt:                                  [scenario, component, zgrid, t], component order is COMPS = ['N2', 'CO2']
+#   v, P, total_den, temp, dTdt:              [scenario, zgrid, t]
+#   spp, nchemstar, nchemstar_mod, nphysstar,
+#   nchem, dnchemdt, nphys, dnphysdt:         [scenario, zgrid, t], only CO2 adsorbs (SCOMPS = ['CO2'])
+#   Q:                                        [t]
+
+# Component order of the component axis
+COMPS = ['N2', 'CO2']
+
+# Molecular weight in the component order [g/mol]
+MW_array = np.array([fbm.MW[c] for c in COMPS])
+
+# Variables with a component axis
+comp_vars = ['C', 'dCdt']
+
+# Variables indexed by (scenario, zgrid, t)
+bed_vars = ['v', 'P', 'total_den', 'temp', 'dTdt']
+
+# Variables indexed by (scenario, SCOMPS, zgrid, t), stored without the component axis
+sorb_vars = ['spp', 'nchemstar', 'nchemstar_mod', 'nphysstar', 'nchem', 'dnchemdt', 'nphys', 'dnphysdt']
+
+# Derivative variables and the states they differentiate
+derivative_of = {'dCdt': 'C', 'dTdt': 'temp', 'dnchemdt': 'nchem', 'dnphysdt': 'nphys'}
+
+
+def isotherm_properties(temp):
+    '''
+    Calculate the temperature-dependent isotherm intermediates.
+    Same as the b_a, n_a, inv_n_a, K_eq, b_b, nmax_p, nmax_c and nplin expressions in add_variables.
+
+    Arguments:
+        temp: temperature array [K], any shape
+
+    Return: a dictionary of arrays with the same shape as temp
+    '''
+    # LHS: [1/bar]
+    # RHS: [1/bar] * exp( [kJ/mol]/[kJ/mol/K * K] ) = [1/b] * exp( [ dimensionless ] )
+    b_a = fbm.b_a0*np.exp(fbm.Q_sta/(fbm.RPV*fbm.T0)*(fbm.T0/temp-1))
+
+    # LHS: dimensionless
+    n_a = fbm.n_a1*np.exp(fbm.E_na/(fbm.RPV*fbm.T0)*(fbm.T0/temp-1) + fbm.small_bound)
+    inv_n_a = 1/n_a
+
+    # LHS: dimensionless
+    # RHS: dimensionless + K/K
+    K_eq = np.exp(fbm.Ka + fbm.Kb/temp + fbm.small_bound)
+
+    # LHS: bar-1
+    # RHS: bar-1 * (kJ/mol)/(kJ/mol/K * K)
+    b_b = fbm.b_b0*np.exp(fbm.Q_stb/(fbm.RPV*fbm.T0)*(fbm.T0/temp-1) + fbm.small_bound)
+
+    # LHS: mol/kg
+    exp_p = np.exp(fbm.Kc + fbm.Kd/temp + fbm.small_bound)
+    nmax_p = fbm.nmax_p1*(exp_p/(1+exp_p))
+
+    # LHS: mol/kg
+    # RHS: mol/kg * 1 / 1 = mol/kg
+    nmax_c = fbm.n_max*K_eq/(1+K_eq)
+
+    # Linear pressure adsorption when P < Plinear
+    # LHS: mol/kg
+    nplin_num = (b_a*fbm.plin)**inv_n_a
+    nplin = nmax_c*(nplin_num/(1+nplin_num))
+
+    return {'b_a': b_a, 'n_a': n_a, 'inv_n_a': inv_n_a, 'K_eq': K_eq, 'b_b': b_b,
+            'nmax_p': nmax_p, 'nmax_c': nmax_c, 'nplin': nplin}
+
+
+def kinetic_constants(temp, fitted_transport_coefficient):
+    '''
+    Calculate inv_K_oc and inv_K_op [s], same as inv_k_oc_init_en and inv_k_op_init_en.
+
+    Arguments:
+        temp: temperature array [K], [scenario, zgrid, t]
+        fitted_transport_coefficient: fitted transport coefficient for each scenario [s], [scenario]
+
+    Return: inv_K_oc, inv_K_op with the same shape as temp
+    '''
+    ftc = np.reshape(fitted_transport_coefficient, (-1,) + (1,)*(np.ndim(temp)-1))
+    inv_K_oc = ftc + 1/(fbm.K_c0*np.exp(-fbm.E_c/(fbm.RPV*temp) + fbm.E_c/(fbm.RPV*fbm.T0)))
+    inv_K_op = ftc + 1/(fbm.K_p0*np.exp(-fbm.E_p/(fbm.RPV*temp) + fbm.E_p/(fbm.RPV*fbm.T0)))
+    return inv_K_oc, inv_K_op
+
+
+def heat_capacity(temp):
+    '''
+    Calculate Cpg [J/mol/K], same as cpg_rule.
+
+    Arguments:
+        temp: temperature array [K], any shape
+
+    Return: Cpg with a leading component axis, [component, *temp.shape]
+    '''
+    trans_t = temp*0.001
+    cpg_n2 = 29 + 1.85*trans_t - 9.65*trans_t**2 + 16.64*trans_t**3 + 0.000117/trans_t/trans_t
+    cpg_co2 = 25 + 55.19*trans_t - 33.69*trans_t**2 + 7.95*trans_t**3 - 0.1366/trans_t/trans_t
+    return np.stack([cpg_n2, cpg_co2])
+
+
+def enthalpy(temp):
+    '''
+    Calculate the flow heat h [J/mol] with the reference temperature temp_base, same as h_rule and h_feed_rule.
+
+    Arguments:
+        temp: temperature array [K], any shape
+
+    Return: h with a leading component axis, [component, *temp.shape]
+    '''
+    tb = fbm.temp_base
+    h_n2 = 29*(temp-tb) + 1.85E-3/2*(temp**2-tb**2) - 9.65E-6/3*(temp**3-tb**3) + 16.64E-9/4*(temp**4-tb**4) - 117/temp + 117/tb
+    h_co2 = 25*(temp-tb) + 55.19E-3/2*(temp**2-tb**2) - 33.69E-6/3*(temp**3-tb**3) + 7.95E-9/4*(temp**4-tb**4) + 136638/temp - 136638/tb
+    return np.stack([h_n2, h_co2])
+
+
+def alpha_array(spp):
+    '''
+    Calculate alpha (the linear-region switch) from the surface partial pressure, same as alpha_calc
+    when alpha is an expression.
+
+    Arguments:
+        spp: surface partial pressure [bar], any shape
+
+    Return: alpha with the same shape as spp
+    '''
+    pres_dif = fbm.alpha_scale*(spp - fbm.plin)
+    if fbm.alpha_option == 1:
+        return 0.5*(1-pres_dif/np.sqrt(fbm.eps_alpha+pres_dif*pres_dif))
+    elif fbm.alpha_option == 2:
+        return 1 - 1/(1 + np.exp(-pres_dif + fbm.small_bound))
+    elif fbm.alpha_option == 3:
+        return np.zeros_like(spp)
+    elif fbm.alpha_option == 4:
+        return np.ones_like(spp)
+    else:
+        raise ValueError('alpha_option ' + str(fbm.alpha_option) + ' is not supported.')
+
+
+def fco2(C, v):
+    '''
+    Calculate FCO2, the CO2 flowrate [mmol/min], same as FCO2_calc.
+
+    Arguments:
+        C: gas phase density, [scenario, component, zgrid, t]
+        v: velocity, [scenario, zgrid, t]
+
+    Return: FCO2, [scenario, zgrid, t]
+    '''
+    # mol/m3 * cm/s * 0.01 m/cm * m2 * 60 s/min * 1000 mmol/mol = mmol/min
+    return C[:, COMPS.index('CO2')]*v*3.1415926*fbm.rbed*fbm.rbed*600
+
+
+def upwind_difference(x, x_in, dz):
+    '''
+    Backward (upwind) difference along the zgrid axis, the stencil used in gas_comp_mb, energy_balance and ergun.
+
+    Arguments:
+        x: array with zgrid as the second last axis
+        x_in: the inlet value used for the first grid, broadcastable to x[..., 0, :]
+        dz: length of each axial element [m], a scalar or an array [zgrid]
+
+    Return: dx/dz with the same shape as x
+    '''
+    upstream = np.concatenate([np.expand_dims(np.broadcast_to(x_in, x[..., 0, :].shape), -2), x[..., :-1, :]], axis=-2)
+    return (x - upstream)/np.reshape(dz, (-1, 1))
+
+
+def dispersion_term(C, dz):
+    '''
+    Axial dispersion term [mol/m3/s] used in gas_comp_mb when m.dispersion is True,
+    same stencil as second_difference.
+
+    Arguments:
+        C: gas phase density, [scenario, component, zgrid, t]
+        dz: length of each axial element [m], a scalar or an array [zgrid]
+
+    Return: the dispersion term, [scenario, component, zgrid, t]
+    '''
+    ngrid = C.shape[-2]
+    dz = np.broadcast_to(dz, (ngrid,))
+    # center of the stencil, the first and last grids use the stencil of their neighbour
+    zc = np.clip(np.arange(ngrid), 1, ngrid-2)
+    h_back = dz[zc].reshape(-1, 1)
+    h_next = dz[zc+1].reshape(-1, 1)
+    d2C = 2*(h_back*C[..., zc+1, :] - (h_back+h_next)*C[..., zc, :] + h_next*C[..., zc-1, :])/(h_back*h_next*(h_back+h_next))
+    Dax = np.array([fbm.Dax[c] for c in COMPS]).reshape(1, -1, 1, 1)
+    return Dax*d2C
+
+
+def residuals(state, params, dz=fbm.dz, dispersion=False):
+    '''
+    Evaluate the residuals (LHS - RHS) of the fixed-bed equations on the full
+    (scenario x component x zgrid x t) block.
+
+    Arguments:
+        state: a dictionary of state arrays, keys are the Pyomo variable names, see the array layout above.
+            'Q' is the external heat [t]
+        params: a dictionary with keys:
+            'fitted_transport_coefficient': [scenario]
+            'ua': log of the heat transfer coefficient, [scenario]
+            'temp_feed', 'temp_bath', 'yfeed': the design variables (scalars)
+        dz: length of each axial element [m], a scalar or an array [zgrid]
+        dispersion: if the axial dispersion term is included, same as m.dispersion
+
+    Return: a dictionary of residual arrays, keys are the constraint names in add_equations
+    '''
+    C = state['C']
+    v = state['v']
+    temp = state['temp']
+    spp = state['spp']
+    # broadcast the time-indexed heat over scenario and zgrid
+    Q = np.reshape(state['Q'], (1, 1, -1))
+
+    ua = np.reshape(params['ua'], (-1, 1, 1))
+    temp_bath = params['temp_bath']
+    temp_feed = params['temp_feed']
+    y = params['yfeed']
+
+    # feed density and composition, [mol/m3]
+    totden_f = fbm.totp_f*100/(temp_feed*fbm.RPV)
+    yfeed = np.array([1-y, y])
+
+    iso = isotherm_properties(temp)
+    inv_K_oc, inv_K_op = kinetic_constants(temp, params['fitted_transport_coefficient'])
+    alpha = alpha_array(spp)
+
+    res = {}
+
+    # gas_comp_mb/gas_comp_mb_doe
+    # LHS: mol/m3/s
+    # RHS: (cm/s * mol/m3 / (100cm/m) - cm/s * mol/m3 / (100cm/m))/m = mol/m3/s
+    vC = v[:, None]*0.01*C
+    feed_flux = (fbm.vel_f*0.01*totden_f*yfeed).reshape(1, -1, 1)
+    dvCdz = upwind_difference(vC, feed_flux, dz)
+    # only CO2 adsorbs
+    diff_term = np.zeros_like(C)
+    diff_term[:, COMPS.index('CO2')] = (1-fbm.ads_epsb)*fbm.den_s*(state['dnchemdt'] + state['dnphysdt'])
+    disp_term = dispersion_term(C, dz) if dispersion else 0
+    res['gas_mass_balance'] = state['dCdt'] - (-dvCdz/fbm.ads_epsb - diff_term/fbm.ads_epsb - disp_term)
+
+    # energy_balance
+    # J/m3/K
+    sum_c = np.sum(C*np.moveaxis(heat_capacity(temp), 0, 1), axis=1)
+    dividant = fbm.ads_epsb*sum_c + fbm.den_b*fbm.cps
+    # kJ/kg/s, H_ads = -65 kJ/mol for CO2
+    sum_hdn = 65.0*(state['dnchemdt'] + state['dnphysdt'])
+    # [J/m3]
+    h_sum = np.sum(C*np.moveaxis(enthalpy(temp), 0, 1), axis=1)
+    h_feed = enthalpy(np.asarray(temp_feed, dtype=float))
+    # the feed density is evaluated with the feed temperature, as den_f in create_model
+    h_sum_feed = np.sum(yfeed*totden_f*h_feed)
+    duhdz = upwind_difference(v*0.01*h_sum, fbm.vel_f*0.01*h_sum_feed, dz)
+    # LHS: K/s
+    res['energy_balance_law'] = state['dTdt'] - (fbm.den_b*sum_hdn*1000 - duhdz - np.exp(ua)*(temp-temp_bath) + Q)/dividant
+
+    # ergun
+    # LHS: kg/m4
+    mass_den = np.sum(C*MW_array.reshape(1, -1, 1, 1), axis=1)
+    aeff = 1.75*mass_den*(1-fbm.ads_epsb)/(2*fbm.radp*fbm.ads_epsb**3)/1000
+    # LHS: kg/m3/s
+    beff = 150*fbm.fp_mu*(1-fbm.ads_epsb)*(1-fbm.ads_epsb)/(4*fbm.radp*fbm.radp*fbm.ads_epsb**3)
+    dPdz = upwind_difference(state['P'], fbm.totp_f, dz)
+    # LHS: [bar/m]
+    res['ergun_equation'] = -dPdz - (aeff*(v*0.01)**2 + beff*v*0.01)/1.0E5
+
+    # dalton
+    res['dalton_law'] = state['total_den'] - np.sum(C, axis=1)
+
+    # ideal, [bar]
+    res['ideal_gas_law'] = state['total_den']*0.01*fbm.RPV*temp - state['P']
+
+    # calc_surface_pressure
+    res['partial_pressure'] = spp - fbm.RPV*temp*0.01*C[:, COMPS.index('CO2')]
+
+    # chem_isotherm, [mol/kg]
+    nchem_num = (iso['b_a']*spp)**iso['inv_n_a']
+    res['chemical_isotherm'] = state['nchemstar']*(1+nchem_num) - iso['nmax_c']*nchem_num
+
+    # phys_isotherm, [mol/kg]
+    nphys_num = (iso['b_b']*spp)**(1/1.46)
+    res['physical_isotherm'] = state['nphysstar']*(1+nphys_num) - iso['nmax_p']*nphys_num
+
+    # chem_isotherm_mod, [mol/kg]
+    res['chemical_isotherm_mod'] = state['nchemstar_mod'] - (alpha*iso['nplin']*spp/fbm.plin + (1-alpha)*state['nchemstar'])
+
+    # chem_adsorb and phys_adsorb_nonlinear, [mol/kg/s]
+    res['chemical_adsorption'] = state['dnchemdt'] - (1/inv_K_oc)*(state['nchemstar_mod'] - state['nchem'])
+    res['physical_adsorption'] = state['dnphysdt'] - (1/inv_K_op)*(state['nphysstar'] - state['nphys'])
+
+    return res
+
+
+def discretization_residuals(state, t):
+    '''
+    Residuals of the backward finite difference equations in time
+    (dae.finite_difference with scheme='BACKWARD'), for every derivative variable.
+
+    Arguments:
+        state: a dictionary of state arrays, see residuals()
+        t: time points [s], [t]
+
+    Return: a dictionary of residual arrays, keys are the Pyomo names of the discretization equations.
+        The first time point has no discretization equation, so the arrays have len(t)-1 time points.
+    '''
+    h = np.diff(np.asarray(t, dtype=float))
+    res = {}
+    for dname, sname in derivative_of.items():
+        x = state[sname]
+        res[dname + '_disc_eq'] = state[dname][..., 1:] - np.diff(x, axis=-1)/h
+    return res
+
+
+def state_from_model(m):
+    '''
+    Read the state variables and parameters of a fixed-bed model into arrays.
+
+    Arguments:
+        m: Pyomo model built by create_model, add_variables, add_equations
+
+    Return:
+        state: a dictionary of state arrays, see residuals()
+        params: a dictionary of parameters, see residuals()
+    '''
+    S = list(m.scena)
+    Z = list(m.zgrid)
+    T = list(m.t)
+
+    state = {}
+    for name in comp_vars:
+        state[name] = fbm.extract_array(getattr(m, name), S, COMPS, Z, T)
+    for name in bed_vars:
+        state[name] = fbm.extract_array(getattr(m, name), S, Z, T)
+    for name in sorb_vars:
+        state[name] = fbm.extract_array(getattr(m, name), S, ['CO2'], Z, T)[:, 0]
+    state['Q'] = fbm.extract_array(m.Q, T)
+
+    params = {'fitted_transport_coefficient': np.array([pyo.value(m.fitted_transport_coefficient[j]) for j in S]),
+              'ua': np.array([pyo.value(m.ua[j]) for j in S]),
+              'temp_feed': pyo.value(m.temp_feed),
+              'temp_bath': pyo.value(m.temp_bath),
+              'yfeed': pyo.value(m.yfeed)}
+    return state, params
+
+
+def model_residuals(m):
+    '''
+    Evaluate every residual of a fixed-bed model with the NumPy engine.
+
+    Arguments:
+        m: Pyomo model, optionally discretized with a backward finite difference in time
+
+    Return: a dictionary of residual arrays, keys are the Pyomo constraint names
+    '''
+    state, params = state_from_model(m)
+    dz = np.array([pyo.value(m.dz[z]) for z in m.zgrid])
+    res = residuals(state, params, dz=dz, dispersion=m.dispersion)
+    if hasattr(m, 'dCdt_disc_eq'):
+        res.update(discretization_residuals(state, list(m.t)))
+    return res
+
+
+def pyomo_residuals(m, names):
+    '''
+    Evaluate residuals (body - upper) of the Pyomo constraints one index at a time.
+    This is the reference the NumPy engine is compared to.
+
+    Arguments:
+        m: Pyomo model
+        names: constraint names
+
+    Return: a dictionary, keys are constraint names, values are dictionaries of {index: residual}
+    '''
+    res = {}
+    for name in names:
+        con = getattr(m, name)
+        res[name] = {idx: pyo.value(c.body) - pyo.value(c.upper) for idx, c in con.items()}
+    return res
+
+
+def _residual_index_sets(m, name):
+    '''
+    Index sets of a residual array returned by model_residuals.
+    '''
+    S, Z, T = list(m.scena), list(m.zgrid), list(m.t)
+    if name == 'gas_mass_balance':
+        return [S, COMPS, Z, T]
+    elif name == 'dCdt_disc_eq':
+        return [S, COMPS, Z, T[1:]]
+    elif name.endswith('_disc_eq'):
+        return [S, Z, T[1:]]
+    else:
+        return [S, Z, T]
+
+
+def benchmark_residuals(m, repeat=10, LOUD=True):
+    '''
+    Compare the NumPy residuals with the Pyomo constraint residuals and time both.
+
+    Arguments:
+        m: Pyomo model with all variables initialized
+        repeat: number of NumPy evaluations to average the time over
+        LOUD: if print the summary
+
+    Return: a dictionary with keys:
+        'max_abs_diff': the largest absolute difference for each constraint
+        'time_numpy': average time of one NumPy evaluation, including reading the model [s]
+        'time_pyomo': time of one Pyomo evaluation [s]
+    '''
+    time0 = time.time()
+    for r in range(repeat):
+        res_np = model_residuals(m)
+    time_numpy = (time.time() - time0)/repeat
+
+    names = [n for n in res_np if hasattr(m, n)]
+    time0 = time.time()
+    res_pyo = pyomo_residuals(m, names)
+    time_pyomo = time.time() - time0
+
+    max_abs_diff = {}
+    for name in names:
+        index_sets = _residual_index_sets(m, name)
+        # SCOMPS constraints carry the 'CO2' index in Pyomo
+        if name in ['partial_pressure', 'chemical_isotherm', 'physical_isotherm', 'chemical_isotherm_mod',
+                    'chemical_adsorption', 'physical_adsorption', 'dnchemdt_disc_eq', 'dnphysdt_disc_eq']:
+            keys = [(j, 'CO2', z, t) for j, z, t in product(*index_sets)]
+        else:
+            keys = list(product(*index_sets))
+        ref = np.array([res_pyo[name][k] for k in keys]).reshape(res_np[name].shape)
+        max_abs_diff[name] = float(np.nanmax(np.abs(ref - res_np[name])))
+
+    if LOUD:
+        print('Max absolute difference between NumPy and Pyomo residuals:')
+        for name in names:
+            print('  ', name, ':', max_abs_diff[name])
+        print('NumPy residual evaluation [s]:', time_numpy)
+        print('Pyomo residual evaluation [s]:', time_pyomo)
+        print('Speedup:', time_pyomo/time_numpy)
+
+    return {'max_abs_diff': max_abs_diff, 'time_numpy': time_numpy, 'time_pyomo': time_pyomo}
+
+
+### Method-of-lines breakthrough simulator
+# The bed is discretized in z with the same upwind stencil as the Pyomo model, and the
+# resulting stiff DAE system is integrated in time with the backward differentiation formula.
+# Differential states at each grid, in this order:
+ode_states = ['C_N2', 'C_CO2', 'temp', 'nchem', 'nphys']
+
+# Unknowns at each grid in the implicit time step: the differential states and the velocity,
+# which is determined by the Ergun equation
+step_unknowns = ode_states + ['v']
+
+
+def ergun_velocity(P, C, dz=fbm.dz):
+    '''
+    Solve the Ergun equation for the velocity given the pressure profile.
+    The quadratic is solved with the sign of the pressure drop, so the velocity is smooth
+    (and negative for a reversed pressure gradient).
+
+    Arguments:
+        P: pressure [bar], [scenario, zgrid, t]
+        C: gas phase density, [scenario, component, zgrid, t]
+        dz: length of each axial element [m], a scalar or an array [zgrid]
+
+    Return: velocity v [cm/s], [scenario, zgrid, t]
+    '''
+    mass_den = np.sum(C*MW_array.reshape(1, -1, 1, 1), axis=1)
+    aeff = 1.75*mass_den*(1-fbm.ads_epsb)/(2*fbm.radp*fbm.ads_epsb**3)/1000
+    beff = 150*fbm.fp_mu*(1-fbm.ads_epsb)*(1-fbm.ads_epsb)/(4*fbm.radp*fbm.radp*fbm.ads_epsb**3)
+    # [Pa/m]
+    pres_drop = -upwind_difference(P, fbm.totp_f, dz)*1.0E5
+    # aeff*u^2 + beff*u = pres_drop, u in [m/s]
+    u = 2*pres_drop/(beff + np.sqrt(beff*beff + 4*aeff*np.abs(pres_drop)))
+    return u*100
+
+
+def algebraic_state(C, temp, dz=fbm.dz, v=None):
+    '''
+    Calculate the algebraic variables from the differential states, by solving dalton, ideal,
+    calc_surface_pressure, chem_isotherm, phys_isotherm and chem_isotherm_mod explicitly.
+
+    Arguments:
+        C: gas phase density, [scenario, component, zgrid, t]
+        temp: temperature [K], [scenario, zgrid, t]
+        dz: length of each axial element [m], a scalar or an array [zgrid]
+        v: velocity [cm/s], [scenario, zgrid, t]. If None, it is solved from the Ergun equation
+
+    Return: a dictionary with keys total_den, P, v, spp, nchemstar, nphysstar, nchemstar_mod
+    '''
+    total_den = np.sum(C, axis=1)
+    P = total_den*0.01*fbm.RPV*temp
+    if v is None:
+        v = ergun_velocity(P, C, dz)
+    spp = fbm.RPV*temp*0.01*C[:, COMPS.index('CO2')]
+
+    iso = isotherm_properties(temp)
+    # clip at zero so the fractional powers stay real during Newton iterations
+    spp_pos = np.maximum(spp, 0)
+    nchem_num = (iso['b_a']*spp_pos)**iso['inv_n_a']
+    nchemstar = iso['nmax_c']*nchem_num/(1+nchem_num)
+    nphys_num = (iso['b_b']*spp_pos)**(1/1.46)
+    nphysstar = iso['nmax_p']*nphys_num/(1+nphys_num)
+    alpha = alpha_array(spp)
+    nchemstar_mod = alpha*iso['nplin']*spp/fbm.plin + (1-alpha)*nchemstar
+
+    return {'total_den': total_den, 'P': P, 'v': v, 'spp': spp, 'nchemstar': nchemstar,
+            'nphysstar': nphysstar, 'nchemstar_mod': nchemstar_mod}
+
+
+def time_derivatives(C, temp, nchem, nphys, params, Q=0, dz=fbm.dz, dispersion=False, v=None):
+    '''
+    Calculate the time derivatives of the differential states.
+    The derivatives are the negative residuals of the balance equations evaluated with zero derivatives.
+
+    Arguments:
+        C: gas phase density, [scenario, component, zgrid, t]
+        temp, nchem, nphys: [scenario, zgrid, t]
+        params: parameters and design variables, see residuals()
+        Q: external heat, a scalar or an array [t]
+        dz: length of each axial element [m], a scalar or an array [zgrid]
+        dispersion: if the axial dispersion term is included
+        v: velocity [cm/s], [scenario, zgrid, t]. If None, it is solved from the Ergun equation
+
+    Return:
+        deriv: a dictionary with keys dCdt, dTdt, dnchemdt, dnphysdt
+        state: a dictionary with all variables in the Pyomo model, see residuals()
+        res: residuals of all equations, see residuals()
+    '''
+    state = algebraic_state(C, temp, dz, v)
+    state.update({'C': C, 'temp': temp, 'nchem': nchem, 'nphys': nphys,
+                  'Q': np.broadcast_to(Q, temp.shape[-1:])})
+    for name in derivative_of:
+        state[name] = np.zeros_like(state[derivative_of[name]])
+
+    # chemical_adsorption and physical_adsorption first, the balances depend on the adsorption rates
+    with np.errstate(invalid='ignore'):
+        res = residuals(state, params, dz=dz, dispersion=dispersion)
+    state['dnchemdt'] = -res['chemical_adsorption']
+    state['dnphysdt'] = -res['physical_adsorption']
+    with np.errstate(invalid='ignore'):
+        res = residuals(state, params, dz=dz, dispersion=dispersion)
+    state['dCdt'] = -res['gas_mass_balance']
+    state['dTdt'] = -res['energy_balance_law']
+
+    deriv = {name: state[name] for name in derivative_of}
+    return deriv, state, res
+
+
+def jacobian_sparsity(ngrid, nvar, dispersion=False):
+    '''
+    Sparsity pattern of the method-of-lines Jacobian.
+    The unknowns are ordered grid by grid, so the pattern is banded. With the upwind
+    gas_comp_mb, energy_balance and ergun stencils a grid only depends on itself and the
+    previous grid; dispersion adds the next grid (two grids at the ends).
+
+    Arguments:
+        ngrid: number of grids
+        nvar: number of unknowns at each grid
+        dispersion: if the axial dispersion term is included
+
+    Return:
+        sparsity: a (ngrid*nvar) x (ngrid*nvar) 0/1 array
+        groups: column group of each unknown. Columns in the same group never share a row,
+            so one finite difference evaluation gives all of their Jacobian columns
+    '''
+    lower = 1
+    upper = 1 if dispersion else 0
+    node = np.zeros((ngrid, ngrid), dtype=int)
+    for z in range(ngrid):
+        node[z, max(0, z-lower):min(ngrid, z+upper+1)] = 1
+    if dispersion:
+        # the one-sided stencils at the two ends reach two grids away
+        node[0, :3] = 1
+        node[-1, -3:] = 1
+        lower, upper = 2, 2
+    sparsity = np.kron(node, np.ones((nvar, nvar), dtype=int))
+
+    # grids further apart than the bandwidth can be perturbed together
+    width = lower + upper + 1
+    groups = (np.arange(ngrid)[:, None] % width)*nvar + np.arange(nvar)[None, :]
+    return sparsity, groups.ravel()
+
+
+def _sparse_jacobian(fun, x, f0, sparsity, groups):
+    '''
+    Finite difference Jacobian using the sparsity pattern and the column groups from jacobian_sparsity().
+
+    Arguments:
+        fun: function of x
+        x: point to evaluate the Jacobian at
+        f0: fun(x)
+        sparsity, groups: see jacobian_sparsity()
+
+    Return: Jacobian, scipy.sparse csc matrix
+    '''
+    rows, cols = np.nonzero(sparsity)
+    vals = np.zeros(len(rows))
+    step = 1e-7*np.maximum(1, np.abs(x))
+    for g in np.unique(groups):
+        in_group = groups == g
+        x_pert = x.copy()
+        x_pert[in_group] += step[in_group]
+        df = fun(x_pert) - f0
+        mask = in_group[cols]
+        vals[mask] = df[rows[mask]]/step[cols[mask]]
+    return sparse.csc_matrix((vals, (rows, cols)), shape=sparsity.shape)
+
+
+def initial_bed(temp_bath, v_init=2.0, dz=fbm.dz, ngrid=fbm.Ngrid):
+    '''
+    Clean bed at the start of the breakthrough, same as fix_initial_bed: CO2 density, chemical and
+    physical adsorption at small_initial, temperature at the bath temperature and the velocity at v_init.
+    The N2 density follows from the Ergun pressure drop, dalton and ideal.
+
+    Arguments:
+        temp_bath: bath temperature [K]
+        v_init: initial velocity [cm/s]
+        dz: length of each axial element [m], a scalar or an array [ngrid]
+        ngrid: number of grids
+
+    Return: initial values of step_unknowns, [ngrid, len(step_unknowns)]
+    '''
+    dz = np.broadcast_to(dz, (ngrid,))
+    beff = 150*fbm.fp_mu*(1-fbm.ads_epsb)*(1-fbm.ads_epsb)/(4*fbm.radp*fbm.radp*fbm.ads_epsb**3)
+    x0 = np.zeros((ngrid, len(step_unknowns)))
+    x0[:, 1] = fbm.small_initial
+    x0[:, 2] = temp_bath
+    x0[:, 3] = fbm.small_initial
+    x0[:, 4] = fbm.small_initial
+    x0[:, 5] = v_init
+
+    P = fbm.totp_f
+    for z in range(ngrid):
+        c_n2 = P*100/(temp_bath*fbm.RPV) - fbm.small_initial
+        # fixed-point iterations, the mass density only changes aeff slightly
+        for k in range(5):
+            mass_den = c_n2*fbm.MW['N2'] + fbm.small_initial*fbm.MW['CO2']
+            aeff = 1.75*mass_den*(1-fbm.ads_epsb)/(2*fbm.radp*fbm.ads_epsb**3)/1000
+            P_z = P - dz[z]*(aeff*(v_init*0.01)**2 + beff*v_init*0.01)/1.0E5
+            c_n2 = P_z*100/(temp_bath*fbm.RPV) - fbm.small_initial
+        x0[z, 0] = c_n2
+        P = P_z
+    return x0
+
+
+def simulate_breakthrough(temp_feed, temp_bath, y, params, tf=3200, timesteps=None, substeps=1, grid=None,
+                          dispersion=False, v_init=2.0, tol=1e-9, max_iter=50, LOUD=False):
+    '''
+    Integrate the fixed-bed breakthrough with the method of lines.
+    The bed starts clean (same as fix_initial_bed) and the feed starts at t=0.
+
+    Time integration uses the first order backward differentiation formula on the reported time points,
+    i.e. the same 'BACKWARD' finite difference as the Pyomo model, so with substeps=1 the result satisfies
+    the discretized Pyomo equations and is a consistent initial point for them.
+    Each step is a Newton solve for the states and the velocity with a banded finite difference Jacobian
+    (see jacobian_sparsity()).
+
+    Arguments:
+        temp_feed: feed temperature [K]
+        temp_bath: bath temperature [K]
+        y: feed CO2 fraction
+        params: a dictionary with keys 'fitted_transport_coefficient' and 'ua' (log of the heat transfer coefficient),
+            optionally 'Q' (external heat, constant)
+        tf: end time [s]
+        timesteps: time points to report [s]. If None, 68 intervals from time_points()
+        substeps: number of integration steps between two reported time points
+        grid: axial grid, same as the grid argument of create_model
+        dispersion: if the axial dispersion term is included
+        v_init: initial velocity [cm/s], same as fix_initial_bed
+        tol: Newton tolerance on the relative step
+        max_iter: maximum Newton iterations per step
+        LOUD: if print the integration summary
+
+    Return: a pandas DataFrame with the same columns as the saved results in fixed-bed-saved-results/,
+        which can be passed to initial_bed_csv. The position column is the grid index.
+    '''
+    positions = fbm.grid_positions(grid)
+    ngrid = len(positions)
+    dz = fbm.Lbed*np.diff(positions, prepend=0)
+
+    if timesteps is None:
+        timesteps = fbm.time_points(68, tf)
+    timesteps = np.asarray(timesteps, dtype=float)
+
+    par = {'fitted_transport_coefficient': np.atleast_1d(params['fitted_transport_coefficient']),
+           'ua': np.atleast_1d(params['ua']),
+           'temp_feed': temp_feed, 'temp_bath': temp_bath, 'yfeed': y}
+    Q = params.get('Q', 0)
+    nvar = len(step_unknowns)
+    sparsity, groups = jacobian_sparsity(ngrid, nvar, dispersion)
+    n_group = len(np.unique(groups))
+
+    # Ergun residual [bar/m] to velocity scale [cm/s]
+    beff = 150*fbm.fp_mu*(1-fbm.ads_epsb)*(1-fbm.ads_epsb)/(4*fbm.radp*fbm.radp*fbm.ads_epsb**3)
+    ergun_scale = 1.0E5/(beff*0.01)
+
+    def unpack(x):
+        # [ngrid*nvar, t] -> arrays with a single scenario
+        x = x.reshape(ngrid, nvar, -1)
+        C = x[None, :, 0:2].transpose(0, 2, 1, 3)
+        return C, x[None, :, 2], x[None, :, 3], x[None, :, 4], x[None, :, 5]
+
+    def rhs(x):
+        # time derivatives and the scaled Ergun residual
+        C, temp, nchem, nphys, v = unpack(x[:, None])
+        deriv, _, res = time_derivatives(C, temp, nchem, nphys, par, Q=Q, dz=dz, dispersion=dispersion, v=v)
+        f = np.stack([deriv['dCdt'][0, 0], deriv['dCdt'][0, 1], deriv['dTdt'][0],
+                      deriv['dnchemdt'][0], deriv['dnphysdt'][0], res['ergun_equation'][0]*ergun_scale], axis=1)
+        return f[..., 0]
+
+    x = initial_bed(temp_bath, v_init, dz, ngrid).ravel()
+    sol = [x]
+    n_fev = 0
+    n_jev = 0
+    time0 = time.time()
+    for k in range(1, len(timesteps)):
+        h = (timesteps[k] - timesteps[k-1])/substeps
+        for s in range(substeps):
+            x_prev = x.reshape(ngrid, nvar)[:, :len(ode_states)].copy()
+
+            def step_residual(x_new):
+                # backward difference for the differential states, Ergun for the velocity
+                f = rhs(x_new)
+                g = np.empty_like(f)
+                g[:, :len(ode_states)] = x_new.reshape(ngrid, nvar)[:, :len(ode_states)] - x_prev - h*f[:, :len(ode_states)]
+                g[:, -1] = f[:, -1]
+                return g.ravel()
+
+            # Newton iterations from the previous step
+            g = step_residual(x)
+            for it in range(max_iter):
+                jac = _sparse_jacobian(step_residual, x, g, sparsity, groups)
+                n_fev += n_group
+                n_jev += 1
+                dx = splu(jac).solve(-g)
+                # backtracking line search
+                lam = 1.0
+                while True:
+                    x_new = x + lam*dx
+                    g_new = step_residual(x_new)
+                    n_fev += 1
+                    if np.linalg.norm(g_new) < np.linalg.norm(g) or lam < 1e-3:
+                        break
+                    lam *= 0.5
+                x, g = x_new, g_new
+                if np.max(np.abs(lam*dx)/(1 + np.abs(x))) < tol:
+                    break
+            else:
+                raise RuntimeError('Breakthrough integration did not converge at t = ' + str(timesteps[k-1] + (s+1)*h))
+        sol.append(x)
+
+    if LOUD:
+        print('Breakthrough integrated in', time.time()-time0, '[s],', n_fev, 'RHS evaluations,', n_jev, 'Jacobians')
+
+    # all variables on the reported time points
+    C, temp, nchem, nphys, v = unpack(np.stack(sol, axis=1))
+    _, state, _ = time_derivatives(C, temp, nchem, nphys, par, Q=Q, dz=dz, dispersion=dispersion, v=v)
+    iso = isotherm_properties(temp)
+
+    # position-major, same as the saved results
+    space, time_ = np.meshgrid(np.arange(ngrid), timesteps, indexing='ij')
+    store = pd.DataFrame({'time': time_.ravel(),
+                          'position': space.ravel(),
+                          'den_N2': state['C'][0, 0].ravel(),
+                          'den_CO2': state['C'][0, 1].ravel(),
+                          'dcdt_N2': state['dCdt'][0, 0].ravel(),
+                          'dcdt_CO2': state['dCdt'][0, 1].ravel(),
+                          'vel': state['v'][0].ravel(),
+                          'pressure': state['P'][0].ravel(),
+                          'temp': state['temp'][0].ravel(),
+                          'dTdt': state['dTdt'][0].ravel(),
+                          'nplin': iso['nplin'][0].ravel(),
+                          'total_den': state['total_den'][0].ravel(),
+                          'solid_pres': state['spp'][0].ravel(),
+                          'nchem_eq': state['nchemstar'][0].ravel(),
+                          'nphys_eq': state['nphysstar'][0].ravel(),
+                          'dndt_chem': state['dnchemdt'][0].ravel(),
+                          'dndt_phys': state['dnphysdt'][0].ravel(),
+                          'nchem': state['nchem'][0].ravel(),
+                          'nphys': state['nphys'][0].ravel()})
+    return store
@@ -0,0 +1,265 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+### Columnar binary results store
+# File layout:
+#   magic (8 bytes) | header length (uint64, little endian) | JSON header | padding | column blocks
+# The header declares the schema: number of rows, and for every column its name, encoding, stored dtype,
+# byte offset (from the start of the column blocks) and, for delta encoded columns, the reference column.
+# Column blocks are 64-byte aligned so that each column is a zero-copy view of the memory-mapped file.
+
+# magic bytes at the start of every store file
+store_magic = b'FBSTORE1'
+# file suffix of the results store
+store_suffix = '.fbr'
+# alignment of the header end and the column blocks [bytes]
+store_align = 64
+
+# Supported column encodings: stored dtype
+# float64: stored as is
+# float32: stored in single precision
+# delta: stored in single precision as the difference to the reference column,
+#        e.g. den_CO2_k is stored as den_CO2_k - den_CO2
+store_encodings = {'float64': '<f8', 'float32': '<f4', 'delta': '<f4'}
+
+# suffixes of the perturbed scenario columns written by extract3_v2
+perturbed_suffixes = ['_k', '_u', '_f']
+
+
+def _aligned(n):
+    '''Round n up to the store alignment'''
+    return -(-n//store_align)*store_align
+
+
+def reference_column(name, columns):
+    '''
+    Find the base column of a perturbed scenario column
+
+    Arguments:
+        name: column name, e.g. 'den_CO2_k'
+        columns: all column names
+
+    Return: the base column name, e.g. 'den_CO2', or None if the column is not a perturbed copy
+        or the base column is not stored
+    '''
+    for suffix in perturbed_suffixes:
+        if name.endswith(suffix) and name[:-len(suffix)] in columns:
+            return name[:-len(suffix)]
+    return None
+
+
+def results_schema(columns, encoding='float64'):
+    '''
+    Declare the schema of a results store
+
+    Arguments:
+        columns: column names, in the stored order
+        encoding: encoding of the perturbed scenario columns, 'float64', 'float32' or 'delta'.
+            The base columns are always float64. A perturbed column without a base column
+            falls back from 'delta' to 'float32' (write_results also falls back when 'delta' is less accurate).
+
+    Return: a list of column declarations, dict with keys 'name', 'encoding', 'dtype' and 'reference'
+    '''
+    if encoding not in store_encodings:
+        raise ValueError('encoding must be one of ' + str(list(store_encodings)))
+
+    schema = []
+    for name in columns:
+        is_perturbed = any(name.endswith(s) for s in perturbed_suffixes)
+        reference = reference_column(name, columns)
+
+        if not is_perturbed:
+            enc = 'float64'
+        elif encoding == 'delta' and reference is None:
+            enc = 'float32'
+        else:
+            enc = encoding
+
+        schema.append({'name': name,
+                       'encoding': enc,
+                       'dtype': store_encodings[enc],
+                       'reference': reference if enc == 'delta' else None})
+    return schema
+
+
+def write_results(file, columns, encoding='float64', meta=None):
+    '''
+    Write results to a columnar binary store
+
+    Arguments:
+        file: file name, conventionally with store_suffix
+        columns: dict or pandas dataframe of columns. Scalars are broadcast to the number of rows
+        encoding: encoding of the perturbed scenario columns, see results_schema
+        meta: dict of JSON serializable metadata, e.g. the design variables
+
+    Return: the schema written
+    '''
+    names = [str(c) for c in columns.keys()]
+    values = {str(c): np.asarray(columns[c], dtype=float) for c in columns.keys()}
+    nrows = max([v.size for v in values.values() if v.ndim > 0], default=1)
+    values = {c: np.broadcast_to(v, (nrows,)) if v.ndim == 0 else v.reshape(nrows) for c, v in values.items()}
+
+    schema = results_schema(names, encoding=encoding)
+
+    # delta encoding only pays off when the column is close to its reference, e.g. not for the
+    # all-zero columns of unused scenario slots. Fall back to float32 if it is less accurate
+    for col in schema:
+        if col['encoding'] == 'delta':
+            x, ref = values[col['name']], values[col['reference']]
+            err_delta = np.max(np.abs((x - ref).astype('<f4') + ref - x), initial=0)
+            err_single = np.max(np.abs(x.astype('<f4') - x), initial=0)
+            if err_delta > err_single:
+                col['encoding'], col['reference'] = 'float32', None
+
+    offset = 0
+    for col in schema:
+        col['offset'] = offset
+        offset += _aligned(nrows*np.dtype(col['dtype']).itemsize)
+
+    header = json.dumps({'nrows': nrows, 'columns': schema, 'meta': meta or {}}).encode('utf-8')
+    data_start = _aligned(len(store_magic) + 8 + len(header))
+
+    with open(file, 'wb') as f:
+        f.write(store_magic)
+        f.write(np.uint64(len(header)).astype('<u8').tobytes())
+        f.write(header)
+        f.write(b'\0'*(data_start - f.tell()))
+
+        for col in schema:
+            if col['encoding'] == 'delta':
+                block = values[col['name']] - values[col['reference']]
+            else:
+                block = values[col['name']]
+            block = np.ascontiguousarray(block, dtype=col['dtype']).tobytes()
+            f.write(block)
+            f.write(b'\0'*(_aligned(len(block)) - len(block)))
+
+    return schema
+
+
+class ResultsStore:
+    '''
+    Read-only view of a columnar results store.
+    Columns are decoded to float64 only when they are accessed, so indexing it like a pandas dataframe,
+    e.g. store['den_CO2'], reads only that column (and its reference column for delta encoding) from disk.
+    '''
+    def __init__(self, file, columns=None, mmap=True):
+        '''
+        Open a store
+
+        Arguments:
+            file: file name
+            columns: if given, the projection of columns to be accessed. Others raise KeyError
+            mmap: if True, memory map the file. Otherwise the accessed columns are read with file seeks
+        '''
+        self.file = file
+        self.mmap = mmap
+
+        with open(file, 'rb') as f:
+            if f.read(len(store_magic)) != store_magic:
+                raise ValueError(str(file) + ' is not a fixed bed results store')
+            header_len = int(np.frombuffer(f.read(8), dtype='<u8')[0])
+            header = json.loads(f.read(header_len).decode('utf-8'))
+
+        self.nrows = header['nrows']
+        self.meta = header['meta']
+        self.schema = {col['name']: col for col in header['columns']}
+        self.data_start = _aligned(len(store_magic) + 8 + header_len)
+
+        if columns is None:
+            self.columns = list(self.schema)
+        else:
+            missing = [c for c in columns if c not in self.schema]
+            if missing:
+                raise KeyError('columns not in store: ' + str(missing))
+            self.columns = list(columns)
+
+        self._buffer = np.memmap(file, dtype=np.uint8, mode='r') if mmap else None
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __len__(self):
+        return self.nrows
+
+    def keys(self):
+        return list(self.columns)
+
+    def _raw(self, name):
+        '''Stored values of a column, without decoding'''
+        col = self.schema[name]
+        dtype = np.dtype(col['dtype'])
+        start = self.data_start + col['offset']
+
+        if self._buffer is not None:
+            return self._buffer[start:start+self.nrows*dtype.itemsize].view(dtype)
+
+        with open(self.file, 'rb') as f:
+            f.seek(start)
+            return np.fromfile(f, dtype=dtype, count=self.nrows)
+
+    def __getitem__(self, name):
+        '''
+        Decoded values of a column, float64. Float64 columns of a memory-mapped store are read-only views.
+        '''
+        if name not in self.columns:
+            raise KeyError(name)
+
+        col = self.schema[name]
+        values = self._raw(name)
+        if col['encoding'] == 'delta':
+            return self._raw(col['reference']).astype(float) + values
+        elif col['encoding'] == 'float32':
+            return values.astype(float)
+        return values
+
+    def to_frame(self, columns=None):
+        '''
+        Load columns into a pandas dataframe
+
+        Arguments:
+            columns: the columns to load. If None, all columns of the projection
+
+        Return: a pandas dataframe
+        '''
+        if columns is None:
+            columns = self.columns
+        return pd.DataFrame({c: np.array(self[c]) for c in columns})
+
+
+def load_results(file, columns=None, mmap=True):
+    '''
+    Open a columnar results store
+
+    Arguments:
+        file: file name
+        columns: the columns to be accessed. If None, all columns
+        mmap: if memory map the file
+
+    Return: a ResultsStore, indexable by column name like a pandas dataframe
+    '''
+    return ResultsStore(file, columns=columns, mmap=mmap)
+
+
+def csv_to_store(csv_file, file=None, encoding='delta', meta=None):
+    '''
+    Convert a saved CSV solution to a results store
+
+    Arguments:
+        csv_file: the CSV file, e.g. in fixed-bed-saved-results/
+        file: the store file name. If None, the CSV name with store_suffix
+        encoding: encoding of the perturbed scenario columns, see results_schema
+        meta: dict of metadata
+
+    Return: the store file name
+    '''
+    if file is None:
+        file = csv_file.rsplit('.', 1)[0] + store_suffix
+
+    sol = pd.read_csv(csv_file)
+    # drop the dataframe index written by to_csv
+    sol = sol.loc[:, [c for c in sol.columns if not str(c).startswith('Unnamed')]]
+    write_results(file, sol, encoding=encoding, meta=meta)
+    return file
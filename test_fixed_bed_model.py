@@ -0,0 +1,45 @@
+import contextlib
+import io
+
+import numpy as np
+import pyomo.environ as pyo
+
+import fixed_bed_model as fb
+
+saved_solution = 'fixed-bed-saved-results/20210916_feed313_bath313_5e3.csv'
+scena = {'fitted_transport_coefficient': {0: 1.0}, 'ua': {0: 1.0}, 'scena-name': [0]}
+
+
+def _build(timesteps):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fb.build_model(scena, timesteps)
+
+
+def _initialized_fields(m):
+    return {name: np.array([pyo.value(v) for v in getattr(m, name).values()])
+            for name in set(field[0] for field in fb.init_fields.values())}
+
+
+def test_interpolate_fields_same_mesh_is_exact():
+    z = np.linspace(0, 1, 7)
+    t = np.linspace(0, 600, 9)
+    field = np.sin(3*z)[:, None]*np.exp(-t/300)[None, :]
+    for method in ['linear', 'cubic']:
+        new_values = fb.interpolate_fields(z, t, {'f': field}, z.copy(), t.copy(), method=method)
+        assert np.array_equal(new_values['f'], field)
+
+
+def test_initial_bed_csv_round_trip_same_mesh():
+    timesteps = np.linspace(0, 600, 13)
+    m = _build(timesteps)
+    with contextlib.redirect_stdout(io.StringIO()):
+        fb.initial_bed_csv(m, saved_solution, LOUD=False)
+        sol = fb.extract3_v2(m)
+
+    m_reload = _build(timesteps)
+    with contextlib.redirect_stdout(io.StringIO()):
+        fb.initial_bed_csv(m_reload, sol, LOUD=False)
+
+    saved, reloaded = _initialized_fields(m), _initialized_fields(m_reload)
+    for name in saved:
+        assert np.array_equal(saved[name], reloaded[name]), name